@@ -0,0 +1,159 @@
+"""Benchmark scraping over pages served from an archive on localhost,
+so results only change when the code does.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_scrape
+    python -m benchmarks.bench_scrape --archive pages.gz --json out.json
+"""
+
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+import scrape_etsy.constants as CT
+import scrape_etsy.extractors as EXTRACT
+from scrape_etsy.scrape_etsy import iter_products
+from scrape_etsy.replay import PageArchive, ArchiveServer
+from benchmarks.synthetic import make_archive
+
+
+def parse_args():
+    """Extract arguments from the command line and return in dictionary
+
+    Returns:
+    dict: A dictionary of command line arguments and values
+    """
+
+    parser = argparse.ArgumentParser(description='Benchmark scraping over '
+                                     'archived pages.')
+    parser.add_argument('--archive', help='Archive recorded with --record, '
+                        'a synthetic archive is used if not given', type=str)
+    parser.add_argument('--url', help='First page of search results in the '
+                        'archive, defaults to the first page recorded',
+                        type=str)
+    parser.add_argument('--pages', help='Pages of search results in the '
+                        'synthetic archive', type=int, default=3)
+    parser.add_argument('--listings', help='Listings on each page of the '
+                        'synthetic archive', type=int, default=48)
+    parser.add_argument('-c', '--concurrency', help='Number of products to '
+                        'scrape at the same time', type=int,
+                        default=CT.CONCURRENCY)
+    parser.add_argument('-p', '--parser', help='HTML parser to use',
+                        type=str, default=CT.PARSER)
+    parser.add_argument('--parse-processes', help='Number of processes to '
+                        'parse listing pages in', type=int)
+    parser.add_argument('--json', help='File to write the results to as '
+                        'JSON, for comparing between runs', type=str,
+                        dest='json_output')
+
+    return vars(parser.parse_args())
+
+
+def bench_scrape(server, url, get_details, **kwargs):
+    """Scrape every product from the server, timing the scrape and
+    then repeating it to measure peak memory
+
+    Parameters:
+    server (ArchiveServer): Server of the archive
+    url (str): First page of search results on the server
+    get_details (bool): True to get full details for products
+    kwargs: Any other settings of iter_products
+
+    Returns:
+    dict: Results by name
+    """
+
+    def scrape():
+        return sum(1 for _ in iter_products(url, get_details=get_details,
+                                            rate=None, **kwargs))
+
+    requests = server.requests
+    started = time.perf_counter()
+    rows = scrape()
+    elapsed = time.perf_counter() - started
+    pages = server.requests - requests
+
+    # Traced separately as tracing slows the scrape down
+    tracemalloc.start()
+    scrape()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'seconds': round(elapsed, 3),
+            'pages': pages,
+            'rows': rows,
+            'pages_per_second': round(pages / elapsed, 1),
+            'rows_per_second': round(rows / elapsed, 1),
+            'peak_memory_mb': round(peak / 1024 / 1024, 1)}
+
+
+def bench_parse(archive, parser):
+    """Time parsing and extracting fields from every archived page,
+    without downloading
+
+    Parameters:
+    archive (PageArchive): Archive of pages
+    parser (str): HTML parser to use
+
+    Returns:
+    dict: Mean milliseconds per page for search and listing pages
+    """
+
+    times = {'search': [], 'listing': []}
+    for url, page in archive.pages.items():
+        if page is None:
+            continue
+
+        started = time.perf_counter()
+        soup = BeautifulSoup(page, parser)
+        if EXTRACT.LISTING_ID.search(url):
+            for extractor in EXTRACT.DETAIL_EXTRACTORS.values():
+                extractor(soup)
+            times['listing'].append(time.perf_counter() - started)
+        else:
+            for result in EXTRACT.SEARCH_RESULT.select(soup):
+                if EXTRACT.RESULT_LINK.select_one(result):
+                    for extractor in EXTRACT.SEARCH_EXTRACTORS.values():
+                        extractor(result)
+            times['search'].append(time.perf_counter() - started)
+
+    return dict((f'{kind}_parse_ms',
+                 round(1000 * sum(values) / len(values), 2) if values
+                 else None)
+                for kind, values in times.items())
+
+
+def main(archive=None, url=None, pages=3, listings=48,
+         concurrency=CT.CONCURRENCY, parser=CT.PARSER,
+         parse_processes=None, json_output=None):
+    if archive:
+        page_archive = PageArchive(archive)
+    else:
+        page_archive = make_archive(pages=pages, listings=listings)
+    url = url or next(iter(page_archive.pages))
+
+    results = {'parse': bench_parse(page_archive, parser)}
+    with ArchiveServer(page_archive) as server:
+        for name, get_details in (('search', False), ('details', True)):
+            results[name] = bench_scrape(server, server.url(url),
+                                         get_details,
+                                         concurrency=concurrency,
+                                         parser=parser,
+                                         parse_processes=parse_processes)
+
+    for name, values in results.items():
+        print(f'{name}: ' + ', '.join(f'{key.replace("_", " ")} {value}'
+                                      for key, value in values.items()))
+
+    if json_output:
+        with open(json_output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    sys.exit(main(**parse_args()))
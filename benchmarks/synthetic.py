@@ -0,0 +1,127 @@
+from scrape_etsy.replay import PageArchive
+
+ORIGIN = 'https://www.etsy.com'
+
+# Markup repeated to bring pages up to roughly the size of real Etsy
+# pages, which are mostly scripts, navigation and recommendations
+FILLER = ('<div class="wt-grid__item"><ul class="wt-list-unstyled">'
+          '<li><a href="/c/home">Home &amp; Living</a></li>'
+          '<li><span class="wt-text-caption">Recommended</span></li>'
+          '</ul><script type="text/json">{"id": 1, "tags": ["a", "b"]}'
+          '</script></div>')
+
+
+def search_page(page, pages, listings, filler):
+    """Make a page of search results
+
+    Parameters:
+    page (int): Number of the page, from 1
+    pages (int): Number of pages of results
+    listings (int): Listings on each page
+    filler (int): Number of filler blocks to add
+
+    Returns:
+    str: Content of the page
+    """
+
+    results = ''.join(
+        f'<li class="wt-list-unstyled"><div>'
+        f'<a class="listing-link" href="{ORIGIN}/listing/'
+        f'{page * 1000 + i}/item-{i}?ref=search_grid-{page}-{i}">'
+        f'<h3> Synthetic item {page}-{i} </h3>'
+        f'<span class="v2-listing-card__rating"><span><span '
+        f'class="screen-reader-only">4.8 out of 5 stars</span></span>'
+        f'<span class="screen-reader-only">1,{i:03} reviews</span></span>'
+        f'</a><span class="n-listing-card__price">'
+        f'<span class="currency-symbol">$</span>'
+        f'<span class="currency-value">{i + 1}.99</span></span></div></li>'
+        for i in range(listings))
+
+    next_page = (f'<a class="wt-btn" href="{ORIGIN}/search?q=synthetic'
+                 f'&amp;page={page + 1}">Next</a>' if page < pages
+                 else '<a class="wt-btn">Next</a>')
+
+    return (f'<html><head><title>Synthetic</title></head><body>'
+            f'{FILLER * (filler // 2)}'
+            f'<div data-search-results><ul>{results}</ul></div>'
+            f'<nav class="search-pagination"><a class="wt-btn" href="#">1'
+            f'</a>{next_page}</nav>{FILLER * (filler // 2)}</body></html>')
+
+
+def listing_page(listing, filler):
+    """Make a listing page
+
+    Parameters:
+    listing (int): ID of the listing
+    filler (int): Number of filler blocks to add
+
+    Returns:
+    str: Content of the page
+    """
+
+    return (f'<html><head><title>Item {listing}</title></head><body>'
+            f'{FILLER * (filler // 2)}'
+            f'<div data-estimated-shipping><span class="currency-symbol">$'
+            f'</span><span class="currency-value">4.50</span></div>'
+            f'<p data-product-details-description-text-content> '
+            f'Description of synthetic item {listing} </p>'
+            f'<div data-processing-time><p>1-3 business days</p></div>'
+            f'<span data-legacy-materials-text>Cotton, wool</span>'
+            f'<p data-edd-absolute>Oct 12-20</p>'
+            f'<a href="#shop_overview"><span class="wt-screen-reader-only">'
+            f'12,345 sales</span></a>{FILLER * (filler // 2)}'
+            f'</body></html>')
+
+
+def search_url(page=1):
+    """Get the URL of a page of search results
+
+    Parameters:
+    page (int): Number of the page, from 1
+
+    Returns:
+    str: URL of the page
+    """
+
+    return f'{ORIGIN}/search?q=synthetic' + (f'&page={page}'
+                                             if page > 1 else '')
+
+
+def listing_url(page, i):
+    """Get the canonical URL of a listing
+
+    Parameters:
+    page (int): Number of the page it is found on, from 1
+    i (int): Position of the listing on the page, from 0
+
+    Returns:
+    str: URL of the listing
+    """
+
+    return f'{ORIGIN}/listing/{page * 1000 + i}/item-{i}'
+
+
+def make_archive(pages=3, listings=48, filler=100):
+    """Make an archive of search results and listings shaped like
+    Etsy's, for benchmarking without recording a real scrape
+
+    Parameters:
+    pages (int): Number of pages of search results
+    listings (int): Listings on each page
+    filler (int): Number of filler blocks on each page
+
+    Returns:
+    PageArchive: The archive, the first page of search results is
+    the first page in it
+    """
+
+    archive = PageArchive()
+    for page in range(1, pages + 1):
+        archive.put(search_url(page),
+                    search_page(page, pages, listings, filler))
+
+        for i in range(listings):
+            archive.put(listing_url(page, i),
+                        listing_page(page * 1000 + i, filler))
+
+    return archive
@@ -1,8 +1,10 @@
 import os
+import sys
 import argparse
 import click
 
-from scrape_etsy.scrape_etsy import scrape
+from scrape_etsy.scrape_etsy import (scrape, scrape_batch, scrape_distributed,
+                                     scrape_worker)
 
 def parse_args():
     """Extract arguments from the command line and return in dictionatry
@@ -16,10 +18,24 @@ def parse_args():
     parser = argparse.ArgumentParser(description='Scrape product information'
                                      ' from etsy.com into a CSV file.')
     parser.add_argument('url', help='URL for the first page of Etsy search '
-                        'results', type=str)
+                        'results', type=str, nargs='?')
+    parser.add_argument('-b', '--batch', help='File with the URL of a search '
+                        'on each line, - for stdin, searches are scraped '
+                        'together sharing workers', type=str)
+    parser.add_argument('--output-dir', help='Directory to write an output '
+                        'for each search of a batch to, instead of one output '
+                        'with a query column', type=str)
+    parser.add_argument('--query-concurrency', help='Number of searches of a '
+                        'batch to scrape at the same time.', type=int)
     parser.add_argument('-o', '--output', help='Filepath to output csv',
                         type=str)
-    parser.add_argument('-f', '--fail-log', help='Filepath to failure log',
+    parser.add_argument('--format', help='Format of the output, chosen by '
+                        'its extension if not given. Parquet needs pyarrow.',
+                        dest='output_format',
+                        choices=['csv', 'jsonl', 'parquet'])
+    parser.add_argument('-f', '--fail-log', help='Filepath to failure log, '
+                        'a CSV of the time, url, stage, exception, HTTP '
+                        'status, attempts and message of each failure',
                         type=str)
     parser.add_argument('-l', '--limit', help='Limit scraping to first LIMIT'
                         'products.', type=int)
@@ -27,8 +43,106 @@ def parse_args():
                         ' listing.', action='store_true')
     parser.add_argument('-m', '--memcached', help='server:port of memcached '
                         'server to use for caching', type=str)
+    parser.add_argument('--cache', help='Path to a local cache file to use '
+                        'instead of memcached', type=str)
+    parser.add_argument('--cache-size', help='Maximum size of the local '
+                        'cache file in MB', type=int)
+    parser.add_argument('--memory-cache', help='Number of pages to keep in '
+                        'memory in front of any other cache', type=int)
+    parser.add_argument('--memory-cache-size', help='Maximum size of pages '
+                        'to keep in memory in MB', type=int)
+    parser.add_argument('--cache-compression', help='Compression for cached '
+                        'pages, zstd needs the zstandard package', type=str,
+                        choices=['none', 'zlib', 'zstd'])
+    parser.add_argument('--cache-compression-level', help='Compression level '
+                        'for cached pages', type=int)
+    parser.add_argument('--checkpoint', help='File to record progress in, an '
+                        'interrupted scrape carries on from it', type=str)
+    parser.add_argument('--previous', help='Output of a previous scrape with '
+                        'details, only new or changed listings are '
+                        'downloaded again', type=str)
+    parser.add_argument('--rate', help='Requests per second to start at, '
+                        'raised while Etsy responds well and cut when it '
+                        'throttles', type=float)
+    parser.add_argument('--max-rate', help='Requests per second never to '
+                        'go above', type=float)
+    parser.add_argument('--no-rate-limit', help='Download without waiting '
+                        'between requests, retrying throttled requests '
+                        'after a backoff.', action='store_true')
+    parser.add_argument('--record', help='Archive file to record every '
+                        'downloaded page in, for replaying later', type=str)
+    parser.add_argument('--replay', help='Archive file to get pages from '
+                        'instead of downloading them', type=str)
+    parser.add_argument('--metrics', help='Print timings of each stage of '
+                        'the scrape with percentiles at the end, to stderr '
+                        'if the output goes to stdout.',
+                        dest='report_metrics', action='store_true')
+    parser.add_argument('--metrics-file', help='File to write timings of '
+                        'each stage of the scrape to as JSON', type=str)
+    parser.add_argument('-c', '--concurrency', help='Number of products to '
+                        'scrape at the same time.', type=int)
+    parser.add_argument('--pool-size', help='Number of connections to keep '
+                        'open to Etsy and memcached.', type=int)
+    parser.add_argument('--prefetch', help='Number of search pages to '
+                        'download ahead while the current page is being '
+                        'processed.', type=int)
+    parser.add_argument('-p', '--parser', help='HTML parser to use, lxml is '
+                        'fastest if installed.', type=str,
+                        choices=['html.parser', 'lxml', 'html5lib'])
+    parser.add_argument('--parse-processes', help='Number of processes to '
+                        'parse listing pages in, for scrapes limited by '
+                        'CPU.', type=int)
+    parser.add_argument('--partial-parse', help='Only parse the parts of '
+                        'listing pages which contain details.',
+                        action='store_true')
+    parser.add_argument('--validate', help='Check each product for empty '
+                        'required fields and numbers which do not parse, '
+                        'logging invalid products as failures. Prices, '
+                        'ratings and counts are converted to numbers.',
+                        action='store_true')
+    parser.add_argument('--skip-duplicates', help='Leave out listings found '
+                        'again later in the search results instead of '
+                        'repeating them with their new rank.',
+                        dest='duplicates', action='store_const',
+                        const='skip')
+    parser.add_argument('--queue', help='Work queue file of a distributed '
+                        'crawl. With a URL this process coordinates the '
+                        'crawl, queueing every listing for workers and '
+                        'writing the output once they are done.', type=str)
+    parser.add_argument('--worker', help='Download listings from the crawl '
+                        'in --queue until it is finished.',
+                        action='store_true')
+    parser.add_argument('--coordinate-only', help='Leave every listing of '
+                        'a distributed crawl to the workers.',
+                        action='store_true')
     args = parser.parse_args()
 
+    if args.worker:
+        if not args.queue:
+            parser.error('--worker needs a --queue')
+        if args.url or args.batch:
+            parser.error('--worker does not take a url or --batch')
+    elif not args.url and not args.batch:
+        parser.error('a url or --batch is required')
+    if args.coordinate_only and not args.queue:
+        parser.error('--coordinate-only needs a --queue')
+    if args.queue and (args.batch or args.checkpoint or
+                       args.parse_processes):
+        parser.error('--queue can not be used with --batch, --checkpoint '
+                     'or --parse-processes')
+    if args.batch and args.checkpoint:
+        parser.error('--checkpoint can not be used with --batch')
+    if not args.batch and (args.output_dir or args.query_concurrency):
+        parser.error('--output-dir and --query-concurrency need a --batch')
+    if args.no_rate_limit and (args.rate or args.max_rate):
+        parser.error('--no-rate-limit can not be used with --rate or '
+                     '--max-rate')
+
+    if args.cache_size:
+        args.cache_size = args.cache_size * 1024 * 1024
+    if args.memory_cache_size:
+        args.memory_cache_size = args.memory_cache_size * 1024 * 1024
+
     return vars(args)
 
 def check_existing_files(output, fail_log):
@@ -58,12 +172,43 @@ def check_existing_files(output, fail_log):
 if __name__ == '__main__':
     args = parse_args()
 
-    if args['output']:
+    if args['output'] or args['worker']:
         """If we are writing to a file then we can use stdout to print progress
         and messages"""
         args['message_callback'] = lambda m: print(f'\n{m}')
         args['progress_callback'] = lambda m: print('.', flush=True, end='')
+    elif args['report_metrics']:
+        # The output goes to stdout, so messages and the metrics report
+        # go to stderr
+        args['message_callback'] = lambda m: print(m, file=sys.stderr)
+
+    if args['checkpoint'] and os.path.exists(args['checkpoint']):
+        # Resuming appends to the existing output
+        ready = check_existing_files(None, args['fail_log'])
+    else:
+        ready = check_existing_files(args['output'], args['fail_log'])
 
-    if check_existing_files(args['output'], args['fail_log']):
+    if ready:
         # Only pass argument that are not null
-        scrape(**dict(filter(lambda a: a[1], args.items())))
+        args = dict(filter(lambda a: a[1], args.items()))
+        if args.pop('no_rate_limit', None):
+            args['rate'] = None
+        batch = args.pop('batch', None)
+        worker = args.pop('worker', None)
+        coordinate_only = args.pop('coordinate_only', None)
+        if worker:
+            for name in ('output', 'get_details', 'limit', 'previous',
+                         'duplicates', 'validate', 'prefetch',
+                         'output_format', 'progress_callback'):
+                args.pop(name, None)
+            scrape_worker(**args)
+        elif 'queue' in args:
+            scrape_distributed(**args, work=not coordinate_only)
+        elif batch:
+            with open(batch) if batch != '-' else sys.stdin as f:
+                urls = [line.strip() for line in f if line.strip()]
+            if 'output_dir' in args:
+                os.makedirs(args['output_dir'], exist_ok=True)
+            scrape_batch(urls, **args)
+        else:
+            scrape(**args, collect=False)
@@ -0,0 +1,221 @@
+import time
+import asyncio
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+import scrape_etsy.constants as CT
+from scrape_etsy.cache import encode_page, check_codec
+from scrape_etsy.fetcher import read_cached, new_validators
+from scrape_etsy.ratelimit import retry_after_seconds
+from scrape_etsy.metrics import Metrics
+from scrape_etsy.exceptions import GetPageException
+
+
+class AsyncFetcher():
+    """Downloads pages with aiohttp and optionally caches them, the
+    same way as Fetcher but without a thread for each download. The
+    caches are blocking, so cache calls run in the event loop's
+    default executor. Needs the aiohttp package.
+    """
+
+    def __init__(self, cache=None, pool_size=CT.ASYNC_CONCURRENCY,
+                 compression=CT.CACHE_CODEC,
+                 compression_level=CT.CACHE_COMPRESS_LEVEL,
+                 limiter=None,
+                 metrics=None):
+        """
+        Parameters:
+        cache (Cache): Cache to keep pages in, closed with the fetcher
+        pool_size (int): Maximum number of connections kept open
+        compression (str): Compression for cached pages, one of none,
+        zlib or zstd
+        compression_level (int): Compression level for the codec
+        limiter (RateLimiter): Rate limiter to wait on before every
+        download, None for no limit
+        metrics (Metrics): Metrics to record fetch timings and sizes in
+        """
+
+        if not aiohttp:
+            raise ValueError('Async scraping needs the aiohttp package.')
+
+        check_codec(compression)
+        self.compression = compression
+        self.compression_level = compression_level
+        self.pool_size = pool_size
+        # Created in the event loop on first use
+        self.session = None
+
+        self.cache = cache
+        self.limiter = limiter
+        self.metrics = metrics or Metrics()
+
+    async def get(self, url):
+        """Get a page from the cache or download it, see Fetcher.get
+
+        Parameters:
+        url (str): URL to get
+
+        Returns:
+        str: Content of the page
+        """
+
+        loop = asyncio.get_running_loop()
+
+        cached_value = None
+        if self.cache:
+            with self.metrics.timer('fetch.cache'):
+                cached_value = await loop.run_in_executor(
+                    None, self.cache.get, url)
+        cached_page, cached_validators, fresh, headers = \
+            read_cached(cached_value)
+        if fresh:
+            self.metrics.count('fetch.cache_hits')
+            return cached_page
+
+        status, response_headers, page, attempts = await self.__download(
+            url, headers)
+
+        if status == 304 and headers:
+            # Unchanged, keep the cached page fresh for another period
+            self.metrics.count('fetch.revalidated')
+            page = cached_page
+        elif status != 200:
+            raise GetPageException(url, status=status, attempts=attempts)
+
+        if self.cache:
+            validators = new_validators(response_headers, status == 304,
+                                        cached_validators)
+            await loop.run_in_executor(
+                None, lambda: self.cache.set(
+                    url, encode_page(page, validators=validators,
+                                     codec=self.compression,
+                                     level=self.compression_level),
+                    expire=CT.CACHE_STALE_EXPIRE))
+
+        return page
+
+    async def __download(self, url, headers):
+        """Download a page, waiting on the rate limiter before each
+        attempt and retrying failed connections and throttled responses
+
+        Parameters:
+        url (str): URL to download
+        headers (dict): Extra request headers
+
+        Returns:
+        tuple: Status, headers and text of the last response and the
+        number of attempts made
+        """
+
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=CT.TIMEOUT))
+
+        for attempt in range(CT.RETRY_COUNT + 1):
+            if self.limiter:
+                with self.metrics.timer('fetch.rate_wait'):
+                    while True:
+                        wait = self.limiter.reserve()
+                        if not wait:
+                            break
+                        await asyncio.sleep(wait)
+
+            started = time.monotonic()
+            try:
+                async with self.session.get(url, headers=headers) as response:
+                    content = await response.read()
+                    status = response.status
+                    response_headers = response.headers
+                    text = await response.text(errors='replace') \
+                        if status == 200 else None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == CT.RETRY_COUNT:
+                    raise GetPageException(url, attempts=attempt + 1) from e
+                self.metrics.count('fetch.retries')
+                with self.metrics.timer('fetch.backoff'):
+                    await asyncio.sleep(CT.BACKOFF_FACTOR * 2 ** attempt)
+                continue
+            latency = time.monotonic() - started
+
+            # Retried attempts are timed apart from first attempts
+            self.metrics.timing('fetch.retry' if attempt else
+                                'fetch.network', latency)
+            self.metrics.size('fetch.bytes', len(content))
+
+            if status not in CT.RETRY_STATUSES:
+                if self.limiter:
+                    self.limiter.success(latency)
+                return status, response_headers, text, attempt + 1
+
+            wait = retry_after_seconds(response_headers.get('Retry-After'))
+            if self.limiter:
+                self.limiter.throttled(wait)
+            if attempt == CT.RETRY_COUNT:
+                break
+
+            if wait is None:
+                wait = CT.BACKOFF_FACTOR * 2 ** attempt
+            elif self.limiter:
+                # Every request already waits on the limiter
+                wait = 0
+            self.metrics.count('fetch.retries')
+            with self.metrics.timer('fetch.backoff'):
+                await asyncio.sleep(wait)
+
+        return status, response_headers, text, attempt + 1
+
+    async def close(self):
+        """Close all pooled connections and the cache
+
+        Returns:
+        None
+        """
+
+        if self.session:
+            await self.session.close()
+        if self.cache:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.cache.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+class ThreadedFetcher():
+    """Wraps a blocking fetcher, such as a ReplayFetcher, so it can be
+    used where an AsyncFetcher is expected. Each get runs in the event
+    loop's default executor.
+    """
+
+    def __init__(self, fetcher):
+        """
+        Parameters:
+        fetcher (Fetcher): Blocking fetcher to get pages with, closed
+        with this fetcher
+        """
+
+        self.fetcher = fetcher
+        self.cache = fetcher.cache
+        self.limiter = fetcher.limiter
+        self.metrics = fetcher.metrics
+
+    async def get(self, url):
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.fetcher.get, url)
+
+    async def close(self):
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.fetcher.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
@@ -0,0 +1,459 @@
+import time
+import json
+import zlib
+import struct
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from pymemcache.client.base import PooledClient
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+import scrape_etsy.constants as CT
+
+# Header of encoded pages, followed by a format version and codec byte.
+# Version 2 adds the length and JSON of the page's validators. Pages
+# cached before encoding was added are plain UTF-8 HTML and never start
+# with a NUL byte.
+PAGE_MAGIC = b'\x00ESC'
+PAGE_VERSION = 2
+CODECS = {'none': 0, 'zlib': 1, 'zstd': 2}
+
+# Errors from values which are corrupt, truncated or were stored by
+# another version
+DECODE_ERRORS = (zlib.error, struct.error, IndexError, ValueError) + \
+    ((zstandard.ZstdError,) if zstandard else ())
+
+
+def encode_page(page, validators=None, codec=CT.CACHE_CODEC,
+                level=CT.CACHE_COMPRESS_LEVEL):
+    """Compress a page for storing in a cache
+
+    Parameters:
+    page (str): Content of the page
+    validators (dict): When the page was stored and its ETag and
+    Last-Modified headers, for revalidating it once stale
+    codec (str): Compression to use, one of none, zlib or zstd
+    level (int): Compression level for the codec
+
+    Returns:
+    bytes: Header and compressed page
+    """
+
+    body = page.encode()
+    if codec == 'zlib':
+        body = zlib.compress(body, level)
+    elif codec == 'zstd':
+        body = zstandard.ZstdCompressor(level=level).compress(body)
+    elif codec != 'none':
+        raise ValueError(f'Unknown cache compression "{codec}".')
+
+    meta = json.dumps(validators or {}).encode()
+
+    return (PAGE_MAGIC + bytes([PAGE_VERSION, CODECS[codec]]) +
+            struct.pack('>H', len(meta)) + meta + body)
+
+
+def decode_page(value):
+    """Decompress a page read from a cache, whichever version and
+    codec it was stored with
+
+    Parameters:
+    value (bytes): Value from the cache
+
+    Returns:
+    tuple: Content of the page and its validators, validators are
+    empty for pages stored before they were kept. The page is None if
+    the value cannot be decoded, such as a corrupt value or a zstd
+    page without the zstandard package, so it is downloaded again.
+    """
+
+    try:
+        if not value.startswith(PAGE_MAGIC):
+            # Stored raw before pages were encoded
+            return value.decode(), {}
+
+        version = value[len(PAGE_MAGIC)]
+        codec = value[len(PAGE_MAGIC) + 1]
+        body = value[len(PAGE_MAGIC) + 2:]
+
+        validators = {}
+        if version >= 2:
+            meta_length = struct.unpack('>H', body[:2])[0]
+            validators = json.loads(body[2:2 + meta_length].decode())
+            body = body[2 + meta_length:]
+
+        if codec == CODECS['zlib']:
+            body = zlib.decompress(body)
+        elif codec == CODECS['zstd']:
+            if not zstandard:
+                return None, {}
+            body = zstandard.ZstdDecompressor().decompress(body)
+
+        return body.decode(), validators
+    except DECODE_ERRORS:
+        return None, {}
+
+
+def check_codec(codec):
+    """Check a cache compression codec can be used
+
+    Parameters:
+    codec (str): Compression to use, one of none, zlib or zstd
+
+    Returns:
+    None
+    """
+
+    if codec not in CODECS:
+        raise ValueError(f'Unknown cache compression "{codec}".')
+    if codec == 'zstd' and not zstandard:
+        raise ValueError('zstd cache compression needs the zstandard '
+                         'package.')
+
+
+class Cache():
+    """Interface for the page caches used by Fetcher. Keys are URLs
+    and values are bytes, already compressed by encode_page.
+    """
+
+    def get(self, key):
+        """Get a value from the cache
+
+        Parameters:
+        key (str): Key of the value
+
+        Returns:
+        bytes: The cached value, None if missing or expired
+        """
+
+        raise NotImplementedError()
+
+    def set(self, key, value, expire=CT.CACHE_EXPIRE):
+        """Store a value in the cache
+
+        Parameters:
+        key (str): Key of the value
+        value (bytes): Value to store
+        expire (int): Seconds until the value expires
+
+        Returns:
+        None
+        """
+
+        raise NotImplementedError()
+
+    def stats(self):
+        """Get counters for sizing the cache
+
+        Returns:
+        dict: Counter values by name, empty if none are kept
+        """
+
+        return {}
+
+    def close(self):
+        """Release any connections held by the cache
+
+        Returns:
+        None
+        """
+
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MemcachedCache(Cache):
+    """Cache pages in a memcached server, shared by every machine
+    which can reach it.
+    """
+
+    # Longest key memcached accepts, longer URLs are hashed
+    MAX_KEY_LENGTH = 250
+
+    def __init__(self, server, pool_size=CT.POOL_SIZE):
+        """
+        Parameters:
+        server (str): server:port of memcached server
+        pool_size (int): Maximum number of connections to keep open
+        """
+
+        host, port = server.split(':')
+        self.client = PooledClient((host, int(port)),
+                                   max_pool_size=pool_size)
+
+    def __key(self, key):
+        if len(key) > self.MAX_KEY_LENGTH or ' ' in key:
+            return hashlib.sha1(key.encode()).hexdigest()
+        return key
+
+    def get(self, key):
+        return self.client.get(self.__key(key))
+
+    def set(self, key, value, expire=CT.CACHE_EXPIRE):
+        self.client.set(self.__key(key), value, expire=expire)
+
+    def close(self):
+        self.client.close()
+
+
+class SqliteCache(Cache):
+    """Cache pages in a local SQLite file, so no extra service is
+    needed. The least recently used values are removed once the file
+    holds more than max_size bytes.
+    """
+
+    # Bumped when stored values change format, older files are emptied
+    SCHEMA_VERSION = 1
+
+    def __init__(self, path, max_size=CT.CACHE_MAX_SIZE):
+        """
+        Parameters:
+        path (str): Path to the SQLite file, created if missing
+        max_size (int): Maximum bytes of values to keep
+        """
+
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False,
+                                          isolation_level=None)
+
+        with self.lock:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            version = self.connection.execute(
+                'PRAGMA user_version').fetchone()[0]
+            if version != self.SCHEMA_VERSION:
+                self.connection.execute('DROP TABLE IF EXISTS pages')
+                self.connection.execute(
+                    f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS pages ('
+                                    'key TEXT PRIMARY KEY, '
+                                    'value BLOB NOT NULL, '
+                                    'size INTEGER NOT NULL, '
+                                    'expires REAL NOT NULL, '
+                                    'accessed REAL NOT NULL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS '
+                                    'pages_accessed ON pages (accessed)')
+            self.connection.execute('DELETE FROM pages WHERE expires < ?',
+                                    (time.time(),))
+            self.size = self.connection.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+
+    def get(self, key):
+        now = time.time()
+
+        with self.lock:
+            row = self.connection.execute('SELECT value, expires FROM pages '
+                                          'WHERE key = ?', (key,)).fetchone()
+            if not row:
+                return None
+
+            if row[1] < now:
+                self.__delete(key)
+                return None
+
+            self.connection.execute('UPDATE pages SET accessed = ? '
+                                    'WHERE key = ?', (now, key))
+
+        return row[0]
+
+    def set(self, key, value, expire=CT.CACHE_EXPIRE):
+        now = time.time()
+
+        with self.lock:
+            self.__delete(key)
+            self.connection.execute('INSERT INTO pages VALUES (?, ?, ?, ?, ?)',
+                                    (key, value, len(value), now + expire,
+                                     now))
+            self.size += len(value)
+            self.__evict()
+
+    def __delete(self, key):
+        row = self.connection.execute('SELECT size FROM pages WHERE key = ?',
+                                      (key,)).fetchone()
+        if row:
+            self.connection.execute('DELETE FROM pages WHERE key = ?',
+                                    (key,))
+            self.size -= row[0]
+
+    def __evict(self):
+        """Remove the least recently used values until the cache is
+        no bigger than max_size"""
+
+        while self.size > self.max_size:
+            rows = self.connection.execute('SELECT key, size FROM pages '
+                                           'ORDER BY accessed LIMIT 100'
+                                           ).fetchall()
+            if not rows:
+                break
+
+            for key, size in rows:
+                self.connection.execute('DELETE FROM pages WHERE key = ?',
+                                        (key,))
+                self.size -= size
+                if self.size <= self.max_size:
+                    break
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class MemoryCache(Cache):
+    """Keep the most recently used pages in process memory, bounded
+    by number of entries and/or total bytes. Counts hits and misses
+    so the bounds can be sized.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        """
+        Parameters:
+        max_entries (int): Maximum number of pages to keep, None
+        for no limit
+        max_bytes (int): Maximum total bytes of pages to keep, None
+        for no limit
+        """
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[1] < time.time():
+                self.__delete(key)
+                entry = None
+
+            if not entry:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, expire=CT.CACHE_EXPIRE):
+        with self.lock:
+            self.__delete(key)
+            self.entries[key] = (value, time.time() + expire)
+            self.size += len(value)
+
+            # Remove the least recently used until within bounds
+            while self.entries and (
+                    (self.max_entries and
+                     len(self.entries) > self.max_entries) or
+                    (self.max_bytes and self.size > self.max_bytes)):
+                self.__delete(next(iter(self.entries)))
+
+    def __delete(self, key):
+        entry = self.entries.pop(key, None)
+        if entry:
+            self.size -= len(entry[0])
+
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self.entries),
+                'bytes': self.size}
+
+
+class TieredCache(Cache):
+    """Check a fast local cache before a slower remote cache, keeping
+    pages found remotely in the local cache for next time.
+    """
+
+    def __init__(self, local, remote):
+        """
+        Parameters:
+        local (Cache): Cache checked first, usually a MemoryCache
+        remote (Cache): Cache checked when local misses
+        """
+
+        self.local = local
+        self.remote = remote
+        self.lock = threading.Lock()
+        self.remote_hits = 0
+        self.remote_misses = 0
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+
+        value = self.remote.get(key)
+        with self.lock:
+            if value is None:
+                self.remote_misses += 1
+            else:
+                self.remote_hits += 1
+        if value is not None:
+            self.local.set(key, value)
+
+        return value
+
+    def set(self, key, value, expire=CT.CACHE_EXPIRE):
+        self.local.set(key, value, expire=expire)
+        self.remote.set(key, value, expire=expire)
+
+    def stats(self):
+        with self.lock:
+            remote = {'remote_hits': self.remote_hits,
+                      'remote_misses': self.remote_misses}
+        return {**self.local.stats(), **remote}
+
+    def close(self):
+        try:
+            self.local.close()
+        finally:
+            self.remote.close()
+
+
+def open_cache(memcached=None, path=None, max_size=CT.CACHE_MAX_SIZE,
+               memory_entries=None, memory_bytes=None,
+               pool_size=CT.POOL_SIZE):
+    """Create the cache selected by the scrape settings
+
+    Parameters:
+    memcached (str): server:port of memcached server to use for
+    caching
+    path (str): Path to a SQLite file to use for caching
+    max_size (int): Maximum bytes kept in the SQLite file
+    memory_entries (int): Maximum pages to keep in memory in front
+    of the other cache
+    memory_bytes (int): Maximum bytes to keep in memory in front of
+    the other cache
+    pool_size (int): Maximum number of connections to memcached
+
+    Returns:
+    Cache: The cache, None if caching is not requested
+    """
+
+    if memcached and path:
+        raise ValueError('Use either memcached or a cache file, not both.')
+
+    cache = None
+    if memcached:
+        cache = MemcachedCache(memcached, pool_size=pool_size)
+    elif path:
+        cache = SqliteCache(path, max_size=max_size)
+
+    if memory_entries or memory_bytes:
+        memory = MemoryCache(max_entries=memory_entries,
+                             max_bytes=memory_bytes)
+        cache = TieredCache(memory, cache) if cache else memory
+
+    return cache
@@ -0,0 +1,112 @@
+import os
+import json
+
+
+class Checkpoint():
+    """Records progress through the results of a search in a file so
+    that an interrupted scrape can carry on where it stopped. The page
+    of search results being processed is recorded along with the
+    counters at the start of that page and the URL and search rank of
+    every product already scraped, so a resumed scrape repeats the page
+    without repeating products. A listing found again at a later rank
+    is a separate product.
+    """
+
+    def __init__(self, path, url, before_save=None):
+        """Load the checkpoint if one exists for the same search
+
+        Parameters:
+        path (str): Path to the checkpoint file
+        url (str): First page of Etsy search results being scraped
+        before_save (function): Called before every save, e.g. to
+        flush output so it is never behind the checkpoint
+        """
+
+        self.path = path
+        self.url = url
+        self.before_save = before_save
+
+        self.page_url = url
+        self.search_rank = 0
+        self.success_count = 0
+        self.fail_count = 0
+        self.completed = set()
+        self.resumed = False
+
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                state = json.load(f)
+
+            if state['url'] == url:
+                self.page_url = state['page_url']
+                self.search_rank = state['search_rank']
+                self.success_count = state['success_count']
+                self.fail_count = state['fail_count']
+                self.completed = set(tuple(product) for product
+                                     in state['completed'])
+                self.resumed = True
+
+    def start_page(self, page_url, search_rank, success_count, fail_count):
+        """Record the start of a page of search results and save
+
+        Parameters:
+        page_url (str): URL of the page of search results
+        search_rank (int): Search rank before the first result
+        on the page
+        success_count (int): Products scraped before the page
+        fail_count (int): Failures before the page
+
+        Returns:
+        None
+        """
+
+        self.page_url = page_url
+        self.search_rank = search_rank
+        self.success_count = success_count
+        self.fail_count = fail_count
+        self.save()
+
+    def complete(self, listing_url, search_rank):
+        """Record a product as scraped
+
+        Parameters:
+        listing_url (str): URL of the listing
+        search_rank (int): Search rank of the product
+
+        Returns:
+        None
+        """
+
+        self.completed.add((listing_url, search_rank))
+
+    def save(self):
+        """Write the checkpoint, replacing the file in one step so a
+        crash never leaves it half written
+
+        Returns:
+        None
+        """
+
+        if self.before_save:
+            self.before_save()
+
+        state = {'url': self.url,
+                 'page_url': self.page_url,
+                 'search_rank': self.search_rank,
+                 'success_count': self.success_count,
+                 'fail_count': self.fail_count,
+                 'completed': sorted(self.completed)}
+
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(self.path + '.tmp', self.path)
+
+    def finish(self):
+        """Remove the checkpoint once the scrape is complete
+
+        Returns:
+        None
+        """
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -1,6 +1,84 @@
 # Page downloading
 RETRY_COUNT = 5
 TIMEOUT = 5
+# Connections kept open to each host
+POOL_SIZE = 10
+# Statuses retried after backing off, seconds are doubled each attempt
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+BACKOFF_FACTOR = 1
+# Longest Retry-After honored, in seconds
+MAX_RETRY_AFTER = 300
+
+# Rate limiting, in requests per second
+RATE = 5
+MIN_RATE = 0.5
+MAX_RATE = 50
+RATE_BURST = 10
+# Requests per second added each second while responses are good
+RATE_INCREASE = 1
+# Rate multipliers when throttled and when responses slow down, applied
+# at most once every RATE_COOLDOWN seconds
+RATE_DECREASE = 0.5
+RATE_SLOW_DECREASE = 0.9
+RATE_COOLDOWN = 1
+# Responses are slow when the average latency is this many times the
+# lowest average seen and over RATE_SLOW_LATENCY seconds, the average
+# weights the latest response by RATE_LATENCY_WEIGHT
+RATE_SLOW_FACTOR = 3
+RATE_SLOW_LATENCY = 1
+RATE_LATENCY_WEIGHT = 0.1
+
+# Number of products scraped at the same time
+CONCURRENCY = 8
+# Number of listings downloaded at the same time by the async engine,
+# which needs no thread for each
+ASYNC_CONCURRENCY = 100
+# Products the async engine starts ahead of the next product to yield,
+# as a multiple of its concurrency, so one slow listing does not stop
+# the others being downloaded
+ASYNC_READ_AHEAD = 2
+# Number of searches scraped at the same time in a batch
+QUERY_CONCURRENCY = 4
+# Listings whose details are kept for products of the same listing
+# found again later in the results, when not shared with other scrapes
+DETAILS_MEMO_SIZE = 1000
+# Listings found again in the results are output again with their new
+# search rank ('rank') or left out ('skip')
+DUPLICATES = 'rank'
+
+# Parsing
+PARSER = 'html.parser'
 
 # Caching
+# Seconds a cached page is used without checking if it changed
 CACHE_EXPIRE = 10800
+# Seconds a cached page is kept for revalidating once stale
+CACHE_STALE_EXPIRE = 604800
+CACHE_MAX_SIZE = 1024 * 1024 * 1024
+CACHE_CODEC = 'zlib'
+CACHE_COMPRESS_LEVEL = 6
+
+# Distributed crawls
+# Seconds a worker has to download a listing before it is given to
+# another worker, and the most times it is given out
+QUEUE_LEASE = 300
+QUEUE_MAX_ATTEMPTS = 3
+# Seconds to wait for another process to release the queue file, and
+# seconds between checks for new work
+QUEUE_BUSY_TIMEOUT = 30
+QUEUE_POLL_INTERVAL = 1
+# Results read from the queue at a time when assembling the output
+QUEUE_READ_ROWS = 1000
+
+# Metrics
+# Values kept for the percentiles of each timing or size
+METRICS_SAMPLES = 10000
+
+# Failures written to the failure log at a time
+FAIL_LOG_BATCH_ROWS = 1000
+
+# Output
+WRITE_BUFFER_ROWS = 100
+WRITE_FLUSH_INTERVAL = 5
+# Rows in each row group of Parquet output
+PARQUET_ROW_GROUP_ROWS = 10000
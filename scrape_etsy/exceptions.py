@@ -7,8 +7,25 @@ class ProductScrapeException(Exception):
 
 
 class GetPageException(Exception):
-    pass
+    def __init__(self, url, status=None, attempts=None):
+        """
+        Parameters:
+        url (str): URL of the page
+        status (int): HTTP status of the last response, None if there
+        was no response
+        attempts (int): Number of times the download was attempted
+        """
+
+        super().__init__(f'HTTP status {status} for {url}' if status
+                         else url)
+        self.url = url
+        self.status = status
+        self.attempts = attempts
 
 
 class NoResultsException(Exception):
     pass
+
+
+class InvalidValueException(Exception):
+    pass
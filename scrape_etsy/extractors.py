@@ -0,0 +1,159 @@
+import re
+import soupsieve
+from bs4 import SoupStrainer
+from bs4.element import Tag
+
+import scrape_etsy.paths as PATH
+from scrape_etsy.exceptions import MissingValueException
+
+# Tag name and attributes at the start of a selector, such as
+# div[data-processing-time] in div[data-processing-time] > p
+REGION_ROOT = re.compile(r'([\w-]+)((?:\[[^\]]+\])+)')
+REGION_ATTRIBUTE = re.compile(r'\[([\w-]+)(?:=([^\]]+))?\]')
+
+
+class FieldExtractor():
+    """Extracts the value of one field from a BeautifulSoup tag. The
+    selectors and remove regex of the field are compiled once when
+    the extractor is created rather than for every product.
+    """
+
+    def __init__(self, selector, attribute=None, required=True, remove=None,
+                 **kwargs):
+        """
+        Parameters:
+        selector (str|list): BeautifulSoup selection string to find the
+        value, or a list of selectors to try in order
+        attribute (str): Name if the attribute that contains the value
+        required (bool): If not required, do not raise an exception,
+        just return an empty value
+        remove (str): Regex for anything to strip out
+        """
+
+        self.selector = selector
+        selectors = selector if type(selector) == list else [selector]
+        self.selectors = [soupsieve.compile(s) for s in selectors]
+        self.attribute = attribute
+        self.required = required
+        self.remove = re.compile(remove) if remove else None
+
+    def __call__(self, tag):
+        """Retrieve the value from a tag
+
+        Parameters:
+        tag (bs4.element.Tag): The tag to get the value from
+
+        Returns:
+        str: The value found, empty if not found and not required
+        """
+
+        for selector in self.selectors:
+            found = selector.select_one(tag)
+            if found is None:
+                continue
+
+            if self.attribute:
+                value = found.get(self.attribute)
+                if value is None:
+                    continue
+            else:
+                value = found.text.strip()
+            break
+        else:
+            if not self.required:
+                return ''
+            raise MissingValueException(f'Failed to find "{self.selector}".')
+
+        if self.remove:
+            return self.remove.sub('', value)
+        return value
+
+
+def compile_fields(fields):
+    """Create extractors for every field which has a selector
+
+    Parameters:
+    fields (dict): Field specifications from paths
+
+    Returns:
+    dict: FieldExtractor for each field name
+    """
+
+    return dict((field_name, FieldExtractor(**field))
+                for field_name, field in fields.items()
+                if 'selector' in field)
+
+
+def field_regions(fields):
+    """Find the elements of a page which contain every field, from the
+    tag name and attributes each selector starts with
+
+    Parameters:
+    fields (dict): Field specifications from paths
+
+    Returns:
+    list: (tag name, attributes) for each region, where True matches
+    any value of the attribute, raises ValueError if a selector does
+    not start with a tag name and attributes
+    """
+
+    regions = []
+    for field in fields.values():
+        selectors = field['selector'] if type(field['selector']) == list \
+            else [field['selector']]
+        for selector in selectors:
+            match = REGION_ROOT.match(selector)
+            if not match:
+                raise ValueError(f'Selector "{selector}" does not start '
+                                 f'with a tag name and attributes.')
+
+            attrs = dict((name, value.replace('\\', '').strip('"\'')
+                          if value else True)
+                         for name, value
+                         in REGION_ATTRIBUTE.findall(match.group(2)))
+            if (match.group(1), attrs) not in regions:
+                regions.append((match.group(1), attrs))
+
+    return regions
+
+
+def in_regions(regions):
+    """Create a function matching tags in any of the given regions,
+    for use with a SoupStrainer
+
+    Parameters:
+    regions (list): (tag name, attributes) for each region
+
+    Returns:
+    function: Takes a tag name and attributes and returns True if
+    the tag starts one of the regions
+    """
+
+    def matches(name, attrs=None):
+        if isinstance(name, Tag):
+            name, attrs = name.name, name.attrs
+
+        for region_name, region_attrs in regions:
+            if name == region_name and all(
+                    attr in attrs if value is True else
+                    attrs.get(attr) == value
+                    for attr, value in region_attrs.items()):
+                return True
+        return False
+
+    return matches
+
+
+SEARCH_RESULT = soupsieve.compile(PATH.SEARCH_RESULT)
+SEARCH_PAGE_BUTTON = soupsieve.compile(PATH.SEARCH_PAGE_BUTTON)
+RESULT_LINK = soupsieve.compile(PATH.RESULT_LINK)
+LISTING_ID = re.compile(PATH.LISTING_ID)
+
+SEARCH_EXTRACTORS = compile_fields(PATH.SEARCH_FIELDS)
+DETAIL_EXTRACTORS = compile_fields(PATH.DETAIL_FIELDS)
+REFRESH_FIELDS = [field_name for field_name, field
+                  in PATH.SEARCH_FIELDS.items() if field.get('refresh')]
+
+# Parsing only these elements of a listing page keeps every detail field
+DETAIL_REGIONS = field_regions(PATH.DETAIL_FIELDS)
+DETAIL_STRAINER = SoupStrainer(in_regions(DETAIL_REGIONS))
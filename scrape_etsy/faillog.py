@@ -0,0 +1,117 @@
+import os
+import csv
+import queue
+import threading
+from datetime import datetime
+
+import scrape_etsy.constants as CT
+
+# Columns of the failure log
+FIELDS = ['time', 'url', 'stage', 'exception', 'status', 'attempts',
+          'message']
+
+
+class FailLog():
+    """Writes failures to a CSV file from a background thread, so a
+    burst of failures does not hold up scraping. Failures are queued
+    and every failure waiting is written and flushed together. Share
+    one log between every scrape writing to the same file.
+    """
+
+    def __init__(self, path):
+        """Open the log, writing the header row if the file is empty.
+        A log with other columns, such as one from before the columns
+        were added, is moved aside to the first free path.1, path.2 and
+        so on, and a new log is started.
+
+        Parameters:
+        path (str): Path to the failure log, appended to if it exists
+        with the same columns
+        """
+
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, newline='') as f:
+                header = next(csv.reader(f), None)
+            if header != FIELDS:
+                number = 1
+                while os.path.exists(f'{path}.{number}'):
+                    number += 1
+                os.replace(path, f'{path}.{number}')
+
+        self.path = path
+        self.records = queue.Queue()
+        self.file = open(path, 'a', newline='')
+        self.writer = csv.writer(self.file, delimiter=',', quotechar='"',
+                                 quoting=csv.QUOTE_MINIMAL,
+                                 doublequote=True)
+        if self.file.tell() == 0:
+            self.writer.writerow(FIELDS)
+            self.file.flush()
+
+        self.thread = threading.Thread(target=self.__write, daemon=True)
+        self.thread.start()
+
+    def log(self, url, error, stage=None, status=None, attempts=None):
+        """Queue a failure to be written
+
+        Parameters:
+        url (str): URL for which the failure occured
+        error (Exception): The error which occured
+        stage (str): Stage of the scrape which failed, such as fetch
+        status (int): HTTP status of the last response, if any
+        attempts (int): Number of times the download was attempted
+
+        Returns:
+        None
+        """
+
+        self.records.put([str(datetime.now()), url, stage,
+                          type(error).__name__, status, attempts,
+                          str(error) or type(error).__name__])
+
+    def flush(self):
+        """Wait until every failure queued so far is written
+
+        Returns:
+        None
+        """
+
+        self.records.join()
+
+    def close(self):
+        """Write every queued failure and close the file
+
+        Returns:
+        None
+        """
+
+        self.records.put(None)
+        self.thread.join()
+        self.file.close()
+
+    def __write(self):
+        """Write queued failures until the log is closed"""
+
+        while True:
+            records = [self.records.get()]
+            # Take everything else waiting, up to a batch
+            while len(records) < CT.FAIL_LOG_BATCH_ROWS:
+                try:
+                    records.append(self.records.get_nowait())
+                except queue.Empty:
+                    break
+
+            self.writer.writerows(record for record in records
+                                  if record is not None)
+            self.file.flush()
+            for record in records:
+                self.records.task_done()
+
+            if None in records:
+                return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
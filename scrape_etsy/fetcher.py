@@ -0,0 +1,233 @@
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+import scrape_etsy.constants as CT
+from scrape_etsy.cache import encode_page, decode_page, check_codec
+from scrape_etsy.ratelimit import retry_after_seconds
+from scrape_etsy.metrics import Metrics
+from scrape_etsy.exceptions import GetPageException
+
+
+def read_cached(cached_value):
+    """Read a cached page and decide if it can be used as it is
+
+    Parameters:
+    cached_value (bytes): Value from the cache, may be None
+
+    Returns:
+    tuple: The page, its validators, True if it is fresh and headers
+    to revalidate it with if it is not
+    """
+
+    if not cached_value:
+        return None, {}, False, {}
+
+    cached_page, cached_validators = decode_page(cached_value)
+    if cached_page is None:
+        # Could not be decoded, downloaded again
+        return None, {}, False, {}
+
+    # Pages stored without a time are from before revalidation and
+    # were stored with a hard expiry
+    stored = cached_validators.get('stored')
+    if not stored or time.time() - stored < CT.CACHE_EXPIRE:
+        return cached_page, cached_validators, True, {}
+
+    headers = {}
+    if cached_validators.get('etag'):
+        headers['If-None-Match'] = cached_validators['etag']
+    if cached_validators.get('last_modified'):
+        headers['If-Modified-Since'] = cached_validators['last_modified']
+
+    return cached_page, cached_validators, False, headers
+
+
+def new_validators(headers, not_modified, cached_validators):
+    """Get the validators to cache a downloaded page with
+
+    Parameters:
+    headers (dict): Headers of the response
+    not_modified (bool): True if the response was a 304
+    cached_validators (dict): Validators the page was cached with
+
+    Returns:
+    dict: Time stored, ETag and Last-Modified of the page
+    """
+
+    validators = {'stored': time.time(),
+                  'etag': headers.get('ETag'),
+                  'last_modified': headers.get('Last-Modified')}
+    if not_modified:
+        # A 304 may leave out validators which have not changed
+        for name, value in validators.items():
+            validators[name] = value or cached_validators.get(name)
+
+    return validators
+
+
+class Fetcher():
+    """Downloads pages over a pooled keep-alive HTTP session and
+    optionally caches them. Create one per run and share it between
+    threads, connections are reused between pages and every download
+    goes through the same rate limiter.
+    """
+
+    def __init__(self, cache=None, pool_size=CT.POOL_SIZE,
+                 compression=CT.CACHE_CODEC,
+                 compression_level=CT.CACHE_COMPRESS_LEVEL,
+                 limiter=None,
+                 metrics=None):
+        """
+        Parameters:
+        cache (Cache): Cache to keep pages in, closed with the fetcher
+        pool_size (int): Maximum number of connections kept open to
+        each host
+        compression (str): Compression for cached pages, one of none,
+        zlib or zstd
+        compression_level (int): Compression level for the codec
+        limiter (RateLimiter): Rate limiter to wait on before every
+        download, None for no limit
+        metrics (Metrics): Metrics to record fetch timings and sizes in
+        """
+
+        check_codec(compression)
+        self.compression = compression
+        self.compression_level = compression_level
+
+        # Statuses are retried in get so the rate limiter sees them,
+        # urllib3 only retries failed connections
+        retry_strategy = Retry(
+            total=CT.RETRY_COUNT,
+            method_whitelist=["HEAD", "GET", "OPTIONS"],
+            backoff_factor=CT.BACKOFF_FACTOR,
+            respect_retry_after_header=False,
+        )
+        adapter = HTTPAdapter(max_retries=retry_strategy,
+                              pool_connections=pool_size,
+                              pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.cache = cache
+        self.limiter = limiter
+        self.metrics = metrics or Metrics()
+
+    def get(self, url):
+        """Get a page from the cache or download it, retrying
+        CT.RETRY_COUNT times before failing. Throttled downloads are
+        retried after Retry-After or a doubling backoff. Cached pages
+        older than CT.CACHE_EXPIRE are revalidated with their ETag or
+        Last-Modified and only downloaded again if they changed.
+
+        Parameters:
+        url (str): URL to get
+
+        Returns:
+        str: Content of the page
+        """
+
+        cached_value = None
+        if self.cache:
+            with self.metrics.timer('fetch.cache'):
+                cached_value = self.cache.get(url)
+        cached_page, cached_validators, fresh, headers = \
+            read_cached(cached_value)
+        if fresh:
+            self.metrics.count('fetch.cache_hits')
+            return cached_page
+
+        response, attempts = self.__download(url, headers)
+
+        if response.status_code == 304 and headers:
+            # Unchanged, keep the cached page fresh for another period
+            self.metrics.count('fetch.revalidated')
+            page = cached_page
+        elif response.status_code == 200:
+            page = response.text
+        else:
+            raise GetPageException(url, status=response.status_code,
+                                   attempts=attempts)
+
+        if self.cache:
+            validators = new_validators(response.headers,
+                                        response.status_code == 304,
+                                        cached_validators)
+            self.cache.set(url, encode_page(page,
+                                            validators=validators,
+                                            codec=self.compression,
+                                            level=self.compression_level),
+                           expire=CT.CACHE_STALE_EXPIRE)
+
+        return page
+
+    def __download(self, url, headers):
+        """Download a page, waiting on the rate limiter before each
+        attempt and retrying throttled responses
+
+        Parameters:
+        url (str): URL to download
+        headers (dict): Extra request headers
+
+        Returns:
+        tuple: The last response and the number of attempts made
+        """
+
+        for attempt in range(CT.RETRY_COUNT + 1):
+            if self.limiter:
+                with self.metrics.timer('fetch.rate_wait'):
+                    self.limiter.acquire()
+
+            started = time.monotonic()
+            try:
+                response = self.session.get(url, headers=headers,
+                                            timeout=CT.TIMEOUT)
+            except requests.exceptions.RequestException as e:
+                raise GetPageException(url, attempts=attempt + 1) from e
+            latency = time.monotonic() - started
+
+            # Retried attempts are timed apart from first attempts
+            self.metrics.timing('fetch.retry' if attempt else
+                                'fetch.network', latency)
+            self.metrics.size('fetch.bytes', len(response.content))
+
+            if response.status_code not in CT.RETRY_STATUSES:
+                if self.limiter:
+                    self.limiter.success(latency)
+                return response, attempt + 1
+
+            wait = retry_after_seconds(response.headers.get('Retry-After'))
+            if self.limiter:
+                self.limiter.throttled(wait)
+            if attempt == CT.RETRY_COUNT:
+                break
+
+            if wait is None:
+                wait = CT.BACKOFF_FACTOR * 2 ** attempt
+            elif self.limiter:
+                # Every request already waits in acquire
+                wait = 0
+            self.metrics.count('fetch.retries')
+            with self.metrics.timer('fetch.backoff'):
+                time.sleep(wait)
+
+        return response, attempt + 1
+
+    def close(self):
+        """Close all pooled connections
+
+        Returns:
+        None
+        """
+
+        self.session.close()
+        if self.cache:
+            self.cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,184 @@
+import json
+import time
+import random
+import threading
+from contextlib import contextmanager
+
+import scrape_etsy.constants as CT
+
+
+class _Series():
+    """Count, total and maximum of every value observed, with a
+    uniform sample of at most CT.METRICS_SAMPLES values for
+    percentiles so memory does not grow with the run.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = None
+        self.samples = []
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.max = value if self.max is None else max(self.max, value)
+
+        if len(self.samples) < CT.METRICS_SAMPLES:
+            self.samples.append(value)
+        else:
+            i = random.randrange(self.count)
+            if i < CT.METRICS_SAMPLES:
+                self.samples[i] = value
+
+    def percentile(self, fraction):
+        samples = sorted(self.samples)
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+class Metrics():
+    """Timings, sizes and counters from the stages of a run. Timings
+    are in seconds, sizes in bytes. Shared by every thread of a run.
+    """
+
+    def __init__(self, callback=None):
+        """
+        Parameters:
+        callback (function): Called with the name and value of every
+        timing, size and count as it is recorded, from whichever
+        thread recorded it
+        """
+
+        self.callback = callback
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.sizes = {}
+        self.counters = {}
+
+    def timing(self, name, seconds):
+        """Record how long a stage took
+
+        Parameters:
+        name (str): Name of the stage
+        seconds (float): Time taken
+
+        Returns:
+        None
+        """
+
+        self.__add(self.timings, name, seconds)
+
+    def size(self, name, size):
+        """Record a size, such as bytes downloaded
+
+        Parameters:
+        name (str): Name of the size
+        size (int): Size in bytes
+
+        Returns:
+        None
+        """
+
+        self.__add(self.sizes, name, size)
+
+    def count(self, name, n=1):
+        """Add to a counter
+
+        Parameters:
+        name (str): Name of the counter
+        n (int): Amount to add
+
+        Returns:
+        None
+        """
+
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+        if self.callback:
+            self.callback(name, n)
+
+    @contextmanager
+    def timer(self, name):
+        """Time the body of a with statement as a stage
+
+        Parameters:
+        name (str): Name of the stage
+        """
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timing(name, time.perf_counter() - started)
+
+    def __add(self, series, name, value):
+        with self.lock:
+            if name not in series:
+                series[name] = _Series()
+            series[name].add(value)
+        if self.callback:
+            self.callback(name, value)
+
+    def summary(self):
+        """Summarise everything recorded
+
+        Returns:
+        dict: Count, total, mean, percentiles and maximum of each
+        timing and size, and the value of each counter
+        """
+
+        with self.lock:
+            summary = {}
+            for kind, series in (('timings', self.timings),
+                                 ('sizes', self.sizes)):
+                summary[kind] = dict(
+                    (name, {'count': values.count,
+                            'total': values.total,
+                            'mean': values.total / values.count,
+                            'p50': values.percentile(0.5),
+                            'p90': values.percentile(0.9),
+                            'p99': values.percentile(0.99),
+                            'max': values.max})
+                    for name, values in sorted(series.items()))
+            summary['counters'] = dict(sorted(self.counters.items()))
+
+        return summary
+
+    def report(self):
+        """Describe everything recorded, timings in milliseconds
+
+        Returns:
+        str: One line for each timing, size and counter
+        """
+
+        summary = self.summary()
+        lines = []
+        for name, values in summary['timings'].items():
+            lines.append(f'{name}: {values["count"]} in '
+                         f'{values["total"]:.2f}s, ' + ', '.join(
+                             f'{stat} {values[stat] * 1000:.1f}ms'
+                             for stat in ('mean', 'p50', 'p90', 'p99',
+                                          'max')))
+        for name, values in summary['sizes'].items():
+            lines.append(f'{name}: {values["count"]} totalling '
+                         f'{values["total"]} bytes, ' + ', '.join(
+                             f'{stat} {values[stat]:.0f}'
+                             for stat in ('mean', 'p50', 'p90', 'p99',
+                                          'max')))
+        for name, value in summary['counters'].items():
+            lines.append(f'{name}: {value}')
+
+        return '\n'.join(lines)
+
+    def save(self, path):
+        """Write the summary to a JSON file
+
+        Parameters:
+        path (str): Path to the JSON file
+
+        Returns:
+        None
+        """
+
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
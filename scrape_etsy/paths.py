@@ -3,6 +3,8 @@
 SEARCH_RESULT = 'div[data-search-results] li.wt-list-unstyled'
 SEARCH_PAGE_BUTTON = 'nav.search-pagination a.wt-btn'
 RESULT_LINK = 'a.listing-link'
+# Listing ID in the path of a listing URL
+LISTING_ID = r'/listing/(\d+)'
 
 
 def __is_type(value, type):
@@ -13,6 +15,10 @@ def __is_type(value, type):
         return False
 
 
+# Fields with refresh set are compared with the previous scrape of a
+# listing, its details are only downloaded again if one has changed.
+# Fields with a type of int or float are written as numbers by output
+# formats with typed columns, other fields are text.
 SEARCH_FIELDS = {
     'title': {'selector': 'a.listing-link h3',
               'tests': [
@@ -22,7 +28,7 @@ SEARCH_FIELDS = {
         'span.promotion-price span.currency-symbol',
         'span.n-listing-card__price > '
         'span.currency-symbol',
-    ], 'required': True,
+    ], 'required': True, 'refresh': True,
         'tests': [
             lambda value: len(value) > 0,
         ]},
@@ -30,23 +36,26 @@ SEARCH_FIELDS = {
         'span.promotion-price span.currency-value',
         'span.n-listing-card__price > '
         'span.currency-value',
-    ], 'required': True,
+    ], 'required': True, 'refresh': True, 'type': 'float',
         'tests': [
             lambda value: len(value) > 0,
             lambda value: __is_type(value, float),
         ]},
     'sale_currency': {'selector': 'span.n-listing-card__price > span > '
                       'span.currency-symbol', 'required': False,
+                      'refresh': True,
                       'tests': [
                       ]},
     'sale_value': {'selector': 'span.n-listing-card__price > span '
                    '> span.currency-value', 'required': False,
+                   'refresh': True, 'type': 'float',
                    'tests': [
                    ]},
     'review_rating': {'selector': ('a.listing-link '
                                    'span.v2-listing-card__rating '
                                    '> span > span.screen-reader-only'),
                       'required': False, 'remove': r'\ out of 5 stars',
+                      'type': 'float',
                       'tests': [
                           lambda value: __is_type(value, float)
                           if len(value) > 0 else True,
@@ -55,6 +64,7 @@ SEARCH_FIELDS = {
                                   'span.v2-listing-card__rating '
                                   '> span.screen-reader-only'),
                      'required': False, 'remove': r',|\ reviews',
+                     'refresh': True, 'type': 'int',
                      'tests': [
                           lambda value: __is_type(value, int)
                           if len(value) > 0 else True,
@@ -63,9 +73,10 @@ SEARCH_FIELDS = {
             'tests': [
                 lambda value: len(value) > 0,
             ]},
-    'search_rank': {'tests': [
-        lambda value: __is_type(value, int),
-    ]},
+    'search_rank': {'type': 'int',
+                    'tests': [
+                        lambda value: __is_type(value, int),
+                    ]},
 }
 
 DETAIL_FIELDS = {
@@ -76,6 +87,7 @@ DETAIL_FIELDS = {
                           ]},
     'shipping_value': {'selector': ('div[data-estimated-shipping] '
                                     'span.currency-value'), 'required': False,
+                       'type': 'float',
                        'tests': [
                            lambda value: __is_type(value, float)
                            if len(value) > 0 else True,
@@ -102,6 +114,7 @@ DETAIL_FIELDS = {
                                 'span.wt-screen-reader-only'),
                    'required': False,
                    'remove': r',|\ sales',
+                   'type': 'int',
                    'tests': [
                        lambda value: __is_type(value, int)
                        if len(value) > 0 else True,
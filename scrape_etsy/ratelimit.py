@@ -0,0 +1,174 @@
+import time
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import scrape_etsy.constants as CT
+
+
+def retry_after_seconds(value):
+    """Read a Retry-After header, given either in seconds or as an
+    HTTP date
+
+    Parameters:
+    value (str): Value of the header, may be None
+
+    Returns:
+    float: Seconds to wait, at most CT.MAX_RETRY_AFTER, None if the
+    header is missing or can not be read
+    """
+
+    if not value:
+        return None
+
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) -
+                       datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+
+    return min(max(seconds, 0), CT.MAX_RETRY_AFTER)
+
+
+class RateLimiter():
+    """Token bucket shared by every request of a run, so the request
+    rate is limited however many workers there are. The rate grows
+    while responses are quick and successful, and is cut when the site
+    throttles (429 or 5xx) or responses slow down. Retry-After pauses
+    every worker, not only the one which was told.
+    """
+
+    def __init__(self, rate=CT.RATE, min_rate=CT.MIN_RATE,
+                 max_rate=CT.MAX_RATE, burst=CT.RATE_BURST):
+        """
+        Parameters:
+        rate (float): Requests per second to start at
+        min_rate (float): Requests per second never to go below
+        max_rate (float): Requests per second never to go above
+        burst (int): Most requests which can be made at once after
+        being idle
+        """
+
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+
+        self.lock = threading.Lock()
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.resume_at = 0
+        self.last_decrease = 0
+        self.latency = None
+        self.base_latency = None
+        self.throttled_count = 0
+
+    def acquire(self):
+        """Wait until a request may be made
+
+        Returns:
+        None
+        """
+
+        while True:
+            wait = self.reserve()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def reserve(self):
+        """Take a token if a request may be made now, without waiting.
+        Lets callers which can not block, such as coroutines, wait in
+        their own way.
+
+        Returns:
+        float: 0 if a token was taken, otherwise seconds to wait before
+        trying again
+        """
+
+        with self.lock:
+            now = time.monotonic()
+            self.__refill(now)
+            if now >= self.resume_at and self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return max(self.resume_at - now, (1 - self.tokens) / self.rate)
+
+    def success(self, latency):
+        """Record a successful response, raising the rate unless
+        responses are slowing down
+
+        Parameters:
+        latency (float): Seconds the request took
+
+        Returns:
+        None
+        """
+
+        with self.lock:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += CT.RATE_LATENCY_WEIGHT * \
+                    (latency - self.latency)
+            self.base_latency = min(self.base_latency or self.latency,
+                                    self.latency)
+
+            if self.latency > max(self.base_latency * CT.RATE_SLOW_FACTOR,
+                                  CT.RATE_SLOW_LATENCY):
+                # Slower than the site has been, it is near its limit
+                self.__decrease(CT.RATE_SLOW_DECREASE)
+            else:
+                # Grows by about RATE_INCREASE requests per second
+                # every second
+                self.rate = min(self.max_rate,
+                                self.rate + CT.RATE_INCREASE / self.rate)
+
+    def throttled(self, retry_after=None):
+        """Record a throttled response, cutting the rate and pausing
+        every request for retry_after seconds if given
+
+        Parameters:
+        retry_after (float): Seconds the site asked to wait
+
+        Returns:
+        None
+        """
+
+        with self.lock:
+            self.throttled_count += 1
+            self.__decrease(CT.RATE_DECREASE)
+            if retry_after:
+                self.resume_at = max(self.resume_at,
+                                     time.monotonic() + retry_after)
+
+    def __refill(self, now):
+        # No tokens are gained while paused
+        since = max(self.updated, self.resume_at)
+        if now > since:
+            self.tokens = min(self.burst,
+                              self.tokens + (now - since) * self.rate)
+        self.updated = now
+
+    def __decrease(self, factor):
+        """Multiply the rate by factor, at most once per
+        CT.RATE_COOLDOWN so a burst of throttled responses to requests
+        made at the same time only counts once"""
+
+        now = time.monotonic()
+        if now - self.last_decrease >= CT.RATE_COOLDOWN:
+            self.rate = max(self.min_rate, self.rate * factor)
+            self.last_decrease = now
+
+    def stats(self):
+        """Get the current rate and how often requests were throttled
+
+        Returns:
+        dict: Counter values by name
+        """
+
+        return {'rate': round(self.rate, 1),
+                'throttled': self.throttled_count}
@@ -0,0 +1,281 @@
+import os
+import gzip
+import json
+import threading
+import http.server
+from urllib.parse import urlparse
+
+import requests
+
+from scrape_etsy.exceptions import GetPageException
+
+# Bumped when the archive file changes format
+ARCHIVE_VERSION = 1
+
+
+class PageArchive():
+    """Pages recorded from a scrape, kept in a gzipped JSON file so
+    the same scrape can be replayed offline. A page which failed to
+    download is recorded as None so it fails again when replayed.
+    """
+
+    def __init__(self, path=None):
+        """Load the archive if the file exists
+
+        Parameters:
+        path (str): Path to the archive file, None to keep it in
+        memory only
+        """
+
+        self.path = path
+        self.lock = threading.Lock()
+        self.pages = {}
+
+        if path and os.path.exists(path):
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                archive = json.load(f)
+            if archive.get('version') != ARCHIVE_VERSION:
+                raise ValueError(f'{path} is not a version '
+                                 f'{ARCHIVE_VERSION} page archive.')
+            self.pages = archive['pages']
+
+    def get(self, url):
+        """Get a recorded page
+
+        Parameters:
+        url (str): URL of the page
+
+        Returns:
+        str: Content of the page, None if it failed when recorded,
+        raises KeyError if it was never recorded
+        """
+
+        return self.pages[url]
+
+    def put(self, url, page):
+        """Record a page
+
+        Parameters:
+        url (str): URL of the page
+        page (str): Content of the page, None if it failed
+
+        Returns:
+        None
+        """
+
+        with self.lock:
+            self.pages[url] = page
+
+    def origins(self):
+        """Get the scheme and host of every recorded page
+
+        Returns:
+        set: Origins such as https://www.etsy.com
+        """
+
+        return set(f'{parts.scheme}://{parts.netloc}'
+                   for parts in map(urlparse, self.pages))
+
+    def save(self):
+        """Write the archive, replacing the file in one step
+
+        Returns:
+        None
+        """
+
+        with self.lock:
+            archive = {'version': ARCHIVE_VERSION, 'pages': self.pages}
+            with gzip.open(self.path + '.tmp', 'wt', encoding='utf-8') as f:
+                json.dump(archive, f)
+            os.replace(self.path + '.tmp', self.path)
+
+
+class RecordingFetcher():
+    """Wraps a Fetcher, recording every page it gets into an archive
+    which is saved when the fetcher is closed.
+    """
+
+    def __init__(self, fetcher, archive):
+        """
+        Parameters:
+        fetcher (Fetcher): Fetcher to get pages with
+        archive (PageArchive): Archive to record pages in
+        """
+
+        self.fetcher = fetcher
+        self.archive = archive
+        self.cache = fetcher.cache
+        self.limiter = fetcher.limiter
+        self.metrics = fetcher.metrics
+
+    def get(self, url):
+        try:
+            page = self.fetcher.get(url)
+        except GetPageException:
+            self.archive.put(url, None)
+            raise
+
+        self.archive.put(url, page)
+        return page
+
+    def close(self):
+        try:
+            self.archive.save()
+        finally:
+            self.fetcher.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ReplayFetcher():
+    """Gets pages from an archive instead of downloading them, so a
+    recorded scrape can be repeated offline with the same results.
+    """
+
+    cache = None
+    limiter = None
+    metrics = None
+
+    def __init__(self, archive):
+        """
+        Parameters:
+        archive (PageArchive): Archive to get pages from
+        """
+
+        self.archive = archive
+
+    def get(self, url):
+        try:
+            page = self.archive.get(url)
+        except KeyError:
+            page = None
+        if page is None:
+            raise GetPageException(url) from \
+                requests.exceptions.ConnectionError()
+
+        return page
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ArchiveServer():
+    """Serves an archive over HTTP on localhost, standing in for the
+    site it was recorded from. Links to the recorded site are rewritten
+    to point at the server, so a scrape started from url() follows
+    them through the full download stack.
+    """
+
+    def __init__(self, archive, host='127.0.0.1', port=0):
+        """
+        Parameters:
+        archive (PageArchive): Archive to serve
+        host (str): Address to listen on
+        port (int): Port to listen on, 0 for any free port
+        """
+
+        self.archive = archive
+        self.origins = sorted(archive.origins(), key=len, reverse=True)
+        self.requests = 0
+        self.lock = threading.Lock()
+
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                body = server.page(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                body = body.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f'http://{host}:{self.server.server_port}'
+
+    def url(self, url):
+        """Get the URL on the server of a recorded page
+
+        Parameters:
+        url (str): URL the page was recorded from
+
+        Returns:
+        str: URL of the page on the server
+        """
+
+        for origin in self.origins:
+            if url.startswith(origin):
+                return self.base_url + url[len(origin):]
+        return url
+
+    def page(self, path):
+        """Get a recorded page with its links rewritten
+
+        Parameters:
+        path (str): Path and query string requested from the server
+
+        Returns:
+        str: Content of the page, None if not recorded or failed
+        """
+
+        with self.lock:
+            self.requests += 1
+
+        for origin in self.origins:
+            page = self.archive.pages.get(origin + path)
+            if page is not None:
+                for link_origin in self.origins:
+                    page = page.replace(link_origin, self.base_url)
+                return page
+
+        return None
+
+    def start(self):
+        """Serve in a background thread
+
+        Returns:
+        ArchiveServer: The server
+        """
+
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stop serving
+
+        Returns:
+        None
+        """
+
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -1,25 +1,46 @@
-# TODO Callback for csv output and remove giant list creation
-
-import sys
+import os
 import re
-import csv
-import requests
-from bs4 import BeautifulSoup
-from pymemcache.client import base
-from datetime import datetime
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
+import time
+import queue
+import socket
+import types
+import asyncio
+import inspect
+import functools
+import threading
+import contextvars
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import (ThreadPoolExecutor, ProcessPoolExecutor,
+                                Future, FIRST_COMPLETED)
+from concurrent.futures import wait as futures_wait
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.builder import builder_registry
+from urllib.parse import urlparse, urlunparse, parse_qs
 
 import scrape_etsy.constants as CT
 import scrape_etsy.paths as PATH
+import scrape_etsy.extractors as EXTRACT
+from scrape_etsy.fetcher import Fetcher
+from scrape_etsy.async_fetcher import AsyncFetcher, ThreadedFetcher
+from scrape_etsy.cache import open_cache
+from scrape_etsy.ratelimit import RateLimiter
+from scrape_etsy.replay import PageArchive, RecordingFetcher, ReplayFetcher
+from scrape_etsy.checkpoint import Checkpoint
+from scrape_etsy.metrics import Metrics
+from scrape_etsy.faillog import FailLog
+from scrape_etsy.writers import open_writer, read_rows, coerce, get_format
+from scrape_etsy.validate import Validator
+from scrape_etsy.workqueue import SqliteWorkQueue
+from scrape_etsy.extractors import FieldExtractor
 from scrape_etsy.exceptions import (MissingValueException,
                                     GetPageException,
-                                    ProductScrapeException)
+                                    ProductScrapeException,
+                                    InvalidValueException)
 
-__memcached__ = None
-__fail_log_callback__ = None
-__fail_log__ = None
-__output__ = None
+# Settings of the run in progress, see __own_run
+__run__ = contextvars.ContextVar('run', default=None)
+__shared_details_lock__ = threading.Lock()
 
 '''
 __author__ = "Phil Nicholls"
@@ -33,9 +54,120 @@ __status__ = "Development"
 '''
 
 
+def __new_run():
+    """Make the settings of a run, with the defaults used when the
+    scraping functions are called outside of one
+
+    Returns:
+    types.SimpleNamespace: The fetcher, parser, partial_parse,
+    parse_executor, metrics, fail_log and fail_log_callback of the run
+    """
+
+    return types.SimpleNamespace(fetcher=None,
+                                 parser=CT.PARSER,
+                                 partial_parse=False,
+                                 parse_executor=None,
+                                 metrics=Metrics(),
+                                 fail_log=None,
+                                 fail_log_callback=None)
+
+
+def __current_run():
+    """Get the settings of the run in progress, starting a run with
+    the default settings if there is none
+
+    Returns:
+    types.SimpleNamespace: Settings of the run, see __new_run
+    """
+
+    run = __run__.get()
+    if run is None:
+        run = __new_run()
+        __run__.set(run)
+    return run
+
+
+def __own_run(function):
+    """Decorate a scraping function so each call is a run of its own.
+    The call runs in a copy of the caller's context holding the
+    settings of the run, so runs going at the same time, in threads or
+    on one event loop, do not see each other's settings. Every step of
+    a generator runs in the same context. Work handed to other threads
+    has to be run in a copy of the context, see __in_run.
+
+    Parameters:
+    function (function): Function, generator function or async
+    generator function to decorate
+
+    Returns:
+    function: The decorated function
+    """
+
+    def start_run():
+        context = contextvars.copy_context()
+        context.run(__run__.set, __new_run())
+        return context
+
+    if inspect.isasyncgenfunction(function):
+        @functools.wraps(function)
+        async def run_async_generator(*args, **kwargs):
+            context = start_run()
+            generator = function(*args, **kwargs)
+            try:
+                while True:
+                    # Tasks take a copy of the context they are made in
+                    try:
+                        item = await context.run(asyncio.ensure_future,
+                                                 generator.__anext__())
+                    except StopAsyncIteration:
+                        return
+                    yield item
+            finally:
+                await context.run(asyncio.ensure_future, generator.aclose())
+
+        return run_async_generator
+
+    if inspect.isgeneratorfunction(function):
+        @functools.wraps(function)
+        def run_generator(*args, **kwargs):
+            context = start_run()
+            generator = function(*args, **kwargs)
+            try:
+                while True:
+                    try:
+                        item = context.run(next, generator)
+                    except StopIteration:
+                        return
+                    yield item
+            finally:
+                context.run(generator.close)
+
+        return run_generator
+
+    @functools.wraps(function)
+    def run_function(*args, **kwargs):
+        return start_run().run(function, *args, **kwargs)
+
+    return run_function
+
+
+def __in_run(function):
+    """Bind a function to the run in progress, for calling in another
+    thread, which would otherwise not see the run's settings
+
+    Parameters:
+    function (function): Function to call in the run
+
+    Returns:
+    function: The function bound to a copy of the current context
+    """
+
+    return functools.partial(contextvars.copy_context().run, function)
+
+
 def __get_page(url):
-    """Try getting page CT.RETRY_COUNT times before
-    failing, and cache using memcached
+    """Get a page using the run's shared fetcher, logging
+    any failure
 
     Parameters:
     url (str): URL to get
@@ -43,66 +175,64 @@ def __get_page(url):
     Returns:
     str: Content of the page
     """
-    global __memcached__
 
-    if __memcached__:
-        memcached = tuple(__memcached__.split(':'))
-        client = base.Client((memcached[0], int(memcached[1])))
-        cached_page = client.get(url)
+    run = __current_run()
+    if not run.fetcher:
+        run.fetcher = Fetcher()
 
-    if __memcached__ and cached_page:
-        return cached_page
-    else:
-        retry_strategy = Retry(
-            total=CT.RETRY_COUNT,
-            status_forcelist=[429, 500, 502, 503, 504],
-            method_whitelist=["HEAD", "GET", "OPTIONS"],
-            backoff_factor=1,
-        )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        http = requests.Session()
-        http.mount("https://", adapter)
-        http.mount("http://", adapter)
+    try:
+        with run.metrics.timer('fetch'):
+            return run.fetcher.get(url)
+    except GetPageException as e:
+        __log_page_error(url, e)
 
-        try:
-            response = http.get(url)
-        except requests.exceptions.ConnectionError as e:
-            __log_error(url, e, GetPageException(url))
 
-        if response.status_code != 200:
-            __log_error(url, requests.exceptions.ConnectionError(),
-                        GetPageException(url))
+def __log_page_error(url, error):
+    """Log a page which could not be got and raise the error again.
+    A response with a failed HTTP status is logged as the error
+    itself, a failed connection as the error which caused it.
+
+    Parameters:
+    url (str): URL of the page
+    error (GetPageException): The error raised by the fetcher
 
-        if __memcached__ and client:
-            client.set(url, response.text.encode(), expire=CT.CACHE_EXPIRE)
+    Returns:
+    None
+    """
 
-        return response.text
+    __log_error(url, error if error.status else error.__cause__ or error,
+                error, stage='fetch', status=error.status,
+                attempts=error.attempts)
 
 
-def __log_error(url, error, raise_error=None):
-    """Log errors to a CSV file
+def __log_error(url, error, raise_error=None, stage=None, status=None,
+                attempts=None):
+    """Log errors to the run's failure log
 
     Parameters:
     url (str): URL for which the error occured
     error (Exception): The error whic occured
+    raise_error (Exception): Error to raise instead of error
+    stage (str): Stage of the scrape which failed, such as fetch
+    status (int): HTTP status of the last response, if any
+    attempts (int): Number of times the download was attempted
 
     Returns:
     None
     """
 
-    global __fail_log__
-    global __fail_log_callback__
+    run = __current_run()
 
     # Turn the error into a nice string
     err_string = str(error) if len(str(error)) > 0 else type(error).__name__
 
-    if __fail_log__:
-        with open(__fail_log__, 'a') as f:
-            f.write(','.join([str(datetime.now()), url, err_string]))
-            f.write('\n')
+    if run.fail_log:
+        # Written in the background so failures do not hold up scraping
+        run.fail_log.log(url, error, stage=stage, status=status,
+                         attempts=attempts)
 
-    if __fail_log_callback__:
-        __fail_log_callback__(url, err_string)
+    if run.fail_log_callback:
+        run.fail_log_callback(url, err_string)
 
     if raise_error:
         raise raise_error
@@ -110,6 +240,71 @@ def __log_error(url, error, raise_error=None):
         raise error
 
 
+def __start_fail_log(fail_log, fail_log_callback):
+    """Store the failure log and callback in the settings of the run
+    in progress for __log_error
+
+    Parameters:
+    fail_log (str|FailLog): Path to the failure log or a log shared
+    with other runs, None for no log
+    fail_log_callback (function): Callback function for dealing
+    with failures
+
+    Returns:
+    FailLog: The log if it was opened for this run, close it with
+    __stop_fail_log when the run is finished, otherwise None
+    """
+
+    run = __current_run()
+
+    own_fail_log = None
+    if isinstance(fail_log, str):
+        fail_log = own_fail_log = FailLog(fail_log)
+
+    run.fail_log = fail_log
+    run.fail_log_callback = fail_log_callback
+
+    return own_fail_log
+
+
+def __stop_fail_log(fail_log):
+    """Close a failure log opened by __start_fail_log, writing every
+    failure still queued
+
+    Parameters:
+    fail_log (FailLog): The log, may be None
+
+    Returns:
+    None
+    """
+
+    run = __run__.get()
+
+    if fail_log:
+        fail_log.close()
+        if run and run.fail_log is fail_log:
+            run.fail_log = None
+
+
+def __make_soup(page, parse_only=None, stage='parse.search'):
+    """Parse a page with the run's parser backend
+
+    Parameters:
+    page (str): Content of the page
+    parse_only (bs4.SoupStrainer): Only parse the matching parts of
+    the page
+    stage (str): Name to record the parse time under
+
+    Returns:
+    bs4.BeautifulSoup: The parsed page
+    """
+
+    run = __current_run()
+
+    with run.metrics.timer(stage):
+        return BeautifulSoup(page, run.parser, parse_only=parse_only)
+
+
 def __get_field_names(get_details):
     """Get an list of field name for the output
     CSV. Extra field names are added if details
@@ -130,49 +325,51 @@ def __get_field_names(get_details):
         return PATH.SEARCH_FIELDS
 
 
-def __get_default_fields(get_details):
-    """Get a default dictionary for a row in the
-    output CSV
+def __field_type(field_name):
+    """Get the type of a field
 
     Parameters:
-    get_details (bool): True if full details for products
-    are requested
+    field_name (str): Name of the field
 
     Returns:
-    dict: A dictionary with default values for all fields
+    str: Type of the field, one of str, int or float
     """
 
-    fields = __get_field_names(get_details)
-    return dict((field, None) for field in fields)
+    field = PATH.SEARCH_FIELDS.get(field_name) or \
+        PATH.DETAIL_FIELDS.get(field_name, {})
+    return field.get('type', 'str')
 
 
-def __write_csv_header(get_details):
-    """Write header row to CSV output file
+def __get_field_types(get_details):
+    """Get the type of each field of the output, in the same order
+    as __get_field_names
 
     Parameters:
     get_details (bool): True if full details for products
     are requested
 
     Returns:
-    None
+    list: Type of each field, one of str, int or float
     """
 
-    global __output__
+    return [field.get('type', 'str')
+            for field in __get_field_names(get_details).values()]
 
-    fields = __get_field_names(get_details)
-    if __output__:
-        csvfile = open(__output__, 'w', newline='')
-    else:
-        csvfile = sys.stdout
 
-    writer = csv.DictWriter(csvfile,
-                            fieldnames=fields, delimiter=',', quotechar='"',
-                            quoting=csv.QUOTE_MINIMAL,
-                            doublequote=True)
-    writer.writeheader()
+def __get_default_fields(get_details):
+    """Get a default dictionary for a row in the
+    output CSV
+
+    Parameters:
+    get_details (bool): True if full details for products
+    are requested
+
+    Returns:
+    dict: A dictionary with default values for all fields
+    """
 
-    if __output__:
-        csvfile.close()
+    fields = __get_field_names(get_details)
+    return dict((field, None) for field in fields)
 
 
 def __get_value(tag, selector, attribute=None, required=True, remove=None,
@@ -191,69 +388,129 @@ def __get_value(tag, selector, attribute=None, required=True, remove=None,
         str: The value found
     """
 
-    """If selector is a list loop through that list
-    looking for a match and leave the loop when found"""
-    if type(selector) == list:
-        for s in selector:
-            try:
-                value = tag.select_one(s).text.strip()
-            except AttributeError:
-                next
-            else:
-                break
-    else:
+    extractor = FieldExtractor(selector, attribute=attribute,
+                               required=required, remove=remove)
+    return __extract_fields(tag, {'value': extractor}, tag.url)['value']
+
+
+def __extract_fields(tag, extractors, url):
+    """Retrieve the values of several fields from a BeautifulSoup,
+    logging any required value which is missing
+
+    Parameters:
+    tag (bs4.element.Tag): The tag to get the values from
+    extractors (dict): FieldExtractor for each field name
+    url (str): URL of the page being extracted, for the failure log
+
+    Returns:
+    dict: The value found for each field name
+    """
+
+    metrics = __current_run().metrics
+
+    values = {}
+    for field_name, extractor in extractors.items():
         try:
-            if attribute:
-                value = tag.select_one(
-                    selector
-                )[attribute]
-            else:
-                value = tag.select_one(selector).text.strip()
-        except AttributeError:
-            pass
+            with metrics.timer(f'extract.{field_name}'):
+                values[field_name] = extractor(tag)
+        except MissingValueException as e:
+            __log_error(url, e, stage='extract')
 
-    # Log an error if no value was found and field is required
-    if 'value' not in locals():
-        if not required:
-            return ''
-        else:
-            __log_error(tag.url, MissingValueException(f'Failed to find'
-                                                       f'"{selector}".'))
-    else:
-        if remove:
-            return re.sub(remove, '', value)
-        else:
-            return value
+    return values
 
 
-def __write_csv_line(values):
-    """Write row to CSV output file
+def __listing_key(url):
+    """Get a key for a listing which is the same whichever search
+    or page it was found from
 
     Parameters:
-    values (list): List of valus to write to the CSV
-    output file
+    url (str): URL of the listing
 
     Returns:
-    None
+    str: The listing ID, or the URL if it has no ID
     """
 
-    global __output__
+    match = EXTRACT.LISTING_ID.search(url)
+    return match.group(1) if match else url
 
-    if __output__:
-        csvfile = open(__output__, 'a', newline='')
-    else:
-        csvfile = sys.stdout
 
-    writer = csv.writer(csvfile, delimiter=',', quotechar='"',
-                        quoting=csv.QUOTE_MINIMAL,
-                        doublequote=True)
-    writer.writerow(values)
+def __canonical_url(url):
+    """Remove the tracking query string and fragment from a listing
+    URL, so the same listing is fetched and cached under one URL
+    whichever search or page it was found from
+
+    Parameters:
+    url (str): URL of the listing
+
+    Returns:
+    str: The canonical URL, or the URL unchanged if it is not a
+    listing
+    """
+
+    parts = urlparse(url)
+    if not EXTRACT.LISTING_ID.search(parts.path):
+        return url
+    return urlunparse((parts.scheme, parts.netloc, parts.path, '', '', ''))
+
+
+def __load_previous(path):
+    """Load the products of a previous scrape with details, to be
+    reused for listings which have not changed
+
+    Parameters:
+    path (str): Path to the output of the previous scrape, in any
+    output format
+
+    Returns:
+    dict: A dictionary of product details for each listing key
+    """
+
+    previous = {}
+    for row in read_rows(path):
+        if all(field_name in row for field_name in PATH.DETAIL_FIELDS):
+            previous[__listing_key(row['url'])] = row
+
+    return previous
+
+
+def __search_product(tag, get_details, previous=None):
+    """Extract the basic details of a product from a search result,
+    copying its details from a previous scrape if it has not changed
+
+    Parameters:
+    tag (bs4.element.Tag): The tag to get the product from
+    get_details (bool): True if full details for products
+    are requested
+    previous (dict): Products from a previous scrape by listing key
+
+    Returns:
+    tuple: A dictionary of product details and True if its details
+    still need to be downloaded
+    """
+
+    csv_entry = __get_default_fields(get_details)
+
+    link = EXTRACT.RESULT_LINK.select_one(tag)
+    csv_entry.update(__extract_fields(tag, EXTRACT.SEARCH_EXTRACTORS,
+                                      link.get('href')))
+    csv_entry['url'] = __canonical_url(csv_entry['url'])
 
-    if __output__:
-        csvfile.close()
+    if get_details and previous:
+        old_entry = previous.get(__listing_key(csv_entry['url']))
+        # Compared by type as the previous output may have typed values
+        if old_entry and all(
+                coerce(old_entry[field_name], __field_type(field_name)) ==
+                coerce(csv_entry[field_name], __field_type(field_name))
+                for field_name in EXTRACT.REFRESH_FIELDS):
+            for field_name in PATH.DETAIL_FIELDS:
+                csv_entry[field_name] = old_entry[field_name]
+            return csv_entry, False
 
+    return csv_entry, get_details
 
-def __get_product(tag, get_details):
+
+def __get_product(tag, get_details, previous=None, shared_details=None,
+                  memo_size=None):
     """Extract the basic details of a product from a search result
     and if requested, retrieve detail product page and extract
     further details.
@@ -262,130 +519,1831 @@ def __get_product(tag, get_details):
     tag (bs4.element.Tag): The tag to get the product from
     get_details (bool): True if full details for products
     are requested
+    previous (dict): Products from a previous scrape by listing key,
+    their details are reused if the search result has not changed
+    shared_details (dict): Details shared between scrapes, see
+    __get_details
+    memo_size (int): Most listings to keep in shared_details, see
+    __get_details
 
     Returns:
     dict: A dictionary of product details
     """
 
-    csv_entry = __get_default_fields(get_details)
+    csv_entry, download = __search_product(tag, get_details, previous)
+    if download:
+        csv_entry.update(__get_details(csv_entry['url'], shared_details,
+                                       memo_size))
 
-    for field_name, field in PATH.SEARCH_FIELDS.items():
-        if 'selector' in field:
-            csv_entry[field_name] = __get_value(tag, **field)
+    return csv_entry
 
-    if get_details:
-        # Get the product listing page
-        try:
-            detail_page = __get_page(csv_entry['url'])
-        except GetPageException:
-            raise ProductScrapeException(csv_entry['url'])
 
-        detail = BeautifulSoup(detail_page, 'html.parser')
-        for field_name, field in PATH.DETAIL_FIELDS.items():
-            if 'selector' in field:
-                csv_entry[field_name] = __get_value(detail, **field)
+def __parse_details(page, parser, partial_parse):
+    """Parse a product listing page and extract its details. Only
+    plain values go in and come out, so this can run in another
+    process.
 
-    return csv_entry
+    Parameters:
+    page (str): Content of the listing page
+    parser (str): BeautifulSoup parser backend
+    partial_parse (bool): Only parse the regions containing detail
+    fields
 
+    Returns:
+    tuple: A dictionary of the detail fields and a dictionary of the
+    seconds taken by each stage, raises MissingValueException if a
+    required field is missing
+    """
 
-def scrape(url,
-           output=None,
-           get_details=False,
-           fail_log=None,
-           limit=None,
-           message_callback=None,
-           progress_callback=None,
-           fail_log_callback=None,
-           memcached=None):
-    """Navigate through the results of an Etsy search, extract
-    product details to a CSV file and log failures
+    timings = {}
+    started = time.perf_counter()
+    detail = BeautifulSoup(page, parser,
+                           parse_only=EXTRACT.DETAIL_STRAINER
+                           if partial_parse else None)
+    timings['parse.listing'] = time.perf_counter() - started
+
+    values = {}
+    for field_name, extractor in EXTRACT.DETAIL_EXTRACTORS.items():
+        started = time.perf_counter()
+        values[field_name] = extractor(detail)
+        timings[f'extract.{field_name}'] = time.perf_counter() - started
+
+    return values, timings
+
+
+def __download_details(url):
+    """Retrieve a product listing page and extract its details,
+    parsing in the run's process pool if it has one
 
     Parameters:
-    url (str): First page of Etsy search results to extract
-    limit (int): Limit scraping to n products
-    get_details (bool): True if full details for products
-    are requested
-    output (str): Path to the output CSV file
-    fail_log (str): Path to the failure log
-    message_callback (function): Callback function for dealing
-    with messages
-    progress_callback (function): Callback function for dealing
-    with progress, called for each product
-    fail_log_callback (function): Callback function for dealing
-    with failures
-    memcached (str): server:port of memcached server to use for
-    caching
+    url (str): URL of the listing
+
+    Returns:
+    dict: A dictionary of the detail fields
+    """
+
+    run = __current_run()
+
+    # Get the product listing page
+    try:
+        detail_page = __get_page(url)
+    except GetPageException:
+        raise ProductScrapeException(url)
+
+    try:
+        if run.parse_executor:
+            values, timings = run.parse_executor.submit(
+                __parse_details, detail_page, run.parser,
+                run.partial_parse).result()
+        else:
+            values, timings = __parse_details(detail_page, run.parser,
+                                              run.partial_parse)
+    except MissingValueException as e:
+        __log_error(url, e, stage='extract')
+
+    for stage, seconds in timings.items():
+        run.metrics.timing(stage, seconds)
+
+    return values
+
+
+def __get_details(url, shared_details=None, memo_size=None):
+    """Get the details of a product listing, downloading each listing
+    only once when details are shared between scrapes
+
+    Parameters:
+    url (str): URL of the listing
+    shared_details (dict): Future of the details for each listing key,
+    shared by every scrape which should download a listing only once
+    memo_size (int): Most listings to keep in shared_details, which
+    must be an OrderedDict, None to keep every listing
+
+    Returns:
+    dict: A dictionary of the detail fields
+    """
+
+    global __shared_details_lock__
+
+    if shared_details is None:
+        return __download_details(url)
+
+    key = __listing_key(url)
+    with __shared_details_lock__:
+        future = shared_details.get(key)
+        download = future is None
+        if download:
+            future = shared_details[key] = Future()
+        __touch_memo(shared_details, key, memo_size)
+
+    if download:
+        try:
+            future.set_result(__download_details(url))
+        except Exception as e:
+            future.set_exception(e)
+
+    return dict(future.result())
+
+
+def __touch_memo(memo, key, memo_size=None):
+    """Mark a listing as the most recently used in a memo of details,
+    removing the least recently used listings while it holds more than
+    memo_size
+
+    Parameters:
+    memo (collections.OrderedDict): Details of each listing key
+    key (str): Key of the listing
+    memo_size (int): Most listings to keep, None to keep every listing
 
     Returns:
     None
     """
 
-    # Store settings in global variables for use elsewhere
-    if memcached:
-        global __memcached__
-        __memcached__ = memcached
+    if not memo_size:
+        return
 
-    global __output__
-    __output__ = output
+    memo.move_to_end(key)
+    while len(memo) > memo_size:
+        memo.popitem(last=False)
 
-    global __fail_log__
-    __fail_log__ = fail_log
 
-    global __fail_log_callback__
-    __fail_log_callback__ = fail_log_callback
+def __next_page_url(search_results):
+    """Find the URL of the next page of search results
 
-    product_count = 1
-    success_count = 0
-    fail_count = 0
+    Parameters:
+    search_results (bs4.BeautifulSoup): Parsed page of search results
 
-    # Position in the search results
-    search_rank = 0
+    Returns:
+    str: URL of the next page, None if this is the last page
+    """
+
+    try:
+        # Get the last page button, should be next page
+        return EXTRACT.SEARCH_PAGE_BUTTON.select(search_results)[-1]['href']
+    except (KeyError, IndexError):
+        return None
+
+
+def __put_until_stopped(pages, item, stop):
+    """Put an item on a bounded queue, giving up if the consumer
+    has stopped
+
+    Parameters:
+    pages (queue.Queue): Queue to put the item on
+    item (tuple): Item to put on the queue
+    stop (threading.Event): Set when the consumer has stopped
+
+    Returns:
+    None
+    """
+
+    while not stop.is_set():
+        try:
+            pages.put(item, timeout=0.1)
+        except queue.Full:
+            continue
+        else:
+            return
+
+
+def __prefetch_search_pages(url, pages, stop):
+    """Download pages of search results ahead of the consumer. Only
+    the pagination is parsed here to find the next page.
 
-    __write_csv_header(get_details)
-    scraped_data = []
+    Parameters:
+    url (str): First page of search results to download
+    pages (queue.Queue): Bounded queue of (url, page) to fill, page
+    is the exception if downloading failed
+    stop (threading.Event): Set when the consumer has stopped
 
-    while not limit or (limit and product_count <= limit):
-        if message_callback:
-            message_callback(f'Processing {url}')
+    Returns:
+    None
+    """
 
+    while url and not stop.is_set():
         try:
             page = __get_page(url)
-        except GetPageException:
-            fail_count += 1
-            break
+        except GetPageException as e:
+            __put_until_stopped(pages, (url, e), stop)
+            return
+
+        __put_until_stopped(pages, (url, page), stop)
+        url = __next_page_url(__make_soup(page,
+                                          parse_only=SoupStrainer('nav'),
+                                          stage='parse.search_nav'))
+
+    __put_until_stopped(pages, (None, None), stop)
+
+
+def __open_fetcher(concurrency,
+                   pool_size=None,
+                   memcached=None,
+                   cache=None,
+                   cache_size=CT.CACHE_MAX_SIZE,
+                   memory_cache=None,
+                   memory_cache_size=None,
+                   cache_compression=CT.CACHE_CODEC,
+                   cache_compression_level=CT.CACHE_COMPRESS_LEVEL,
+                   rate=CT.RATE,
+                   max_rate=CT.MAX_RATE,
+                   record=None,
+                   replay=None,
+                   metrics=None,
+                   asynchronous=False):
+    """Create a fetcher and its cache from the scrape settings, see
+    iter_products for the parameters. An AsyncFetcher is created if
+    asynchronous is set.
 
-        search_results = BeautifulSoup(page, 'html.parser')
-        results = search_results.select(PATH.SEARCH_RESULT)
+    Returns:
+    Fetcher: The fetcher, close it when the scrape is finished
+    """
 
-        for result in results:
-            if result.select_one(PATH.RESULT_LINK) and (not limit or
-                                                        product_count <=
-                                                        limit):
-                search_rank += 1
-                if progress_callback:
-                    progress_callback(result.select_one(PATH.RESULT_LINK))
+    if replay:
+        fetcher = ReplayFetcher(PageArchive(replay))
+        return ThreadedFetcher(fetcher) if asynchronous else fetcher
+
+    pool_size = pool_size or max(concurrency, CT.POOL_SIZE)
+    fetcher_class = AsyncFetcher if asynchronous else Fetcher
+    fetcher = fetcher_class(cache=open_cache(memcached=memcached,
+                                             path=cache,
+                                             max_size=cache_size,
+                                             memory_entries=memory_cache,
+                                             memory_bytes=memory_cache_size,
+                                             pool_size=pool_size),
+                            pool_size=pool_size,
+                            compression=cache_compression,
+                            compression_level=cache_compression_level,
+                            limiter=RateLimiter(rate=rate,
+                                                max_rate=max(rate, max_rate))
+                            if rate else None,
+                            metrics=metrics)
+    if record:
+        fetcher = RecordingFetcher(fetcher, PageArchive(record))
+    return fetcher
+
+
+def __pop_fetcher_settings(kwargs):
+    """Take the settings of __open_fetcher out of the settings of
+    a scrape
 
-                try:
-                    csv_entry = __get_product(result, get_details)
-                except ProductScrapeException:
-                    fail_count += 1
-                    next
+    Parameters:
+    kwargs (dict): Settings of the scrape, the fetcher settings are
+    removed from it
 
-                csv_entry['search_rank'] = search_rank
-                __write_csv_line(csv_entry.values())
-                scraped_data.append(csv_entry)
+    Returns:
+    dict: The fetcher settings
+    """
 
-                success_count += 1
-                product_count += 1
+    return dict((name, kwargs.pop(name))
+                for name in ('cache', 'cache_size',
+                             'memory_cache', 'memory_cache_size',
+                             'cache_compression', 'cache_compression_level',
+                             'rate', 'max_rate', 'record', 'replay')
+                if name in kwargs)
 
-        try:
-            # Get the last page button, should be next page
-            url = search_results.select(PATH.SEARCH_PAGE_BUTTON)[-1]['href']
-        except KeyError:
-            break
 
-    if message_callback:
-        message_callback(f'Scraped {success_count} products, failed to scrape '
-                         f'{fail_count}.')
+def __open_parse_executor(processes):
+    """Create a process pool for parsing listing pages. Processes are
+    spawned rather than forked, forking while download threads hold
+    locks can deadlock the children.
+
+    Parameters:
+    processes (int): Number of processes
+
+    Returns:
+    concurrent.futures.ProcessPoolExecutor: The process pool
+    """
+
+    return ProcessPoolExecutor(max_workers=processes,
+                               mp_context=multiprocessing.get_context(
+                                   'spawn'))
+
+
+def __report_metrics(metrics, message_callback=None, report_metrics=False,
+                     metrics_file=None):
+    """Report the metrics of a finished run
+
+    Parameters:
+    metrics (Metrics): Metrics of the run
+    message_callback (function): Callback function for dealing
+    with messages
+    report_metrics (bool): Send a summary of the metrics to
+    message_callback
+    metrics_file (str): Path to write a JSON summary of the metrics to
+
+    Returns:
+    None
+    """
+
+    if report_metrics and message_callback:
+        message_callback('Metrics:\n' + metrics.report())
+    if metrics_file:
+        metrics.save(metrics_file)
+
+
+def __valid_products(products, validator=None):
+    """Validate a batch of products, logging each invalid product
+    as a failure and converting the numbers of the valid products
+
+    Parameters:
+    products (list): A dictionary of product details for each product
+    validator (Validator): Validator to check the products with, None
+    to accept every product
+
+    Returns:
+    list: The valid products, in order, with int and float fields
+    converted if there is a validator
+    """
+
+    if not validator:
+        return products
+
+    with __current_run().metrics.timer('validate'):
+        problems = validator.validate(products)
+
+    valid = []
+    for csv_entry, product_problems in zip(products, problems):
+        if not product_problems:
+            valid.append(csv_entry)
+            continue
+        try:
+            __log_error(csv_entry['url'],
+                        InvalidValueException('; '.join(product_problems)),
+                        stage='validate')
+        except InvalidValueException:
+            pass
+
+    return validator.coerce(valid)
+
+
+def __take_batch(results, product_count, limit=None):
+    """Take the next batch of search results to scrape. Only as many
+    products as are still needed to reach the limit are taken,
+    failures are made up from the next batch.
+
+    Parameters:
+    results (list): Search results of the page not yet scraped
+    product_count (int): Number of the next product
+    limit (int): Limit scraping to n products
+
+    Returns:
+    tuple: The batch and the search results left after it
+    """
+
+    batch_size = limit - product_count + 1 if limit else len(results)
+    return results[:batch_size], results[batch_size:]
+
+
+def __start_batch(batch, search_rank, seen, duplicates=CT.DUPLICATES,
+                  checkpoint=None, progress_callback=None):
+    """Number the search results of a batch and choose which to
+    scrape, leaving out products written before the checkpoint was
+    saved and, if duplicates is skip, listings already found
+
+    Parameters:
+    batch (list): Search result tags of the batch
+    search_rank (int): Search rank before the first result
+    seen (set): Key of every listing found so far, the listings of
+    the batch are added if duplicates is skip
+    duplicates (str): What to do with a listing found again, see
+    iter_products
+    checkpoint (Checkpoint): Checkpoint the scrape was resumed from
+    progress_callback (function): Callback function for dealing
+    with progress, called for each product to scrape
+
+    Returns:
+    tuple: (search rank, tag) for each result to scrape, the search
+    rank of the last result and the number of products already written
+    """
+
+    start = []
+    written = 0
+    for result in batch:
+        search_rank += 1
+        result_url = __canonical_url(EXTRACT.SEARCH_EXTRACTORS['url'](result))
+
+        if checkpoint and (result_url, search_rank) in checkpoint.completed:
+            # Already written before the scrape stopped
+            written += 1
+            continue
+
+        if duplicates == 'skip':
+            key = __listing_key(result_url)
+            if key in seen:
+                continue
+            seen.add(key)
+
+        if progress_callback:
+            progress_callback(EXTRACT.RESULT_LINK.select_one(result))
+
+        start.append((search_rank, result))
+
+    return start, search_rank, written
+
+
+def __finish_batch(scraped, validator=None):
+    """Give the scraped products of a batch their search rank and
+    validate them
+
+    Parameters:
+    scraped (list): (search rank, product) for each result of the
+    batch in search rank order, product is None if it failed
+    validator (Validator): Validator to check the products with, None
+    to accept every product
+
+    Returns:
+    tuple: The valid products in order and the number which failed
+    """
+
+    products = []
+    for rank, csv_entry in scraped:
+        if csv_entry is not None:
+            csv_entry['search_rank'] = rank
+            products.append(csv_entry)
+
+    valid = __valid_products(products, validator)
+    return valid, len(scraped) - len(valid)
+
+
+def __report_run(fetcher, message_callback, success_count, fail_count):
+    """Send the counts of a finished run and the state of its fetcher
+    to message_callback
+
+    Parameters:
+    fetcher (Fetcher): Fetcher of the run
+    message_callback (function): Callback function for dealing
+    with messages
+    success_count (int): Number of products scraped
+    fail_count (int): Number of products which failed
+
+    Returns:
+    None
+    """
+
+    if not message_callback:
+        return
+
+    message_callback(f'Scraped {success_count} products, failed to scrape '
+                     f'{fail_count}.')
+
+    if fetcher.cache and fetcher.cache.stats():
+        message_callback('Cache ' + ', '.join(
+            f'{name.replace("_", " ")}: {value}'
+            for name, value in fetcher.cache.stats().items()) + '.')
+
+    if fetcher.limiter:
+        stats = fetcher.limiter.stats()
+        message_callback(f'Request rate: {stats["rate"]} per second, '
+                         f'throttled {stats["throttled"]} times.')
+
+
+def __search_pages(url, prefetch=0):
+    """Yield parsed pages of search results in order. If prefetch
+    is set later pages are downloaded in the background while earlier
+    pages are being processed.
+
+    Parameters:
+    url (str): First page of search results
+    prefetch (int): Number of pages to read ahead, 0 to download
+    each page only when it is needed
+
+    Returns:
+    generator: (url, bs4.BeautifulSoup) for each page, raises
+    GetPageException if a page could not be downloaded
+    """
+
+    if not prefetch:
+        while url:
+            search_results = __make_soup(__get_page(url))
+            yield url, search_results
+            url = __next_page_url(search_results)
+        return
+
+    pages = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    threading.Thread(target=__in_run(__prefetch_search_pages),
+                     args=(url, pages, stop), daemon=True,
+                     name='prefetch_search_pages').start()
+
+    try:
+        while True:
+            url, page = pages.get()
+            if url is None:
+                return
+            if isinstance(page, GetPageException):
+                raise page
+            yield url, __make_soup(page)
+    finally:
+        stop.set()
+
+
+@__own_run
+def iter_products(url,
+                  get_details=False,
+                  fail_log=None,
+                  limit=None,
+                  message_callback=None,
+                  progress_callback=None,
+                  fail_log_callback=None,
+                  memcached=None,
+                  cache=None,
+                  cache_size=CT.CACHE_MAX_SIZE,
+                  memory_cache=None,
+                  memory_cache_size=None,
+                  cache_compression=CT.CACHE_CODEC,
+                  cache_compression_level=CT.CACHE_COMPRESS_LEVEL,
+                  rate=CT.RATE,
+                  max_rate=CT.MAX_RATE,
+                  record=None,
+                  replay=None,
+                  concurrency=CT.CONCURRENCY,
+                  pool_size=None,
+                  fetcher=None,
+                  prefetch=0,
+                  parser=CT.PARSER,
+                  partial_parse=False,
+                  checkpoint=None,
+                  previous=None,
+                  executor=None,
+                  parse_processes=None,
+                  parse_executor=None,
+                  shared_details=None,
+                  duplicates=CT.DUPLICATES,
+                  metrics=None,
+                  metrics_callback=None,
+                  report_metrics=False,
+                  metrics_file=None,
+                  validate=False):
+    """Navigate through the results of an Etsy search, yielding
+    product details as they are scraped and log failures. Products
+    are not kept once yielded so memory use does not grow with the
+    number of products.
+
+    Parameters:
+    url (str): First page of Etsy search results to extract
+    limit (int): Limit scraping to n products
+    get_details (bool): True if full details for products
+    are requested
+    fail_log (str): Path to the failure log
+    message_callback (function): Callback function for dealing
+    with messages
+    progress_callback (function): Callback function for dealing
+    with progress, called for each product
+    fail_log_callback (function): Callback function for dealing
+    with failures
+    memcached (str): server:port of memcached server to use for
+    caching
+    cache (str): Path to a local SQLite file to use for caching
+    instead of memcached
+    cache_size (int): Maximum bytes to keep in the cache file
+    memory_cache (int): Maximum pages to keep in memory in front
+    of any other cache
+    memory_cache_size (int): Maximum bytes of pages to keep in
+    memory in front of any other cache
+    cache_compression (str): Compression for cached pages, one of
+    none, zlib or zstd
+    cache_compression_level (int): Compression level for cached pages
+    rate (float): Requests per second to start at, adjusted as the
+    site responds, None for no limit
+    max_rate (float): Requests per second never to go above
+    record (str): Path to an archive file to record every page in,
+    pages already in the archive are kept
+    replay (str): Path to an archive file to get every page from
+    instead of downloading it
+    concurrency (int): Maximum number of products to scrape at
+    the same time
+    pool_size (int): Number of pooled connections to keep open,
+    defaults to enough for every concurrent product
+    fetcher (Fetcher): Fetcher to share with other runs, if not
+    given one is created and closed for this run
+    prefetch (int): Number of search pages to download ahead
+    while the current page is processed
+    parser (str): BeautifulSoup parser backend, one of html.parser,
+    lxml or html5lib
+    partial_parse (bool): Only parse the parts of listing pages
+    which contain detail fields, not supported by html5lib
+    checkpoint (str|Checkpoint): Path to a file recording progress,
+    if it exists for the same url the scrape carries on from it
+    previous (str|dict): Output CSV of a previous scrape with details,
+    or the products loaded from it, details of listings which have
+    not changed are copied instead of downloaded again
+    executor (concurrent.futures.Executor): Executor to scrape products
+    on, shared with other scrapes, if not given one is created with
+    concurrency workers
+    parse_processes (int): Number of processes to parse listing pages
+    in, None to parse them in the threads which download them
+    parse_executor (concurrent.futures.ProcessPoolExecutor): Process
+    pool to parse listing pages in, shared with other scrapes, if not
+    given one is created when parse_processes is set
+    shared_details (dict): Details of listings shared with other
+    scrapes, so each listing is downloaded only once, start with an
+    empty dict. It keeps every listing until the scrapes end. If not
+    given, the details of the last DETAILS_MEMO_SIZE listings are kept
+    for listings found again later in the results
+    duplicates (str): What to do with a listing found again at a
+    later search_rank, rank to output it again or skip to leave it out
+    metrics (Metrics): Metrics to record timings and sizes in, shared
+    with other scrapes, if not given they are recorded for this run
+    metrics_callback (function): Called with the name and value of
+    every timing, size and count as it is recorded
+    report_metrics (bool): Send a summary of the timings with
+    percentiles to message_callback at the end of the run
+    metrics_file (str): Path to write a JSON summary of the metrics
+    to at the end of the run
+    validate (bool): Check the products of each batch for empty
+    required fields and numbers which do not parse, invalid products
+    are logged as failures instead of yielded and the int and float
+    fields of valid products are converted to numbers
+
+    Returns:
+    generator: A dictionary of product details for each product
+    in search_rank order
+    """
+
+    if not builder_registry.lookup(parser):
+        raise ValueError(f'Parser "{parser}" is not installed.')
+    if duplicates not in ('rank', 'skip'):
+        raise ValueError(f'Unknown duplicates handling "{duplicates}".')
+
+    # Store settings in the run for use elsewhere
+    run = __current_run()
+    run.parser = parser
+    run.partial_parse = partial_parse
+
+    own_metrics = metrics is None
+    if own_metrics:
+        metrics = Metrics(callback=metrics_callback)
+    run.metrics = metrics
+
+    own_fetcher = fetcher is None
+    if own_fetcher:
+        fetcher = __open_fetcher(concurrency,
+                                 pool_size=pool_size,
+                                 memcached=memcached,
+                                 cache=cache,
+                                 cache_size=cache_size,
+                                 memory_cache=memory_cache,
+                                 memory_cache_size=memory_cache_size,
+                                 cache_compression=cache_compression,
+                                 cache_compression_level=(
+                                     cache_compression_level),
+                                 rate=rate,
+                                 max_rate=max_rate,
+                                 record=record,
+                                 replay=replay,
+                                 metrics=metrics)
+    run.fetcher = fetcher
+
+    own_fail_log = __start_fail_log(fail_log, fail_log_callback)
+
+    if isinstance(checkpoint, str):
+        checkpoint = Checkpoint(checkpoint, url)
+
+    if isinstance(previous, str):
+        previous = __load_previous(previous)
+
+    product_count = 1
+    success_count = 0
+    fail_count = 0
+
+    # Position in the search results
+    search_rank = 0
+
+    if checkpoint and checkpoint.resumed:
+        url = checkpoint.page_url
+        search_rank = checkpoint.search_rank
+        success_count = checkpoint.success_count
+        fail_count = checkpoint.fail_count
+        product_count = success_count + 1
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    own_parse_executor = parse_executor is None and bool(parse_processes)
+    if own_parse_executor:
+        parse_executor = __open_parse_executor(parse_processes)
+    run.parse_executor = parse_executor
+
+    validator = Validator(__get_field_names(get_details)) \
+        if validate else None
+
+    # Key of every listing found so far, only kept for skipping
+    # duplicates so memory does not grow with the scrape
+    seen = set()
+    if checkpoint and duplicates == 'skip':
+        seen.update(__listing_key(url) for url, rank in checkpoint.completed)
+
+    # Details of the most recently found listings, for listings found
+    # again, unless shared with other scrapes
+    memo_size = None
+    if shared_details is None:
+        shared_details = OrderedDict()
+        memo_size = CT.DETAILS_MEMO_SIZE
+
+    pages = __search_pages(url, prefetch)
+    finished = True
+
+    try:
+        while not limit or (limit and product_count <= limit):
+            try:
+                url, search_results = next(pages)
+            except StopIteration:
+                break
+            except GetPageException:
+                fail_count += 1
+                finished = False
+                break
+
+            if message_callback:
+                message_callback(f'Processing {url}')
+
+            if checkpoint:
+                checkpoint.start_page(url, search_rank, success_count,
+                                      fail_count)
+
+            results = [result for result in
+                       EXTRACT.SEARCH_RESULT.select(search_results)
+                       if EXTRACT.RESULT_LINK.select_one(result)]
+
+            while results and (not limit or product_count <= limit):
+                batch, results = __take_batch(results, product_count, limit)
+                start, search_rank, written = __start_batch(
+                    batch, search_rank, seen, duplicates, checkpoint,
+                    progress_callback)
+                success_count += written
+                product_count += written
+
+                futures = [(rank, executor.submit(__in_run(__get_product),
+                                                  result, get_details,
+                                                  previous, shared_details,
+                                                  memo_size))
+                           for rank, result in start]
+
+                # Collect in submission order to keep rows in
+                # search_rank order
+                scraped = []
+                for rank, future in futures:
+                    try:
+                        scraped.append((rank, future.result()))
+                    except (ProductScrapeException, MissingValueException):
+                        # Already logged
+                        scraped.append((rank, None))
+
+                valid, failed = __finish_batch(scraped, validator)
+                fail_count += failed
+
+                for csv_entry in valid:
+                    success_count += 1
+                    product_count += 1
+
+                    yield csv_entry
+
+                    if checkpoint:
+                        checkpoint.complete(csv_entry['url'],
+                                            csv_entry['search_rank'])
+    finally:
+        pages.close()
+        if own_executor:
+            executor.shutdown()
+        if own_parse_executor:
+            parse_executor.shutdown()
+            run.parse_executor = None
+        if checkpoint:
+            checkpoint.save()
+        if own_fetcher:
+            fetcher.close()
+            run.fetcher = None
+        __stop_fail_log(own_fail_log)
+
+    if checkpoint and finished:
+        checkpoint.finish()
+
+    __report_run(fetcher, message_callback, success_count, fail_count)
+
+    if own_metrics:
+        __report_metrics(metrics, message_callback, report_metrics,
+                         metrics_file)
+
+
+def scrape(url,
+           output=None,
+           get_details=False,
+           fail_log=None,
+           limit=None,
+           message_callback=None,
+           progress_callback=None,
+           fail_log_callback=None,
+           memcached=None,
+           collect=True,
+           checkpoint=None,
+           previous=None,
+           metrics_callback=None,
+           report_metrics=False,
+           metrics_file=None,
+           output_format=None,
+           **kwargs):
+    """Navigate through the results of an Etsy search, extract
+    product details to an output file and log failures
+
+    Parameters:
+    url (str): First page of Etsy search results to extract
+    limit (int): Limit scraping to n products
+    get_details (bool): True if full details for products
+    are requested
+    output (str): Path to the output file
+    fail_log (str): Path to the failure log
+    message_callback (function): Callback function for dealing
+    with messages
+    progress_callback (function): Callback function for dealing
+    with progress, called for each product
+    fail_log_callback (function): Callback function for dealing
+    with failures
+    memcached (str): server:port of memcached server to use for
+    caching
+    collect (bool): Keep every product in memory to return, set
+    to False for large scrapes which only need the output
+    checkpoint (str): Path to a file recording progress, if it
+    exists for the same url the scrape carries on from it and
+    appends to the output
+    previous (str): Output of a previous scrape with details,
+    details of listings which have not changed are copied instead
+    of downloaded again, may be the same file as output
+    metrics_callback (function): Called with the name and value of
+    every timing, size and count as it is recorded
+    report_metrics (bool): Send a summary of the timings with
+    percentiles to message_callback at the end of the run
+    metrics_file (str): Path to write a JSON summary of the metrics
+    to at the end of the run
+    output_format (str): Format of the output, one of csv, jsonl or
+    parquet, None to choose by the output's extension
+    kwargs: Any other settings of iter_products
+
+    Returns:
+    list: A dictionary of product details for each product, None
+    if collect is False
+    """
+
+    scraped_data = [] if collect else None
+    metrics = Metrics(callback=metrics_callback)
+
+    if checkpoint:
+        checkpoint = Checkpoint(checkpoint, url)
+
+    if previous:
+        # Loaded before the output is opened in case they are the same
+        previous = __load_previous(previous)
+
+    resume = bool(checkpoint and checkpoint.resumed)
+    if resume and output and os.path.exists(output):
+        # Rows written after the checkpoint was last saved
+        checkpoint.completed.update((__canonical_url(row['url']),
+                                     coerce(row['search_rank'], 'int'))
+                                    for row in read_rows(output,
+                                                         output_format))
+
+    with open_writer(output, __get_field_names(get_details),
+                     __get_field_types(get_details),
+                     format_name=output_format, append=resume) as writer:
+        if checkpoint:
+            checkpoint.before_save = writer.flush
+
+        for csv_entry in iter_products(url,
+                                       get_details=get_details,
+                                       fail_log=fail_log,
+                                       limit=limit,
+                                       message_callback=message_callback,
+                                       progress_callback=progress_callback,
+                                       fail_log_callback=fail_log_callback,
+                                       memcached=memcached,
+                                       checkpoint=checkpoint,
+                                       previous=previous,
+                                       metrics=metrics,
+                                       **kwargs):
+            with metrics.timer('write'):
+                writer.write(csv_entry.values())
+            if collect:
+                scraped_data.append(csv_entry)
+
+    __report_metrics(metrics, message_callback, report_metrics, metrics_file)
+
+    return scraped_data
+
+
+def __query_output(output_dir, position, url, output_format='csv'):
+    """Get the path of the output file for one query of a batch
+
+    Parameters:
+    output_dir (str): Directory for the output files
+    position (int): Position of the query in the batch
+    url (str): First page of Etsy search results for the query
+    output_format (str): Format of the output, used as its extension
+
+    Returns:
+    str: Path to the output file
+    """
+
+    query = parse_qs(urlparse(url).query).get('q', [''])[0]
+    slug = re.sub(r'[^a-z0-9]+', '_', query.lower()).strip('_')
+    return os.path.join(output_dir,
+                        f'{position}_{slug or "search"}.{output_format}')
+
+
+def scrape_batch(urls,
+                 output=None,
+                 output_dir=None,
+                 get_details=False,
+                 limit=None,
+                 message_callback=None,
+                 memcached=None,
+                 concurrency=CT.CONCURRENCY,
+                 query_concurrency=CT.QUERY_CONCURRENCY,
+                 pool_size=None,
+                 metrics_callback=None,
+                 report_metrics=False,
+                 metrics_file=None,
+                 output_format=None,
+                 **kwargs):
+    """Scrape the results of several Etsy searches at once, sharing
+    connections, cache and a pool of workers between them. A listing
+    found by more than one search is only downloaded once.
+
+    Parameters:
+    urls (list): First page of Etsy search results for each query
+    output (str): Path to one output for every query, with an
+    extra query column
+    output_dir (str): Directory to write an output for each
+    query to, instead of output
+    get_details (bool): True if full details for products
+    are requested
+    limit (int): Limit scraping to n products for each query
+    message_callback (function): Callback function for dealing
+    with messages
+    memcached (str): server:port of memcached server to use for
+    caching
+    concurrency (int): Maximum number of products to scrape at
+    the same time, across every query
+    query_concurrency (int): Maximum number of queries to scrape
+    at the same time
+    pool_size (int): Number of pooled connections to keep open,
+    defaults to enough for every concurrent product
+    metrics_callback (function): Called with the name and value of
+    every timing, size and count as it is recorded
+    report_metrics (bool): Send a summary of the timings with
+    percentiles to message_callback at the end of the run
+    metrics_file (str): Path to write a JSON summary of the metrics
+    to at the end of the run
+    output_format (str): Format of the outputs, one of csv, jsonl or
+    parquet, None to choose by the extension of output
+    kwargs: Any other settings of iter_products
+
+    Returns:
+    None
+    """
+
+    if kwargs.get('checkpoint'):
+        raise ValueError('A checkpoint can only be used for one search.')
+
+    metrics = Metrics(callback=metrics_callback)
+    fetcher = __open_fetcher(concurrency, pool_size=pool_size,
+                             memcached=memcached, metrics=metrics,
+                             **__pop_fetcher_settings(kwargs))
+    parse_processes = kwargs.pop('parse_processes', None)
+    parse_executor = __open_parse_executor(parse_processes) \
+        if parse_processes else None
+    shared_details = {}
+
+    # One log for every query, so its file is written from one thread
+    own_fail_log = None
+    if isinstance(kwargs.get('fail_log'), str):
+        kwargs['fail_log'] = own_fail_log = FailLog(kwargs['fail_log'])
+    field_names = list(__get_field_names(get_details))
+    field_types = __get_field_types(get_details)
+    output_format = get_format(output, output_format)
+
+    combined = None
+    combined_lock = threading.Lock()
+    if not output_dir:
+        combined = open_writer(output, ['query'] + field_names,
+                               ['str'] + field_types,
+                               format_name=output_format)
+
+    def scrape_query(position, url):
+        if output_dir:
+            writer = open_writer(
+                __query_output(output_dir, position, url, output_format),
+                field_names, field_types, format_name=output_format)
+        try:
+            for csv_entry in iter_products(url,
+                                           get_details=get_details,
+                                           limit=limit,
+                                           message_callback=message_callback,
+                                           fetcher=fetcher,
+                                           executor=executor,
+                                           parse_executor=parse_executor,
+                                           shared_details=shared_details,
+                                           metrics=metrics,
+                                           **kwargs):
+                if output_dir:
+                    with metrics.timer('write'):
+                        writer.write(csv_entry.values())
+                else:
+                    with combined_lock, metrics.timer('write'):
+                        combined.write([url] + list(csv_entry.values()))
+        finally:
+            if output_dir:
+                writer.close()
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor, \
+                ThreadPoolExecutor(max_workers=query_concurrency) as queries:
+            futures = [queries.submit(scrape_query, position, url)
+                       for position, url in enumerate(urls, 1)]
+            for future in futures:
+                future.result()
+    finally:
+        if combined:
+            combined.close()
+        if parse_executor:
+            parse_executor.shutdown()
+        fetcher.close()
+        __stop_fail_log(own_fail_log)
+
+    if message_callback:
+        message_callback(f'Scraped {len(urls)} queries, downloaded '
+                         f'{len(shared_details)} listings.')
+
+    __report_metrics(metrics, message_callback, report_metrics, metrics_file)
+
+
+def __discover(url, queue, get_details, limit=None, message_callback=None,
+               progress_callback=None, previous=None,
+               duplicates=CT.DUPLICATES, prefetch=0):
+    """Walk the search results, adding every product to the queue of a
+    distributed crawl, see scrape_distributed for the parameters. The
+    limit counts products added, not products which will be written.
+
+    Returns:
+    tuple: Number of products added and number which failed
+    """
+
+    added = 0
+    fail_count = 0
+    search_rank = 0
+    seen = set()
+
+    pages = __search_pages(url, prefetch)
+    try:
+        for url, search_results in pages:
+            if message_callback:
+                message_callback(f'Processing {url}')
+
+            for result in EXTRACT.SEARCH_RESULT.select(search_results):
+                if limit and added >= limit:
+                    return added, fail_count
+                if not EXTRACT.RESULT_LINK.select_one(result):
+                    continue
+
+                search_rank += 1
+                try:
+                    csv_entry, download = __search_product(result,
+                                                           get_details,
+                                                           previous)
+                except MissingValueException:
+                    fail_count += 1
+                    continue
+
+                key = __listing_key(csv_entry['url'])
+                if duplicates == 'skip':
+                    if key in seen:
+                        continue
+                    seen.add(key)
+
+                if progress_callback:
+                    progress_callback(EXTRACT.RESULT_LINK.select_one(result))
+
+                queue.add(search_rank, key, csv_entry['url'], csv_entry,
+                          download)
+                added += 1
+    except GetPageException:
+        fail_count += 1
+    finally:
+        pages.close()
+
+    return added, fail_count
+
+
+def __work(queue, worker, concurrency, poll_interval=CT.QUEUE_POLL_INTERVAL,
+           wait=True):
+    """Download listings from the queue of a distributed crawl until it
+    is finished, keeping concurrency downloads running
+
+    Parameters:
+    queue (WorkQueue): Queue of the crawl
+    worker (str): Name of the worker
+    concurrency (int): Maximum number of listings to download at the
+    same time
+    poll_interval (float): Seconds between checks for new listings
+    wait (bool): Wait for the crawl to finish, otherwise stop as soon
+    as no listings are waiting
+
+    Returns:
+    tuple: Number of listings downloaded and number which failed
+    """
+
+    done_count = 0
+    fail_count = 0
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            if len(running) < concurrency:
+                for key, url in queue.take(worker,
+                                           concurrency - len(running)):
+                    running[executor.submit(__in_run(__download_details),
+                                            url)] = key
+
+            if not running:
+                if queue.finished() or not wait:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            done, pending = futures_wait(running, timeout=poll_interval,
+                                         return_when=FIRST_COMPLETED)
+            for future in done:
+                key = running.pop(future)
+                try:
+                    queue.complete(key, future.result())
+                    done_count += 1
+                except (ProductScrapeException, MissingValueException,
+                        GetPageException) as e:
+                    queue.fail(key, str(e) or type(e).__name__)
+                    fail_count += 1
+
+    return done_count, fail_count
+
+
+def __assemble(queue, output, get_details, output_format=None,
+               validator=None):
+    """Write the results of a finished distributed crawl in search
+    rank order
+
+    Parameters:
+    queue (WorkQueue): Queue of the crawl
+    output (str): Path to the output file
+    get_details (bool): True if full details for products
+    are requested
+    output_format (str): Format of the output
+    validator (Validator): Validator to check products with, None to
+    accept every product
+
+    Returns:
+    tuple: Number of products written and number which failed
+    """
+
+    success_count = 0
+    fail_count = 0
+
+    with open_writer(output, __get_field_names(get_details),
+                     __get_field_types(get_details),
+                     format_name=output_format) as writer:
+        products = []
+        for position, product, details, error in queue.results():
+            if error:
+                fail_count += 1
+                continue
+
+            csv_entry = __get_default_fields(get_details)
+            csv_entry.update(product)
+            csv_entry.update(details or {})
+            csv_entry['search_rank'] = position
+            products.append(csv_entry)
+
+            if len(products) == CT.QUEUE_READ_ROWS:
+                valid = __valid_products(products, validator)
+                fail_count += len(products) - len(valid)
+                success_count += len(valid)
+                for csv_entry in valid:
+                    writer.write(csv_entry.values())
+                products = []
+
+        valid = __valid_products(products, validator)
+        fail_count += len(products) - len(valid)
+        success_count += len(valid)
+        for csv_entry in valid:
+            writer.write(csv_entry.values())
+
+    return success_count, fail_count
+
+
+@__own_run
+def scrape_distributed(url,
+                       queue,
+                       output=None,
+                       get_details=False,
+                       fail_log=None,
+                       limit=None,
+                       message_callback=None,
+                       progress_callback=None,
+                       fail_log_callback=None,
+                       memcached=None,
+                       work=True,
+                       worker=None,
+                       concurrency=CT.CONCURRENCY,
+                       pool_size=None,
+                       prefetch=0,
+                       parser=CT.PARSER,
+                       partial_parse=False,
+                       previous=None,
+                       duplicates=CT.DUPLICATES,
+                       output_format=None,
+                       validate=False,
+                       poll_interval=CT.QUEUE_POLL_INTERVAL,
+                       metrics_callback=None,
+                       report_metrics=False,
+                       metrics_file=None,
+                       **kwargs):
+    """Coordinate a crawl shared with any number of workers started
+    with scrape_worker. Every search result is added to the queue,
+    workers download the listings, and once every listing is done the
+    output is written in search rank order. A coordinator which is
+    stopped carries on from the queue when started again.
+
+    Parameters:
+    url (str): First page of Etsy search results to extract
+    queue (str|WorkQueue): Path to a SQLite work queue, created if
+    missing, or the queue, raises ValueError if it is for a different
+    url or get_details
+    limit (int): Limit the crawl to the first n search results. Unlike
+    scrape, listings which fail are not made up from later results,
+    so fewer than n products are written if any fail
+    work (bool): Download listings in this process as well as in the
+    workers
+    worker (str): Name of this process in the queue, defaults to the
+    host name and process ID
+    poll_interval (float): Seconds between checks of the queue while
+    waiting for the workers
+    Any other parameters are the same as for scrape, except
+    checkpoints and parse_processes which are not supported
+
+    Returns:
+    None
+    """
+
+    if not builder_registry.lookup(parser):
+        raise ValueError(f'Parser "{parser}" is not installed.')
+    if duplicates not in ('rank', 'skip'):
+        raise ValueError(f'Unknown duplicates handling "{duplicates}".')
+
+    own_queue = isinstance(queue, str)
+    if own_queue:
+        queue = SqliteWorkQueue(queue)
+
+    try:
+        queue.start(url, get_details)
+    except ValueError:
+        if own_queue:
+            queue.close()
+        raise
+
+    if isinstance(previous, str):
+        previous = __load_previous(previous)
+
+    metrics = Metrics(callback=metrics_callback)
+    fetcher, own_fail_log = __start_worker(concurrency, pool_size,
+                                           memcached, parser,
+                                           partial_parse, fail_log,
+                                           fail_log_callback, metrics,
+                                           kwargs)
+
+    try:
+        fail_count = 0
+        if not queue.discovered():
+            added, fail_count = __discover(url, queue, get_details,
+                                           limit=limit,
+                                           message_callback=message_callback,
+                                           progress_callback=(
+                                               progress_callback),
+                                           previous=previous,
+                                           duplicates=duplicates,
+                                           prefetch=prefetch)
+            queue.finish_discovery()
+            if message_callback:
+                message_callback(f'Queued {added} products, '
+                                 f'{queue.stats().get("pending", 0)} '
+                                 f'listings to download.')
+
+        if work:
+            __work(queue, worker or __worker_name(), concurrency,
+                   poll_interval)
+        while not queue.finished():
+            time.sleep(poll_interval)
+
+        with metrics.timer('write'):
+            success_count, assemble_fail_count = __assemble(
+                queue, output, get_details, output_format=output_format,
+                validator=Validator(__get_field_names(get_details))
+                if validate else None)
+    finally:
+        fetcher.close()
+        __current_run().fetcher = None
+        __stop_fail_log(own_fail_log)
+        if own_queue:
+            queue.close()
+
+    __report_run(fetcher, message_callback, success_count,
+                 fail_count + assemble_fail_count)
+    __report_metrics(metrics, message_callback, report_metrics, metrics_file)
+
+
+@__own_run
+def scrape_worker(queue,
+                  worker=None,
+                  fail_log=None,
+                  message_callback=None,
+                  fail_log_callback=None,
+                  memcached=None,
+                  concurrency=CT.CONCURRENCY,
+                  pool_size=None,
+                  parser=CT.PARSER,
+                  partial_parse=False,
+                  wait=True,
+                  poll_interval=CT.QUEUE_POLL_INTERVAL,
+                  metrics_callback=None,
+                  report_metrics=False,
+                  metrics_file=None,
+                  **kwargs):
+    """Download listings for a crawl coordinated by scrape_distributed,
+    on this or any machine which can reach the queue
+
+    Parameters:
+    queue (str|WorkQueue): Path to a SQLite work queue, created if
+    missing, or the queue
+    worker (str): Name of this process in the queue, defaults to the
+    host name and process ID
+    wait (bool): Wait for the crawl to finish, otherwise stop as soon
+    as no listings are waiting
+    poll_interval (float): Seconds between checks of the queue for
+    new listings
+    Any other parameters are the same as for iter_products
+
+    Returns:
+    None
+    """
+
+    if not builder_registry.lookup(parser):
+        raise ValueError(f'Parser "{parser}" is not installed.')
+
+    own_queue = isinstance(queue, str)
+    if own_queue:
+        queue = SqliteWorkQueue(queue)
+
+    metrics = Metrics(callback=metrics_callback)
+    fetcher, own_fail_log = __start_worker(concurrency, pool_size,
+                                           memcached, parser,
+                                           partial_parse, fail_log,
+                                           fail_log_callback, metrics,
+                                           kwargs)
+
+    try:
+        done_count, fail_count = __work(queue, worker or __worker_name(),
+                                        concurrency, poll_interval, wait)
+    finally:
+        fetcher.close()
+        __current_run().fetcher = None
+        __stop_fail_log(own_fail_log)
+        if own_queue:
+            queue.close()
+
+    if message_callback:
+        message_callback(f'Downloaded {done_count} listings, failed to '
+                         f'download {fail_count}.')
+    __report_metrics(metrics, message_callback, report_metrics, metrics_file)
+
+
+def __start_worker(concurrency, pool_size, memcached, parser, partial_parse,
+                   fail_log, fail_log_callback, metrics, kwargs):
+    """Open the fetcher of a distributed crawl process and store the
+    settings the scraping functions use in the run, see
+    iter_products for the parameters
+
+    Returns:
+    tuple: The fetcher and the failure log if one was opened, close
+    them when the process is finished
+    """
+
+    fetcher_settings = __pop_fetcher_settings(kwargs)
+    if kwargs:
+        raise TypeError(f'Unexpected settings {", ".join(kwargs)}.')
+
+    run = __current_run()
+    run.parser = parser
+    run.partial_parse = partial_parse
+    run.metrics = metrics
+    run.fetcher = __open_fetcher(concurrency, pool_size=pool_size,
+                                 memcached=memcached, metrics=metrics,
+                                 **fetcher_settings)
+    return run.fetcher, __start_fail_log(fail_log, fail_log_callback)
+
+
+def __worker_name():
+    """Get a name for this process in a work queue
+
+    Returns:
+    str: The host name and process ID
+    """
+
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+async def __async_get_page(fetcher, url):
+    """Get a page using an async fetcher, logging any failure
+
+    Parameters:
+    fetcher (AsyncFetcher): Fetcher to get the page with
+    url (str): URL to get
+
+    Returns:
+    str: Content of the page
+    """
+
+    try:
+        with __current_run().metrics.timer('fetch'):
+            return await fetcher.get(url)
+    except GetPageException as e:
+        __log_page_error(url, e)
+
+
+async def __async_download_details(url, fetcher, semaphore, parse_executor):
+    """Download a product listing page and extract its details, see
+    __download_details. The page is parsed in parse_executor so the
+    event loop is not held up.
+
+    Parameters:
+    url (str): URL of the listing
+    fetcher (AsyncFetcher): Fetcher to get the page with
+    semaphore (asyncio.Semaphore): Limits the listings downloaded and
+    parsed at the same time
+    parse_executor (concurrent.futures.Executor): Executor to parse in,
+    None for the event loop's default executor
+
+    Returns:
+    dict: A dictionary of the detail fields
+    """
+
+    run = __current_run()
+
+    async with semaphore:
+        try:
+            detail_page = await __async_get_page(fetcher, url)
+        except GetPageException:
+            raise ProductScrapeException(url)
+
+        try:
+            values, timings = await asyncio.get_running_loop().run_in_executor(
+                parse_executor, __parse_details, detail_page, run.parser,
+                run.partial_parse)
+        except MissingValueException as e:
+            __log_error(url, e, stage='extract')
+
+    for stage, seconds in timings.items():
+        run.metrics.timing(stage, seconds)
+
+    return values
+
+
+async def __async_get_product(tag, get_details, previous, shared_details,
+                              fetcher, semaphore, parse_executor,
+                              memo_size=None, downloads=None):
+    """Extract the details of a product from a search result, see
+    __get_product. Each listing in shared_details is downloaded once,
+    later products of the same listing wait on the first download.
+
+    Parameters:
+    tag (bs4.element.Tag): The tag to get the product from
+    get_details (bool): True if full details for products
+    are requested
+    previous (dict): Products from a previous scrape by listing key
+    shared_details (dict): asyncio Task of the details for each
+    listing key
+    fetcher (AsyncFetcher): Fetcher to get pages with
+    semaphore (asyncio.Semaphore): Limits the listings downloaded and
+    parsed at the same time
+    parse_executor (concurrent.futures.Executor): Executor to parse in
+    memo_size (int): Most listings to keep in shared_details, which
+    must be an OrderedDict, None to keep every listing
+    downloads (set): Set to add a download started to until it is
+    done, so it can be cancelled
+
+    Returns:
+    dict: A dictionary of product details
+    """
+
+    csv_entry, download = __search_product(tag, get_details, previous)
+    if download:
+        key = __listing_key(csv_entry['url'])
+        task = shared_details.get(key)
+        if task is None:
+            task = shared_details[key] = asyncio.ensure_future(
+                __async_download_details(csv_entry['url'], fetcher,
+                                         semaphore, parse_executor))
+            if downloads is not None:
+                downloads.add(task)
+                task.add_done_callback(downloads.discard)
+        __touch_memo(shared_details, key, memo_size)
+        # Shielded so cancelling one product does not cancel the
+        # download for the others
+        csv_entry.update(await asyncio.shield(task))
+
+    return csv_entry
+
+
+@__own_run
+async def async_iter_products(url,
+                              get_details=False,
+                              fail_log=None,
+                              limit=None,
+                              message_callback=None,
+                              progress_callback=None,
+                              fail_log_callback=None,
+                              memcached=None,
+                              cache=None,
+                              cache_size=CT.CACHE_MAX_SIZE,
+                              memory_cache=None,
+                              memory_cache_size=None,
+                              cache_compression=CT.CACHE_CODEC,
+                              cache_compression_level=CT.CACHE_COMPRESS_LEVEL,
+                              rate=CT.RATE,
+                              max_rate=CT.MAX_RATE,
+                              replay=None,
+                              concurrency=CT.ASYNC_CONCURRENCY,
+                              pool_size=None,
+                              fetcher=None,
+                              parser=CT.PARSER,
+                              partial_parse=False,
+                              previous=None,
+                              parse_executor=None,
+                              shared_details=None,
+                              duplicates=CT.DUPLICATES,
+                              metrics=None,
+                              metrics_callback=None,
+                              report_metrics=False,
+                              metrics_file=None,
+                              validate=False):
+    """Navigate through the results of an Etsy search, yielding
+    product details as they are scraped, on an event loop instead of
+    threads. Uses the same fields and extraction as iter_products.
+    Listings are downloaded with aiohttp, up to concurrency at once
+    from as many pages of results as it takes, and products are
+    yielded in search_rank order as the ones before them finish.
+    Closing or cancelling the generator cancels every download still
+    in flight.
+
+    Parameters:
+    concurrency (int): Maximum number of products to scrape at the
+    same time
+    fetcher (AsyncFetcher): Fetcher to share with other runs, if not
+    given one is created and closed for this run
+    parse_executor (concurrent.futures.Executor): Executor to parse
+    listing pages in, such as a process pool, if not given they are
+    parsed in the event loop's default executor
+    shared_details (dict): Details of listings shared with other async
+    scrapes, so each listing is downloaded only once, start with an
+    empty dict. If not given, the details of the last
+    DETAILS_MEMO_SIZE listings are kept for listings found again
+    later in the results
+    Any other parameters are the same as for iter_products, except
+    checkpoints, recording and prefetching which are not supported
+
+    Returns:
+    async generator: A dictionary of product details for each product
+    in search_rank order
+    """
+
+    if not builder_registry.lookup(parser):
+        raise ValueError(f'Parser "{parser}" is not installed.')
+    if duplicates not in ('rank', 'skip'):
+        raise ValueError(f'Unknown duplicates handling "{duplicates}".')
+
+    # Store settings in the run for use elsewhere
+    run = __current_run()
+    run.parser = parser
+    run.partial_parse = partial_parse
+
+    own_metrics = metrics is None
+    if own_metrics:
+        metrics = Metrics(callback=metrics_callback)
+    run.metrics = metrics
+
+    own_fetcher = fetcher is None
+    if own_fetcher:
+        fetcher = __open_fetcher(concurrency,
+                                 pool_size=pool_size,
+                                 memcached=memcached,
+                                 cache=cache,
+                                 cache_size=cache_size,
+                                 memory_cache=memory_cache,
+                                 memory_cache_size=memory_cache_size,
+                                 cache_compression=cache_compression,
+                                 cache_compression_level=(
+                                     cache_compression_level),
+                                 rate=rate,
+                                 max_rate=max_rate,
+                                 replay=replay,
+                                 metrics=metrics,
+                                 asynchronous=True)
+
+    own_fail_log = __start_fail_log(fail_log, fail_log_callback)
+
+    if isinstance(previous, str):
+        previous = __load_previous(previous)
+
+    validator = Validator(__get_field_names(get_details)) \
+        if validate else None
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    success_count = 0
+    fail_count = 0
+
+    # Position in the search results
+    search_rank = 0
+
+    # Key of every listing found so far, only kept for skipping
+    # duplicates
+    seen = set()
+
+    # Tasks still running, cancelled if the scrape is stopped
+    running = set()
+
+    # Download of the most recently found listings, for listings found
+    # again, unless shared with other scrapes
+    memo_size = None
+    downloads = None
+    if shared_details is None:
+        shared_details = OrderedDict()
+        memo_size = CT.DETAILS_MEMO_SIZE
+        downloads = running
+
+    def start_task(coroutine):
+        task = asyncio.ensure_future(coroutine)
+        running.add(task)
+        task.add_done_callback(running.discard)
+        return task
+
+    # Products started and not yet yielded in search_rank order, and
+    # those of them still being scraped
+    started = deque()
+    scraping = set()
+
+    def start_product(result):
+        task = start_task(__async_get_product(
+            result, get_details, previous, shared_details, fetcher,
+            semaphore, parse_executor, memo_size, downloads))
+        scraping.add(task)
+        task.add_done_callback(scraping.discard)
+        return task
+
+    results = []
+    page = start_task(__async_get_page(fetcher, url))
+
+    try:
+        while True:
+            # Start products from the results, reading later pages as
+            # needed, until concurrency are being scraped. Only as many
+            # as are still needed are started, failures are made up.
+            while len(scraping) < concurrency and \
+                    len(started) < concurrency * CT.ASYNC_READ_AHEAD and \
+                    (not limit or success_count + len(started) < limit):
+                if not results:
+                    if not page:
+                        break
+                    try:
+                        search_results = await loop.run_in_executor(
+                            None, __in_run(__make_soup), await page)
+                    except GetPageException:
+                        fail_count += 1
+                        page = None
+                        break
+
+                    if message_callback:
+                        message_callback(f'Processing {url}')
+
+                    url = __next_page_url(search_results)
+                    page = start_task(__async_get_page(fetcher, url)) \
+                        if url else None
+
+                    results = [result for result in
+                               EXTRACT.SEARCH_RESULT.select(search_results)
+                               if EXTRACT.RESULT_LINK.select_one(result)]
+                    continue
+
+                batch_size = min(concurrency - len(scraping),
+                                 concurrency * CT.ASYNC_READ_AHEAD -
+                                 len(started))
+                if limit:
+                    batch_size = min(batch_size,
+                                     limit - success_count - len(started))
+                batch, results = results[:batch_size], results[batch_size:]
+                start, search_rank, written = __start_batch(
+                    batch, search_rank, seen, duplicates,
+                    progress_callback=progress_callback)
+                started.extend((rank, start_product(result))
+                               for rank, result in start)
+
+            if not started:
+                break
+
+            if not started[0][1].done():
+                # Wait for the next product or for room to start more
+                await asyncio.wait(scraping,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            # Take the finished products from the front to keep rows in
+            # search_rank order
+            scraped = []
+            while started and started[0][1].done():
+                rank, task = started.popleft()
+                try:
+                    scraped.append((rank, task.result()))
+                except (ProductScrapeException, MissingValueException):
+                    # Already logged
+                    scraped.append((rank, None))
+
+            valid, failed = __finish_batch(scraped, validator)
+            fail_count += failed
+
+            for csv_entry in valid:
+                success_count += 1
+
+                yield csv_entry
+    finally:
+        stopping = list(running)
+        for task in stopping:
+            task.cancel()
+        await asyncio.gather(*stopping, return_exceptions=True)
+        if own_fetcher:
+            await fetcher.close()
+        __stop_fail_log(own_fail_log)
+
+    __report_run(fetcher, message_callback, success_count, fail_count)
+
+    if own_metrics:
+        __report_metrics(metrics, message_callback, report_metrics,
+                         metrics_file)
+
+
+async def async_scrape(url,
+                       output=None,
+                       collect=True,
+                       output_format=None,
+                       metrics_callback=None,
+                       report_metrics=False,
+                       metrics_file=None,
+                       message_callback=None,
+                       **kwargs):
+    """Navigate through the results of an Etsy search on an event
+    loop, extract product details to an output file and log failures,
+    see async_iter_products
+
+    Parameters:
+    url (str): First page of Etsy search results to extract
+    output (str): Path to the output file
+    collect (bool): Keep every product in memory to return, set
+    to False for large scrapes which only need the output
+    output_format (str): Format of the output, one of csv, jsonl or
+    parquet, None to choose by the output's extension
+    metrics_callback (function): Called with the name and value of
+    every timing, size and count as it is recorded
+    report_metrics (bool): Send a summary of the timings with
+    percentiles to message_callback at the end of the run
+    metrics_file (str): Path to write a JSON summary of the metrics
+    to at the end of the run
+    message_callback (function): Callback function for dealing
+    with messages
+    kwargs: Any other settings of async_iter_products
+
+    Returns:
+    list: A dictionary of product details for each product, None
+    if collect is False
+    """
+
+    scraped_data = [] if collect else None
+    metrics = Metrics(callback=metrics_callback)
+    get_details = kwargs.get('get_details', False)
+
+    with open_writer(output, __get_field_names(get_details),
+                     __get_field_types(get_details),
+                     format_name=output_format) as writer:
+        async for csv_entry in async_iter_products(
+                url, message_callback=message_callback, metrics=metrics,
+                **kwargs):
+            with metrics.timer('write'):
+                writer.write(csv_entry.values())
+            if collect:
+                scraped_data.append(csv_entry)
+
+    __report_metrics(metrics, message_callback, report_metrics, metrics_file)
 
     return scraped_data
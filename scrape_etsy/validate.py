@@ -0,0 +1,98 @@
+from scrape_etsy.writers import coerce
+
+
+class Validator():
+    """Validates batches of rows against the specifications of their
+    fields, one column at a time. A row is invalid if a required field
+    is empty or a field with a type of int or float has a value which
+    is not a number of that type. These are the same checks as the
+    tests of the fields in paths, and numbers are parsed the same way
+    as by the writers, which valid rows can be converted with.
+    """
+
+    def __init__(self, fields):
+        """
+        Parameters:
+        fields (dict): Field specifications from paths, for every
+        field of the rows
+        """
+
+        self.required = [field_name for field_name, field in fields.items()
+                         if field.get('required', True)]
+        self.numeric = dict((field_name, field['type'])
+                            for field_name, field in fields.items()
+                            if field.get('type') in ('int', 'float'))
+
+    def validate(self, rows):
+        """Find the problems with each row of a batch
+
+        Parameters:
+        rows (list): A dictionary of values for each row
+
+        Returns:
+        list: A list of problems for each row, empty if it is valid
+        """
+
+        problems = [[] for row in rows]
+        if not rows:
+            return problems
+
+        for field_name in self.required:
+            for i in self.__empty([row.get(field_name) for row in rows]):
+                problems[i].append(f'{field_name} is empty')
+
+        for field_name, type_name in self.numeric.items():
+            column = [row.get(field_name) for row in rows]
+            for i in self.__not_numbers(column, type_name):
+                problems[i].append(f'{field_name} is not {type_name} '
+                                   f'"{column[i]}"')
+
+        return problems
+
+    def coerce(self, rows):
+        """Convert the int and float fields of a batch of rows to
+        numbers, in place. Empty values become None.
+
+        Parameters:
+        rows (list): A dictionary of values for each row, valid rows
+        so every number parses
+
+        Returns:
+        list: The rows
+        """
+
+        for field_name, type_name in self.numeric.items():
+            for row in rows:
+                if field_name in row:
+                    row[field_name] = coerce(row[field_name], type_name)
+
+        return rows
+
+    def __empty(self, column):
+        """Find the empty values of a column
+
+        Parameters:
+        column (list): Values of the column
+
+        Returns:
+        list: Position of each empty value
+        """
+
+        return [i for i, value in enumerate(column)
+                if value is None or value == '']
+
+    def __not_numbers(self, column, type_name):
+        """Find the values of a column which are not numbers of a type,
+        ignoring empty values
+
+        Parameters:
+        column (list): Values of the column
+        type_name (str): Type of the column, int or float
+
+        Returns:
+        list: Position of each value which is not a number
+        """
+
+        return [i for i, value in enumerate(column)
+                if value is not None and value != '' and
+                coerce(value, type_name) is None]
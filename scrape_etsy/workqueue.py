@@ -0,0 +1,340 @@
+import json
+import time
+import sqlite3
+import threading
+
+import scrape_etsy.constants as CT
+
+
+class WorkQueue():
+    """Interface for the queue shared by the coordinator and workers of
+    a distributed crawl. The coordinator adds a row for each search
+    result and a listing for each listing whose details are needed.
+    Workers lease listings, download them and complete them with their
+    details. A lease which runs out is given to another worker, so a
+    crashed worker's listings are not lost.
+    """
+
+    def start(self, url, get_details):
+        """Record the search of the crawl in a new queue, or check a
+        queue being carried on is for the same search
+
+        Parameters:
+        url (str): First page of Etsy search results of the crawl
+        get_details (bool): True if full details for products
+        are requested
+
+        Returns:
+        None, raises ValueError if the queue is for a different search
+        or get_details
+        """
+
+        raise NotImplementedError()
+
+    def add(self, position, key, url, product, download):
+        """Add a search result, doing nothing if its position was
+        already added
+
+        Parameters:
+        position (int): Search rank of the result
+        key (str): Listing key of the result
+        url (str): URL of the listing
+        product (dict): Values found in the search result
+        download (bool): True if the listing's details are needed
+
+        Returns:
+        None
+        """
+
+        raise NotImplementedError()
+
+    def finish_discovery(self):
+        """Record that every search result has been added
+
+        Returns:
+        None
+        """
+
+        raise NotImplementedError()
+
+    def discovered(self):
+        """Check if every search result has been added
+
+        Returns:
+        bool: True once finish_discovery has been called
+        """
+
+        raise NotImplementedError()
+
+    def take(self, worker, count=1, lease=CT.QUEUE_LEASE):
+        """Lease listings to download
+
+        Parameters:
+        worker (str): Name of the worker, for finding stuck workers
+        count (int): Most listings to lease
+        lease (float): Seconds before the listings may be given to
+        another worker
+
+        Returns:
+        list: (key, url) of each listing leased, empty if none are
+        waiting
+        """
+
+        raise NotImplementedError()
+
+    def complete(self, key, details):
+        """Record the details of a downloaded listing
+
+        Parameters:
+        key (str): Listing key
+        details (dict): Values of the detail fields
+
+        Returns:
+        None
+        """
+
+        raise NotImplementedError()
+
+    def fail(self, key, error):
+        """Record that a listing could not be downloaded
+
+        Parameters:
+        key (str): Listing key
+        error (str): Description of the failure
+
+        Returns:
+        None
+        """
+
+        raise NotImplementedError()
+
+    def finished(self):
+        """Check if the crawl is finished
+
+        Returns:
+        bool: True if every search result has been added and every
+        listing is complete or failed
+        """
+
+        raise NotImplementedError()
+
+    def results(self):
+        """Get every search result with its listing's details
+
+        Returns:
+        generator: (position, product, details, error) for each search
+        result in position order, details is None unless the listing
+        was downloaded and error is None unless it failed
+        """
+
+        raise NotImplementedError()
+
+    def stats(self):
+        """Get the progress of the crawl
+
+        Returns:
+        dict: Number of listings in each state
+        """
+
+        return {}
+
+    def close(self):
+        """Release any connections held by the queue
+
+        Returns:
+        None
+        """
+
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SqliteWorkQueue(WorkQueue):
+    """Work queue in a SQLite file, for workers in processes on one
+    machine or nodes sharing a filesystem with working locks. Every
+    change is its own transaction, so the file always holds the
+    progress of the crawl.
+    """
+
+    SCHEMA_VERSION = 1
+
+    def __init__(self, path):
+        """
+        Parameters:
+        path (str): Path to the SQLite file, created if missing
+        """
+
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False,
+                                          isolation_level=None,
+                                          timeout=CT.QUEUE_BUSY_TIMEOUT)
+
+        with self.lock:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            version = self.connection.execute(
+                'PRAGMA user_version').fetchone()[0]
+            if version not in (0, self.SCHEMA_VERSION):
+                raise ValueError(f'{path} is not a version '
+                                 f'{self.SCHEMA_VERSION} work queue.')
+            self.connection.execute(
+                f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS results ('
+                                    'position INTEGER PRIMARY KEY, '
+                                    'key TEXT NOT NULL, '
+                                    'product TEXT NOT NULL)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS listings ('
+                                    'key TEXT PRIMARY KEY, '
+                                    'url TEXT NOT NULL, '
+                                    'position INTEGER NOT NULL, '
+                                    "state TEXT NOT NULL DEFAULT 'pending', "
+                                    'worker TEXT, '
+                                    'leased_until REAL, '
+                                    'attempts INTEGER NOT NULL DEFAULT 0, '
+                                    'details TEXT, '
+                                    'error TEXT)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS '
+                                    'listings_state ON listings '
+                                    '(state, position)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS settings ('
+                                    'name TEXT PRIMARY KEY, '
+                                    'value TEXT NOT NULL)')
+
+    def start(self, url, get_details):
+        crawl = {'url': url, 'get_details': json.dumps(bool(get_details))}
+
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                recorded = dict(self.connection.execute(
+                    'SELECT name, value FROM settings '
+                    "WHERE name IN ('url', 'get_details')").fetchall())
+                if not recorded:
+                    self.connection.executemany(
+                        'INSERT INTO settings VALUES (?, ?)',
+                        crawl.items())
+                self.connection.execute('COMMIT')
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+
+        if recorded and recorded != crawl:
+            raise ValueError(f'The work queue is for a crawl of '
+                             f'{recorded.get("url")} with get_details '
+                             f'{recorded.get("get_details")}, not {url} '
+                             f'with get_details {crawl["get_details"]}.')
+
+    def add(self, position, key, url, product, download):
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                self.connection.execute('INSERT OR IGNORE INTO results '
+                                        'VALUES (?, ?, ?)',
+                                        (position, key, json.dumps(product)))
+                if download:
+                    self.connection.execute('INSERT OR IGNORE INTO listings '
+                                            '(key, url, position) '
+                                            'VALUES (?, ?, ?)',
+                                            (key, url, position))
+                self.connection.execute('COMMIT')
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+
+    def finish_discovery(self):
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO settings '
+                                    "VALUES ('discovered', '1')")
+
+    def discovered(self):
+        with self.lock:
+            return self.connection.execute(
+                "SELECT 1 FROM settings WHERE name = 'discovered'"
+            ).fetchone() is not None
+
+    def take(self, worker, count=1, lease=CT.QUEUE_LEASE):
+        now = time.time()
+
+        with self.lock:
+            # Taken in one write transaction so two workers can not
+            # lease the same listing
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                listings = self.connection.execute(
+                    'SELECT key, url FROM listings '
+                    "WHERE (state = 'pending' OR (state = 'leased' AND "
+                    'leased_until < ?)) AND attempts < ? '
+                    'ORDER BY position LIMIT ?',
+                    (now, CT.QUEUE_MAX_ATTEMPTS, count)).fetchall()
+                self.connection.executemany(
+                    "UPDATE listings SET state = 'leased', worker = ?, "
+                    'leased_until = ?, attempts = attempts + 1 '
+                    'WHERE key = ?',
+                    [(worker, now + lease, key) for key, url in listings])
+                self.connection.execute('COMMIT')
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+
+        return listings
+
+    def complete(self, key, details):
+        with self.lock:
+            self.connection.execute("UPDATE listings SET state = 'done', "
+                                    'details = ?, error = NULL '
+                                    'WHERE key = ?',
+                                    (json.dumps(details), key))
+
+    def fail(self, key, error):
+        with self.lock:
+            self.connection.execute("UPDATE listings SET state = 'failed', "
+                                    'error = ? WHERE key = ? '
+                                    "AND state != 'done'", (error, key))
+
+    def finished(self):
+        if not self.discovered():
+            return False
+
+        with self.lock:
+            # A lease which ran out on its last attempt counts as failed
+            return self.connection.execute(
+                'SELECT 1 FROM listings '
+                "WHERE state = 'pending' OR (state = 'leased' AND "
+                '(leased_until >= ? OR attempts < ?)) LIMIT 1',
+                (time.time(), CT.QUEUE_MAX_ATTEMPTS)).fetchone() is None
+
+    def results(self):
+        position = 0
+        while True:
+            # Read a batch at a time so memory does not grow with the
+            # size of the crawl
+            with self.lock:
+                rows = self.connection.execute(
+                    'SELECT results.position, product, state, details, '
+                    'error, attempts FROM results LEFT JOIN listings '
+                    'ON results.key = listings.key '
+                    'WHERE results.position > ? '
+                    'ORDER BY results.position LIMIT ?',
+                    (position, CT.QUEUE_READ_ROWS)).fetchall()
+            if not rows:
+                return
+
+            for position, product, state, details, error, attempts in rows:
+                if state == 'leased':
+                    error = f'Lease ran out {attempts} times'
+                yield (position, json.loads(product),
+                       json.loads(details) if details else None, error)
+
+    def stats(self):
+        with self.lock:
+            return dict(self.connection.execute(
+                'SELECT state, COUNT(*) FROM listings GROUP BY state'
+            ).fetchall())
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
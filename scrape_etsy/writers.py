@@ -0,0 +1,348 @@
+import os
+import sys
+import csv
+import json
+import time
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+import scrape_etsy.constants as CT
+
+# Output formats by file extension, anything else is written as CSV
+EXTENSIONS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl',
+              '.parquet': 'parquet'}
+TYPES = {'str': str, 'int': int, 'float': float}
+
+
+def coerce(value, type_name):
+    """Convert a scraped value to the type of its field
+
+    Parameters:
+    value (str): Value as scraped
+    type_name (str): Type of the field, one of str, int or float
+
+    Returns:
+    object: The converted value, None if it is empty or can not be
+    converted
+    """
+
+    if value is None or value == '':
+        return None
+
+    try:
+        return TYPES[type_name](value)
+    except ValueError:
+        return None
+
+
+def get_format(output, format_name=None):
+    """Choose the format to write an output in
+
+    Parameters:
+    output (str): Path to the output, None for stdout
+    format_name (str): Format asked for, one of csv, jsonl or parquet,
+    None to choose by the output's extension
+
+    Returns:
+    str: The format
+    """
+
+    if format_name:
+        if format_name not in set(EXTENSIONS.values()):
+            raise ValueError(f'Unknown output format "{format_name}".')
+        return format_name
+
+    return EXTENSIONS.get(os.path.splitext(output or '')[1].lower(), 'csv')
+
+
+class Writer():
+    """Writes rows to an output which is kept open for the whole
+    run. Rows are buffered and written out every buffer_rows rows or
+    flush_interval seconds, and when the writer is closed.
+    """
+
+    def __init__(self, output, fieldnames, types=None,
+                 buffer_rows=CT.WRITE_BUFFER_ROWS,
+                 flush_interval=CT.WRITE_FLUSH_INTERVAL):
+        """
+        Parameters:
+        output (str): Path to the output, None to write to stdout
+        fieldnames (list): Field names of the columns
+        types (list): Type of each column, one of str, int or float,
+        all str if not given
+        buffer_rows (int): Number of rows to buffer before writing
+        flush_interval (float): Maximum seconds to hold rows in the
+        buffer, checked whenever a row is written
+        """
+
+        self.output = output
+        self.fieldnames = list(fieldnames)
+        self.types = list(types or ['str'] * len(self.fieldnames))
+        self.buffer_rows = buffer_rows
+        self.flush_interval = flush_interval
+        self.rows = []
+        self.last_flush = time.monotonic()
+
+    def write(self, values):
+        """Buffer a row, writing out the buffer if it is full or
+        has been held too long
+
+        Parameters:
+        values (list): List of values to write, in column order
+
+        Returns:
+        None
+        """
+
+        self.rows.append(list(values))
+
+        if len(self.rows) >= self.buffer_rows or \
+                time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write out all buffered rows
+
+        Returns:
+        None
+        """
+
+        self.write_rows(self.rows)
+        self.rows = []
+        self.last_flush = time.monotonic()
+
+    def write_rows(self, rows):
+        """Write rows to the output
+
+        Parameters:
+        rows (list): List of rows to write
+
+        Returns:
+        None
+        """
+
+        raise NotImplementedError()
+
+    def close(self):
+        """Write out all buffered rows and close the output
+
+        Returns:
+        None
+        """
+
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvWriter(Writer):
+    """Writes rows to a CSV file, every value as text."""
+
+    def __init__(self, output, fieldnames, types=None,
+                 buffer_rows=CT.WRITE_BUFFER_ROWS,
+                 flush_interval=CT.WRITE_FLUSH_INTERVAL,
+                 append=False):
+        """Open the output and write the header row
+
+        Parameters:
+        output (str): Path to the output CSV file, None to write
+        to stdout
+        fieldnames (list): Field names for the header row
+        types (list): Not used, CSV values are text
+        buffer_rows (int): Number of rows to buffer before writing
+        flush_interval (float): Maximum seconds to hold rows in the
+        buffer, checked whenever a row is written
+        append (bool): Add rows to an existing output, the header is
+        only written if the output is empty
+        """
+
+        super().__init__(output, fieldnames, types=types,
+                         buffer_rows=buffer_rows,
+                         flush_interval=flush_interval)
+
+        if output:
+            self.file = open(output, 'a' if append else 'w', newline='')
+        else:
+            self.file = sys.stdout
+
+        self.writer = csv.writer(self.file, delimiter=',', quotechar='"',
+                                 quoting=csv.QUOTE_MINIMAL,
+                                 doublequote=True)
+        if not append or not output or self.file.tell() == 0:
+            self.writer.writerow(fieldnames)
+        self.flush()
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            if self.output:
+                self.file.close()
+
+
+class JsonLinesWriter(Writer):
+    """Writes rows to a JSON Lines file, one object per row with
+    values converted to the type of their column.
+    """
+
+    def __init__(self, output, fieldnames, types=None,
+                 buffer_rows=CT.WRITE_BUFFER_ROWS,
+                 flush_interval=CT.WRITE_FLUSH_INTERVAL,
+                 append=False):
+        """Open the output
+
+        Parameters:
+        output (str): Path to the output file, None to write to stdout
+        fieldnames (list): Field names for the keys of each object
+        types (list): Type of each column, one of str, int or float
+        buffer_rows (int): Number of rows to buffer before writing
+        flush_interval (float): Maximum seconds to hold rows in the
+        buffer, checked whenever a row is written
+        append (bool): Add rows to an existing output
+        """
+
+        super().__init__(output, fieldnames, types=types,
+                         buffer_rows=buffer_rows,
+                         flush_interval=flush_interval)
+
+        if output:
+            self.file = open(output, 'a' if append else 'w')
+        else:
+            self.file = sys.stdout
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.file.write(json.dumps(dict(
+                (field_name, coerce(value, type_name))
+                for field_name, type_name, value
+                in zip(self.fieldnames, self.types, row))))
+            self.file.write('\n')
+        self.file.flush()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            if self.output:
+                self.file.close()
+
+
+class ParquetWriter(Writer):
+    """Writes rows to a Parquet file with typed columns, one row group
+    for each flush of the buffer. Needs the pyarrow package.
+    """
+
+    ARROW_TYPES = {'str': 'string', 'int': 'int64', 'float': 'float64'}
+
+    def __init__(self, output, fieldnames, types=None,
+                 buffer_rows=CT.PARQUET_ROW_GROUP_ROWS,
+                 flush_interval=None, append=False):
+        """Open the output
+
+        Parameters:
+        output (str): Path to the output Parquet file
+        fieldnames (list): Field names of the columns
+        types (list): Type of each column, one of str, int or float
+        buffer_rows (int): Number of rows in each row group
+        flush_interval (float): Not used, row groups are only written
+        when full or the writer is flushed
+        append (bool): Not supported by Parquet
+        """
+
+        if not pyarrow:
+            raise ValueError('Parquet output needs the pyarrow package.')
+        if not output:
+            raise ValueError('Parquet output needs an output file.')
+        if append:
+            raise ValueError('Parquet output can not be appended to.')
+
+        super().__init__(output, fieldnames, types=types,
+                         buffer_rows=buffer_rows,
+                         flush_interval=float('inf'))
+
+        self.schema = pyarrow.schema(
+            [(field_name, getattr(pyarrow, self.ARROW_TYPES[type_name])())
+             for field_name, type_name in zip(self.fieldnames, self.types)])
+        self.writer = pyarrow.parquet.ParquetWriter(output, self.schema)
+
+    def write_rows(self, rows):
+        if not rows:
+            return
+
+        columns = [[coerce(row[i], type_name) for row in rows]
+                   for i, type_name in enumerate(self.types)]
+        self.writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(column, type=field.type)
+             for column, field in zip(columns, self.schema)],
+            schema=self.schema))
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.writer.close()
+
+
+WRITERS = {'csv': CsvWriter, 'jsonl': JsonLinesWriter,
+           'parquet': ParquetWriter}
+
+
+def open_writer(output, fieldnames, types=None, format_name=None,
+                append=False):
+    """Open a writer for the output's format
+
+    Parameters:
+    output (str): Path to the output, None to write to stdout
+    fieldnames (list): Field names of the columns
+    types (list): Type of each column, one of str, int or float
+    format_name (str): Format to write, one of csv, jsonl or parquet,
+    None to choose by the output's extension
+    append (bool): Add rows to an existing output
+
+    Returns:
+    Writer: The writer, close it when the run is finished
+    """
+
+    return WRITERS[get_format(output, format_name)](
+        output, fieldnames, types=types, append=append)
+
+
+def read_rows(path, format_name=None):
+    """Read the rows of an output written by any of the writers
+
+    Parameters:
+    path (str): Path to the output
+    format_name (str): Format of the output, None to choose by its
+    extension
+
+    Returns:
+    generator: A dictionary of values for each row, text for CSV and
+    typed for other formats
+    """
+
+    format_name = get_format(path, format_name)
+
+    if format_name == 'parquet':
+        if not pyarrow:
+            raise ValueError('Parquet output needs the pyarrow package.')
+        yield from pyarrow.parquet.read_table(path).to_pylist()
+    elif format_name == 'jsonl':
+        with open(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, 'r', newline='') as f:
+            yield from csv.DictReader(f)
@@ -23,5 +23,11 @@ with open('README.md', 'r') as fh:
             'beautifulsoup4',
             'requests',
             'pymemcache',
-        ]
+        ],
+        extras_require={
+            'lxml': ['lxml'],
+            'zstd': ['zstandard'],
+            'parquet': ['pyarrow'],
+            'async': ['aiohttp'],
+        }
     )
@@ -0,0 +1,125 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from benchmarks.synthetic import (search_page, listing_page, search_url,
+                                  listing_url)
+from scrape_etsy.replay import PageArchive
+from scrape_etsy.exceptions import GetPageException
+
+
+@pytest.fixture
+def make_archive(tmp_path):
+    """Factory for archives of synthetic search results and listings,
+    saved in tmp_path so they can be replayed. Pages put in the
+    archive afterwards need another save. The first page of results
+    is archive.url.
+    """
+
+    def make(pages=1, listings=3, missing=()):
+        archive = PageArchive(str(tmp_path / 'pages.json.gz'))
+        for page in range(1, pages + 1):
+            archive.put(search_url(page),
+                        search_page(page, pages, listings, filler=0))
+            for i in range(listings):
+                archive.put(listing_url(page, i),
+                            listing_page(page * 1000 + i, filler=0))
+
+        # Listings which fail when replayed
+        for url in missing:
+            archive.put(url, None)
+
+        archive.url = search_url()
+        archive.save()
+        return archive
+
+    return make
+
+
+def repeat_first_listing(archive, url, before):
+    """Add the first result of the first page to another page of
+    results, before the given markup"""
+
+    first_page = archive.get(archive.url)
+    repeated = first_page[first_page.index('<li'):
+                          first_page.index('</li>') + len('</li>')]
+    page = archive.get(url)
+    index = page.index(before)
+    archive.put(url, page[:index] + repeated + page[index:])
+
+
+def drop_description(archive, url):
+    """Remove the required description from a listing page"""
+
+    archive.put(url, archive.get(url).replace(
+        'data-product-details-description-text-content', ''))
+
+
+class SlowFetcher():
+    """Gets pages from an archive, later listings on a page faster
+    than earlier ones, recording every URL got and the most listings
+    downloading at once"""
+
+    cache = None
+    limiter = None
+
+    def __init__(self, archive, delay=0.005):
+        self.archive = archive
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.fetched = []
+        self.in_flight = 0
+        self.most_in_flight = 0
+
+    def get(self, url):
+        listing = '/listing/' in url
+        with self.lock:
+            self.fetched.append(url)
+            if listing:
+                self.in_flight += 1
+                self.most_in_flight = max(self.most_in_flight,
+                                          self.in_flight)
+        try:
+            if listing:
+                position = int(url.rsplit('-', 1)[1])
+                time.sleep(self.delay * (20 - position))
+            page = self.archive.get(url)
+            if page is None:
+                raise GetPageException(url)
+            return page
+        finally:
+            if listing:
+                with self.lock:
+                    self.in_flight -= 1
+
+    def listings(self):
+        return [url for url in self.fetched if '/listing/' in url]
+
+    def close(self):
+        pass
+
+
+class AsyncSlowFetcher(SlowFetcher):
+    """Gets pages from an archive on an event loop after a delay,
+    longer for listings if listing_delay is given, counting the most
+    pages in flight at once"""
+
+    def __init__(self, archive, delay=0.01, listing_delay=None):
+        super().__init__(archive, delay)
+        self.listing_delay = listing_delay or delay
+
+    async def get(self, url):
+        self.fetched.append(url)
+        self.in_flight += 1
+        self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.listing_delay if '/listing/' in url
+                                else self.delay)
+            page = self.archive.get(url)
+            if page is None:
+                raise GetPageException(url)
+            return page
+        finally:
+            self.in_flight -= 1
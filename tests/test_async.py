@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+
+from scrape_etsy.scrape_etsy import iter_products, async_iter_products
+from scrape_etsy.replay import ArchiveServer
+from tests.conftest import (AsyncSlowFetcher, repeat_first_listing,
+                            drop_description)
+
+
+async def _collect(products):
+    return [product async for product in products]
+
+
+@pytest.fixture
+def archive(make_archive):
+    # The third listing fails when replayed
+    return make_archive(pages=2, listings=4,
+                        missing=['https://www.etsy.com/listing/1002/item-2'])
+
+
+def test_async_matches_sync(archive):
+    url = archive.url
+    products = list(iter_products(url, get_details=True,
+                                  replay=archive.path))
+
+    assert len(products) == 7
+    assert asyncio.run(_collect(async_iter_products(
+        url, get_details=True, replay=archive.path))) == products
+
+
+def test_async_concurrency_bounded(make_archive):
+    fetcher = AsyncSlowFetcher(make_archive(listings=20))
+
+    products = asyncio.run(_collect(async_iter_products(
+        fetcher.archive.url, get_details=True,
+        fetcher=fetcher, concurrency=3)))
+
+    assert len(products) == 20
+    # Listings and the search page
+    assert fetcher.most_in_flight <= 4
+
+
+def test_async_listings_in_flight_across_pages(make_archive):
+    fetcher = AsyncSlowFetcher(make_archive(pages=10, listings=5),
+                               listing_delay=0.5)
+
+    products = asyncio.run(_collect(async_iter_products(
+        fetcher.archive.url, get_details=True,
+        fetcher=fetcher, concurrency=1000)))
+
+    assert [product['search_rank'] for product in products] == \
+        list(range(1, 51))
+    # Every listing is started before the first is done
+    assert fetcher.most_in_flight >= 50
+
+
+def test_async_limit_makes_up_failures(archive):
+    fetcher = AsyncSlowFetcher(archive)
+
+    products = asyncio.run(_collect(async_iter_products(
+        archive.url, get_details=True, fetcher=fetcher, limit=5)))
+
+    assert [product['search_rank'] for product in products] == \
+        [1, 2, 4, 5, 6]
+    assert len([url for url in fetcher.fetched if '/listing/' in url]) == 6
+
+
+def test_async_missing_required_detail_counted_as_failure(make_archive):
+    archive = make_archive(listings=4)
+    url = 'https://www.etsy.com/listing/1001/item-1'
+    drop_description(archive, url)
+    failures = []
+    messages = []
+
+    products = asyncio.run(_collect(async_iter_products(
+        archive.url, get_details=True, fetcher=AsyncSlowFetcher(archive),
+        message_callback=messages.append,
+        fail_log_callback=lambda url, error: failures.append(url))))
+
+    assert [product['search_rank'] for product in products] == [1, 3, 4]
+    assert failures == [url]
+    assert 'Scraped 3 products, failed to scrape 1.' in messages
+
+
+def test_async_close_cancels_downloads(make_archive):
+    fetcher = AsyncSlowFetcher(make_archive(listings=20))
+
+    async def first_product():
+        products = async_iter_products(fetcher.archive.url,
+                                       get_details=True, fetcher=fetcher)
+        async for product in products:
+            await products.aclose()
+            return product, len(asyncio.all_tasks())
+
+    product, tasks = asyncio.run(first_product())
+    assert product['search_rank'] == 1
+    assert tasks == 1
+    assert fetcher.in_flight == 0
+
+
+def test_async_fetcher_over_archive_server(archive):
+    pytest.importorskip('aiohttp')
+    url = archive.url
+    replayed = list(iter_products(url, get_details=True, replay=archive.path))
+
+    with ArchiveServer(archive) as server:
+        served = asyncio.run(_collect(async_iter_products(
+            server.url(url), get_details=True, rate=None)))
+
+    for product in served:
+        product['url'] = product['url'].replace(server.base_url,
+                                                'https://www.etsy.com')
+    assert served == replayed
+
+
+def test_async_repeats_downloaded_once(make_archive):
+    archive = make_archive(pages=2, listings=2)
+    # Repeated in the first batch and again on the second page
+    repeat_first_listing(archive, archive.url, '</ul>')
+    repeat_first_listing(archive, archive.url + '&page=2', '</ul>')
+    fetcher = AsyncSlowFetcher(archive)
+
+    products = asyncio.run(_collect(async_iter_products(
+        archive.url, get_details=True, fetcher=fetcher)))
+
+    listing = 'https://www.etsy.com/listing/1000/item-0'
+    assert [product['url'] for product in products].count(listing) == 3
+    assert fetcher.fetched.count(listing) == 1
+
+
+def test_concurrent_runs_keep_their_settings(make_archive):
+    fetchers = {'first': AsyncSlowFetcher(make_archive(missing=[
+                    'https://www.etsy.com/listing/1001/item-1'])),
+                'second': AsyncSlowFetcher(make_archive(missing=[
+                    'https://www.etsy.com/listing/1002/item-2']))}
+    failures = {'first': [], 'second': []}
+
+    async def scrape_both():
+        return await asyncio.gather(*(_collect(async_iter_products(
+            fetcher.archive.url, get_details=True, fetcher=fetcher,
+            fail_log_callback=lambda url, error, name=name:
+            failures[name].append(url)))
+            for name, fetcher in fetchers.items()))
+
+    first, second = asyncio.run(scrape_both())
+
+    assert len(first) == len(second) == 2
+    assert failures == {
+        'first': ['https://www.etsy.com/listing/1001/item-1'],
+        'second': ['https://www.etsy.com/listing/1002/item-2']}
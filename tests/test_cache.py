@@ -0,0 +1,167 @@
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import scrape_etsy.cache as cache_module
+from scrape_etsy.fetcher import read_cached
+from scrape_etsy.cache import (SqliteCache, MemoryCache, TieredCache,
+                               open_cache, encode_page, decode_page,
+                               check_codec)
+
+
+@pytest.fixture
+def cache_path():
+    fp = tempfile.NamedTemporaryFile()
+    path = fp.name
+    fp.close()
+    yield path
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def test_sqlite_cache(cache_path):
+    with SqliteCache(cache_path) as cache:
+        cache.set('https://www.etsy.com/listing/1', b'page' * 100)
+
+        assert cache.get('https://www.etsy.com/listing/1') == b'page' * 100
+        assert cache.get('https://www.etsy.com/listing/2') is None
+
+    # Values persist between runs
+    with SqliteCache(cache_path) as cache:
+        assert cache.get('https://www.etsy.com/listing/1') == b'page' * 100
+
+
+def test_sqlite_cache_expires(cache_path):
+    with SqliteCache(cache_path) as cache:
+        cache.set('https://www.etsy.com/listing/1', b'page', expire=-1)
+
+        assert cache.get('https://www.etsy.com/listing/1') is None
+
+
+def test_sqlite_cache_evicts_least_recently_used(cache_path):
+    page = os.urandom(1000)
+
+    with SqliteCache(cache_path, max_size=2500) as cache:
+        cache.set('a', page)
+        cache.set('b', page)
+        cache.get('a')
+        cache.set('c', page)
+
+        assert cache.get('a') == page
+        assert cache.get('b') is None
+        assert cache.get('c') == page
+        assert cache.size <= 2500
+
+
+def test_open_cache_rejects_two_backends(cache_path):
+    assert open_cache() is None
+
+    with pytest.raises(ValueError):
+        open_cache(memcached='localhost:11211', path=cache_path)
+
+
+def test_memory_cache_bounds():
+    cache = MemoryCache(max_entries=2)
+    cache.set('a', b'1')
+    cache.set('b', b'2')
+    cache.get('a')
+    cache.set('c', b'3')
+
+    assert cache.get('b') is None
+    assert cache.get('a') == b'1'
+
+    cache = MemoryCache(max_bytes=5)
+    cache.set('a', b'123')
+    cache.set('b', b'456')
+
+    assert cache.get('a') is None
+    assert cache.stats() == {'hits': 0, 'misses': 1, 'entries': 1,
+                             'bytes': 3}
+
+
+def test_tiered_cache_keeps_remote_pages_in_memory(cache_path):
+    remote = SqliteCache(cache_path)
+    remote.set('a', b'page')
+
+    with TieredCache(MemoryCache(max_entries=10), remote) as cache:
+        assert cache.get('a') == b'page'
+        assert cache.get('a') == b'page'
+        assert cache.get('b') is None
+
+        assert cache.stats()['hits'] == 1
+        assert cache.stats()['remote_hits'] == 1
+        assert cache.stats()['remote_misses'] == 1
+
+
+def test_tiered_cache_counts_from_many_threads():
+    remote = MemoryCache()
+    remote.set('a', b'page')
+    cache = TieredCache(MemoryCache(max_entries=1), remote)
+
+    def get(i):
+        # Alternately missing and evicting the page from memory
+        cache.get(f'missing-{i}')
+        cache.set(f'kept-{i}', b'other')
+        return cache.get('a')
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            assert all(page == b'page'
+                       for page in executor.map(get, range(4000)))
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    stats = cache.stats()
+    assert stats['remote_misses'] == 4000
+    assert stats['remote_hits'] + stats['hits'] == 4000
+
+
+@pytest.mark.parametrize('codec', ['none', 'zlib', 'zstd'])
+def test_encoded_pages_round_trip(codec):
+    if codec == 'zstd':
+        pytest.importorskip('zstandard')
+
+    page = '<html><body>' + 'Ünïcode listing ' * 100 + '</body></html>'
+    validators = {'stored': 1.5, 'etag': '"abc"', 'last_modified': None}
+    value = encode_page(page, validators=validators, codec=codec, level=3)
+
+    assert decode_page(value) == (page, validators)
+    if codec != 'none':
+        assert len(value) < len(page.encode())
+
+
+def test_pages_cached_before_encoding_still_read():
+    assert decode_page('<html>Old page</html>'.encode()) == \
+        ('<html>Old page</html>', {})
+
+    # Version 1 values had no validators
+    assert decode_page(b'\x00ESC\x01\x00<html>Old page</html>') == \
+        ('<html>Old page</html>', {})
+
+
+def test_zstd_page_without_zstandard_is_a_miss(monkeypatch):
+    monkeypatch.setattr(cache_module, 'zstandard', None)
+    value = b'\x00ESC\x02\x02\x00\x02{}(\xb5/\xfd'
+
+    assert decode_page(value) == (None, {})
+    assert read_cached(value) == (None, {}, False, {})
+
+
+@pytest.mark.parametrize('value', [
+    encode_page('<html>Listing</html>' * 50, codec='zlib')[:-10],
+    b'\x00ESC\x02\x01\x00\x09{"stored"',
+    b'\x00ESC'], ids=['truncated', 'validators', 'header'])
+def test_corrupt_page_is_a_miss(value):
+    assert decode_page(value) == (None, {})
+    assert read_cached(value) == (None, {}, False, {})
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        check_codec('lzma')
@@ -0,0 +1,39 @@
+import os
+
+from scrape_etsy.checkpoint import Checkpoint
+
+SEARCH_URL = 'https://www.etsy.com/search?q=clock'
+
+
+def test_checkpoint_resumes_same_search(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    flushed = []
+
+    checkpoint = Checkpoint(path, SEARCH_URL,
+                            before_save=lambda: flushed.append(True))
+    assert not checkpoint.resumed
+
+    checkpoint.complete('https://www.etsy.com/listing/1', 1)
+    checkpoint.start_page(SEARCH_URL + '&page=2', 64, 63, 1)
+    assert flushed
+
+    checkpoint = Checkpoint(path, SEARCH_URL)
+    assert checkpoint.resumed
+    assert checkpoint.page_url == SEARCH_URL + '&page=2'
+    assert checkpoint.search_rank == 64
+    assert checkpoint.success_count == 63
+    assert checkpoint.fail_count == 1
+    assert checkpoint.completed == {('https://www.etsy.com/listing/1', 1)}
+
+    checkpoint.finish()
+    assert not os.path.exists(path)
+
+
+def test_checkpoint_ignored_for_other_search(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    Checkpoint(path, SEARCH_URL).save()
+
+    checkpoint = Checkpoint(path, 'https://www.etsy.com/search?q=doll')
+
+    assert not checkpoint.resumed
+    assert checkpoint.page_url == 'https://www.etsy.com/search?q=doll'
@@ -0,0 +1,103 @@
+import csv
+import time
+import multiprocessing
+
+import pytest
+
+from scrape_etsy.scrape_etsy import (scrape, scrape_distributed,
+                                     scrape_worker)
+from scrape_etsy.workqueue import SqliteWorkQueue
+
+
+def test_queue_leases_listings(tmp_path):
+    with SqliteWorkQueue(str(tmp_path / 'queue.db')) as queue:
+        queue.add(1, '1', 'https://www.etsy.com/listing/1', {'a': 1}, True)
+        queue.add(2, '2', 'https://www.etsy.com/listing/2', {'a': 2}, True)
+        # Found again at a later rank, downloaded once
+        queue.add(3, '1', 'https://www.etsy.com/listing/1', {'a': 3}, True)
+        queue.finish_discovery()
+
+        assert queue.take('a', 10, lease=0.05) == [
+            ('1', 'https://www.etsy.com/listing/1'),
+            ('2', 'https://www.etsy.com/listing/2')]
+        assert queue.take('b', 10) == []
+
+        queue.complete('1', {'b': 1})
+        assert not queue.finished()
+        time.sleep(0.1)
+        # The lease of the second listing ran out
+        assert queue.take('b', 10) == [('2', 'https://www.etsy.com/listing/2')]
+        queue.fail('2', 'ConnectionError')
+        assert queue.finished()
+
+        assert list(queue.results()) == [
+            (1, {'a': 1}, {'b': 1}, None),
+            (2, {'a': 2}, None, 'ConnectionError'),
+            (3, {'a': 3}, {'b': 1}, None)]
+
+
+def test_queue_refuses_other_crawl(tmp_path, make_archive):
+    archive = make_archive()
+    queue = str(tmp_path / 'queue.db')
+    output = str(tmp_path / 'out.csv')
+    scrape_distributed(archive.url, queue, output, replay=archive.path)
+
+    with pytest.raises(ValueError):
+        scrape_distributed(archive.url + '&page=2', queue, output,
+                           replay=archive.path)
+    with pytest.raises(ValueError):
+        scrape_distributed(archive.url, queue, output, get_details=True,
+                           replay=archive.path)
+
+    # Carrying on the same crawl is allowed
+    with SqliteWorkQueue(queue) as work_queue:
+        work_queue.start(archive.url, False)
+
+
+def test_limit_counts_queued_products(tmp_path, make_archive):
+    archive = make_archive(
+        pages=2, listings=5,
+        missing=['https://www.etsy.com/listing/1001/item-1'])
+    output = str(tmp_path / 'out.csv')
+
+    scrape_distributed(archive.url, str(tmp_path / 'queue.db'), output,
+                       get_details=True, limit=7, replay=archive.path)
+
+    with open(output) as f:
+        ranks = [row['search_rank'] for row in csv.DictReader(f)]
+    # The failed listing is not made up from later results
+    assert ranks == ['1', '3', '4', '5', '6', '7']
+    assert len(scrape(archive.url, get_details=True, limit=7,
+                      replay=archive.path)) == 7
+
+
+def _work(queue, replay):
+    scrape_worker(queue, replay=replay, rate=None)
+
+
+def test_distributed_matches_scrape(tmp_path, make_archive):
+    archive = make_archive(
+        pages=2, listings=5,
+        missing=['https://www.etsy.com/listing/1003/item-3'])
+    url = archive.url
+    queue = str(tmp_path / 'queue.db')
+
+    scrape(url, str(tmp_path / 'scrape.csv'), get_details=True,
+           replay=archive.path)
+
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=_work, args=(queue, archive.path))
+               for i in range(2)]
+    for worker in workers:
+        worker.start()
+    scrape_distributed(url, queue, str(tmp_path / 'distributed.csv'),
+                       get_details=True, replay=archive.path, work=False,
+                       poll_interval=0.05)
+    for worker in workers:
+        worker.join()
+
+    with open(tmp_path / 'scrape.csv') as f:
+        expected = list(csv.reader(f))
+    with open(tmp_path / 'distributed.csv') as f:
+        assert list(csv.reader(f)) == expected
+    assert len(expected) == 10
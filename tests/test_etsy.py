@@ -199,3 +199,39 @@ def test_get_all_results():
 
     assert line_count > 1
 
+
+def test_unknown_parser():
+    with pytest.raises(ValueError):
+        scrape('https://www.etsy.com/search?q=test', limit=10,
+               parser='not-a-parser')
+
+def test_canonical_url():
+    assert scrape_etsy.__canonical_url(
+        'https://www.etsy.com/listing/123/mask?ref=search&pro=1#reviews') == \
+        'https://www.etsy.com/listing/123/mask'
+    assert scrape_etsy.__canonical_url(
+        'https://www.etsy.com/search?q=mask') == \
+        'https://www.etsy.com/search?q=mask'
+
+
+def test_listing_urls_are_canonical(make_archive):
+    archive = make_archive(listings=5)
+    for product in scrape(archive.url, replay=archive.path):
+        assert '?' not in product['url']
+
+
+@pytest.mark.parametrize('parser,partial_parse', [
+    ('lxml', False),
+    ('lxml', True),
+    ('html.parser', True),
+])
+def test_parsers_give_the_same_products(make_archive, parser, partial_parse):
+    if parser == 'lxml':
+        pytest.importorskip('lxml')
+    archive = make_archive(pages=2, listings=3)
+    expected = scrape(archive.url, get_details=True, replay=archive.path,
+                      parser='html.parser')
+
+    assert len(expected) == 6
+    assert scrape(archive.url, get_details=True, replay=archive.path,
+                  parser=parser, partial_parse=partial_parse) == expected
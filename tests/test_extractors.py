@@ -0,0 +1,90 @@
+import pytest
+
+from bs4 import BeautifulSoup
+
+from scrape_etsy import paths
+from scrape_etsy.extractors import (FieldExtractor, compile_fields,
+                                    field_regions, in_regions,
+                                    DETAIL_EXTRACTORS, DETAIL_REGIONS,
+                                    DETAIL_STRAINER)
+from scrape_etsy.exceptions import MissingValueException
+
+
+@pytest.fixture
+def tag():
+    return BeautifulSoup('<div><a class="listing-link" href="/listing/1">'
+                         '<h3> A title </h3></a>'
+                         '<span class="count">1,234 reviews</span></div>',
+                         'html.parser')
+
+
+def test_selector_fallbacks(tag):
+    extractor = FieldExtractor(['span.missing', 'a.listing-link h3'])
+
+    assert extractor(tag) == 'A title'
+
+
+def test_attribute_and_remove(tag):
+    assert FieldExtractor('a.listing-link', attribute='href')(tag) == \
+        '/listing/1'
+    assert FieldExtractor('span.count', remove=r',|\ reviews')(tag) == \
+        '1234'
+
+
+def test_missing_value(tag):
+    assert FieldExtractor('span.missing', required=False)(tag) == ''
+
+    with pytest.raises(MissingValueException):
+        FieldExtractor('span.missing')(tag)
+
+
+def test_compile_fields_skips_fields_without_selector():
+    extractors = compile_fields(paths.SEARCH_FIELDS)
+
+    assert 'search_rank' not in extractors
+    assert 'title' in extractors
+
+
+def test_detail_strainer_keeps_detail_fields():
+    page = ('<html><body><div class="junk"><p>Ignored</p></div>'
+            '<p data-product-details-description-text-content>'
+            ' A description </p>'
+            '<a href="#shop_overview"><span class="wt-screen-reader-only">'
+            '1,234 sales</span></a><a href="#other">Other</a></body></html>')
+    full = BeautifulSoup(page, 'html.parser')
+    partial = BeautifulSoup(page, 'html.parser',
+                            parse_only=DETAIL_STRAINER)
+
+    assert partial.find(class_='junk') is None
+    assert partial.find(href='#other') is None
+    for extractor in DETAIL_EXTRACTORS.values():
+        assert extractor(partial) == extractor(full)
+
+
+def test_every_detail_selector_inside_a_region(make_archive):
+    page = make_archive().get('https://www.etsy.com/listing/1000/item-0')
+    full = BeautifulSoup(page, 'html.parser')
+    in_region = in_regions(DETAIL_REGIONS)
+
+    for field_name, field in paths.DETAIL_FIELDS.items():
+        for selector in FieldExtractor(field['selector']).selectors:
+            found = selector.select_one(full)
+            assert found is not None, field_name
+            assert any(in_region(tag)
+                       for tag in [found] + list(found.parents)), field_name
+
+    partial = BeautifulSoup(page, 'html.parser',
+                            parse_only=DETAIL_STRAINER)
+    for extractor in DETAIL_EXTRACTORS.values():
+        assert extractor(partial) == extractor(full)
+
+
+def test_field_regions_from_selectors():
+    assert field_regions({
+        'a': {'selector': ['div[data-a] > p', 'span[data-b=x] b']},
+        'b': {'selector': 'a[href=\\#c][data-d] span'},
+    }) == [('div', {'data-a': True}), ('span', {'data-b': 'x'}),
+           ('a', {'href': '#c', 'data-d': True})]
+
+    with pytest.raises(ValueError):
+        field_regions({'a': {'selector': '.description'}})
@@ -0,0 +1,74 @@
+import csv
+
+from scrape_etsy.faillog import FailLog, FIELDS
+from scrape_etsy.replay import PageArchive, ReplayFetcher
+from scrape_etsy.scrape_etsy import scrape
+from scrape_etsy.exceptions import GetPageException
+
+
+def test_failures_quoted_and_appended(tmp_path):
+    path = str(tmp_path / 'fail.log')
+
+    with FailLog(path) as fail_log:
+        fail_log.log('https://www.etsy.com/listing/1',
+                     ValueError('Failed to find "a, b".'), stage='extract')
+        fail_log.flush()
+        assert len(open(path).readlines()) == 2
+
+    with FailLog(path) as fail_log:
+        fail_log.log('https://www.etsy.com/listing/2',
+                     GetPageException('https://www.etsy.com/listing/2',
+                                      status=429, attempts=6),
+                     stage='fetch', status=429, attempts=6)
+
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+
+    assert list(rows[0]) == FIELDS
+    assert rows[0]['message'] == 'Failed to find "a, b".'
+    assert rows[0]['status'] == ''
+    assert [rows[1][field] for field in FIELDS[1:]] == [
+        'https://www.etsy.com/listing/2', 'fetch', 'GetPageException', '429',
+        '6', 'HTTP status 429 for https://www.etsy.com/listing/2']
+
+
+def test_log_with_other_columns_moved_aside(tmp_path):
+    path = tmp_path / 'fail.log'
+    old_log = '2020-01-01 00:00:00,https://www.etsy.com/listing/1,Error\n'
+    path.write_text(old_log)
+    (tmp_path / 'fail.log.1').write_text(old_log)
+
+    with FailLog(str(path)) as fail_log:
+        fail_log.log('https://www.etsy.com/listing/2', ValueError('Bad'))
+
+    assert (tmp_path / 'fail.log.2').read_text() == old_log
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [row['url'] for row in rows] == ['https://www.etsy.com/listing/2']
+
+
+class _StatusFetcher(ReplayFetcher):
+    """Replays an archive, answering one listing with a 404"""
+
+    def get(self, url):
+        if url == 'https://www.etsy.com/listing/1001/item-1':
+            raise GetPageException(url, status=404, attempts=1)
+        return super().get(url)
+
+
+def test_status_and_connection_failures_logged(tmp_path, make_archive):
+    archive = make_archive(missing=[
+        'https://www.etsy.com/listing/1002/item-2'])
+    path = str(tmp_path / 'fail.log')
+
+    scrape(archive.url, get_details=True, fail_log=path,
+           fetcher=_StatusFetcher(PageArchive(archive.path)))
+
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    # Listings are downloaded concurrently so may fail in any order
+    assert sorted((row['exception'], row['status'], row['message'])
+                  for row in rows) == [
+        ('ConnectionError', '', 'ConnectionError'),
+        ('GetPageException', '404',
+         'HTTP status 404 for https://www.etsy.com/listing/1001/item-1')]
@@ -0,0 +1,163 @@
+import time
+import threading
+import http.server
+
+import pytest
+
+import scrape_etsy.constants as CT
+from scrape_etsy.cache import MemoryCache
+from scrape_etsy.fetcher import Fetcher
+from scrape_etsy.ratelimit import RateLimiter
+from scrape_etsy.exceptions import GetPageException
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Serves a listing page with an ETag, answering 304 when the
+    client already has it"""
+
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get('If-None-Match')))
+
+        if self.path == '/busy' and len(self.requests) == 1:
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif self.path not in ('/listing/1', '/busy'):
+            self.send_response(404)
+            self.end_headers()
+        elif self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+        else:
+            body = b'<html>Listing</html>'
+            self.send_response(200)
+            self.send_header('ETag', '"v1"')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+
+class _KeepAliveHandler(http.server.BaseHTTPRequestHandler):
+    """Serves every page over keep-alive connections, recording the
+    client port of each request"""
+
+    protocol_version = 'HTTP/1.1'
+    ports = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.ports.append(self.client_address[1])
+        body = b'<html>Page</html>'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _ClosingCache(MemoryCache):
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def _serve(handler):
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def server():
+    _Handler.requests = []
+    server = _serve(_Handler)
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+
+
+def test_session_pooled():
+    with Fetcher(pool_size=7) as fetcher:
+        adapter = fetcher.session.get_adapter('https://www.etsy.com')
+
+        assert fetcher.session.get_adapter('http://www.etsy.com') is adapter
+        assert adapter._pool_maxsize == 7
+        assert adapter.max_retries.total == CT.RETRY_COUNT
+        # Statuses are retried by the fetcher, not urllib3
+        assert not adapter.max_retries.status_forcelist
+
+
+def test_connections_reused_across_threads():
+    _KeepAliveHandler.ports = []
+    server = _serve(_KeepAliveHandler)
+    url = f'http://127.0.0.1:{server.server_port}/page'
+
+    def get_pages(fetcher):
+        for i in range(10):
+            assert fetcher.get(url) == '<html>Page</html>'
+
+    with Fetcher(pool_size=4) as fetcher:
+        threads = [threading.Thread(target=get_pages, args=(fetcher,))
+                   for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    server.shutdown()
+
+    assert len(_KeepAliveHandler.ports) == 40
+    assert len(set(_KeepAliveHandler.ports)) <= 4
+
+
+def test_close_closes_cache():
+    cache = _ClosingCache()
+
+    Fetcher(cache=cache).close()
+
+    assert cache.closed
+
+
+def test_fresh_pages_come_from_cache(server):
+    with Fetcher(cache=MemoryCache()) as fetcher:
+        assert fetcher.get(f'{server}/listing/1') == '<html>Listing</html>'
+        assert fetcher.get(f'{server}/listing/1') == '<html>Listing</html>'
+
+    assert len(_Handler.requests) == 1
+
+
+def test_stale_pages_revalidated(server, monkeypatch):
+    monkeypatch.setattr(CT, 'CACHE_EXPIRE', 0)
+
+    with Fetcher(cache=MemoryCache()) as fetcher:
+        assert fetcher.get(f'{server}/listing/1') == '<html>Listing</html>'
+        assert fetcher.get(f'{server}/listing/1') == '<html>Listing</html>'
+
+    assert _Handler.requests == [('/listing/1', None),
+                                 ('/listing/1', '"v1"')]
+
+
+def test_missing_page(server):
+    with Fetcher() as fetcher:
+        with pytest.raises(GetPageException) as e:
+            fetcher.get(f'{server}/listing/2')
+
+    assert e.value.status == 404
+    assert e.value.attempts == 1
+
+
+def test_throttled_page_retried_after_retry_after(server):
+    limiter = RateLimiter()
+    started = time.monotonic()
+    with Fetcher(limiter=limiter) as fetcher:
+        assert fetcher.get(f'{server}/busy') == '<html>Listing</html>'
+
+    assert len(_Handler.requests) == 2
+    assert time.monotonic() - started >= 1
+    assert limiter.stats()['throttled'] == 1
@@ -0,0 +1,51 @@
+import json
+
+import scrape_etsy.constants as CT
+from scrape_etsy.metrics import Metrics
+from scrape_etsy.scrape_etsy import scrape
+
+
+def test_summary_percentiles():
+    metrics = Metrics()
+    for value in range(1, 101):
+        metrics.timing('parse', value / 1000)
+    metrics.size('fetch.bytes', 1024)
+    metrics.count('fetch.retries')
+    metrics.count('fetch.retries')
+
+    summary = metrics.summary()
+    assert summary['timings']['parse']['count'] == 100
+    assert summary['timings']['parse']['p50'] == 0.051
+    assert summary['timings']['parse']['p99'] == 0.1
+    assert summary['timings']['parse']['max'] == 0.1
+    assert summary['sizes']['fetch.bytes']['total'] == 1024
+    assert summary['counters'] == {'fetch.retries': 2}
+    assert 'parse: 100 in' in metrics.report()
+
+
+def test_samples_bounded(monkeypatch):
+    monkeypatch.setattr(CT, 'METRICS_SAMPLES', 10)
+    metrics = Metrics()
+    for value in range(1000):
+        metrics.timing('fetch', value)
+
+    assert len(metrics.timings['fetch'].samples) == 10
+    assert metrics.summary()['timings']['fetch']['count'] == 1000
+
+
+def test_scrape_metrics(tmp_path, make_archive):
+    archive = make_archive()
+    metrics_file = str(tmp_path / 'metrics.json')
+    recorded = []
+
+    scrape(archive.url, str(tmp_path / 'out.csv'),
+           get_details=True, replay=archive.path,
+           metrics_callback=lambda name, value: recorded.append(name),
+           metrics_file=metrics_file)
+
+    with open(metrics_file) as f:
+        timings = json.load(f)['timings']
+    for stage in ('fetch', 'parse.search', 'parse.listing',
+                  'extract.title', 'extract.description', 'write'):
+        assert timings[stage]['count'] > 0
+        assert stage in recorded
@@ -0,0 +1,47 @@
+import time
+from email.utils import formatdate
+
+import pytest
+
+import scrape_etsy.constants as CT
+from scrape_etsy.ratelimit import RateLimiter, retry_after_seconds
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds(None) is None
+    assert retry_after_seconds('120') == 120
+    assert retry_after_seconds('soon') is None
+    assert retry_after_seconds('100000') == CT.MAX_RETRY_AFTER
+    assert retry_after_seconds(formatdate(time.time() + 60, usegmt=True)) \
+        == pytest.approx(60, abs=2)
+
+
+def test_rate_limited():
+    limiter = RateLimiter(rate=20, burst=1)
+    started = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+
+    assert time.monotonic() - started >= 0.2
+
+
+def test_rate_adapts():
+    limiter = RateLimiter(rate=10, min_rate=1, max_rate=20)
+    for _ in range(100):
+        limiter.success(0.1)
+    assert limiter.rate > 10
+
+    rate = limiter.rate
+    limiter.throttled()
+    limiter.throttled()
+    # Throttled responses at the same time only cut the rate once
+    assert limiter.rate == rate * CT.RATE_DECREASE
+
+
+def test_retry_after_pauses_every_request():
+    limiter = RateLimiter(rate=100)
+    limiter.throttled(0.3)
+    started = time.monotonic()
+    limiter.acquire()
+
+    assert time.monotonic() - started >= 0.3
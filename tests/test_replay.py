@@ -0,0 +1,56 @@
+import requests
+import pytest
+
+from scrape_etsy.scrape_etsy import iter_products
+from scrape_etsy.replay import (PageArchive, RecordingFetcher, ReplayFetcher,
+                                ArchiveServer)
+from scrape_etsy.exceptions import GetPageException
+
+
+def test_recorded_pages_replayed(tmp_path):
+    path = str(tmp_path / 'pages.json.gz')
+    source = PageArchive()
+    source.put('https://www.etsy.com/listing/1', '<html>Listing</html>')
+
+    with RecordingFetcher(ReplayFetcher(source), PageArchive(path)) as f:
+        assert f.get('https://www.etsy.com/listing/1') == \
+            '<html>Listing</html>'
+        with pytest.raises(GetPageException):
+            f.get('https://www.etsy.com/listing/2')
+
+    replay = ReplayFetcher(PageArchive(path))
+    assert replay.get('https://www.etsy.com/listing/1') == \
+        '<html>Listing</html>'
+    # Failures are recorded so they fail again
+    assert PageArchive(path).get('https://www.etsy.com/listing/2') is None
+    with pytest.raises(GetPageException):
+        replay.get('https://www.etsy.com/listing/2')
+
+
+def test_archive_server_rewrites_links():
+    archive = PageArchive()
+    archive.put('https://www.etsy.com/search?q=a',
+                '<a href="https://www.etsy.com/listing/1/a">a</a>')
+
+    with ArchiveServer(archive) as server:
+        response = requests.get(server.url('https://www.etsy.com/search?q=a'))
+        assert f'{server.base_url}/listing/1/a' in response.text
+        assert requests.get(f'{server.base_url}/missing').status_code == 404
+
+
+def test_scrape_over_archive_server(make_archive):
+    archive = make_archive(pages=2)
+    url = archive.url
+
+    replayed = list(iter_products(url, get_details=True,
+                                  replay=archive.path))
+
+    with ArchiveServer(archive) as server:
+        served = list(iter_products(server.url(url), get_details=True,
+                                    rate=None))
+
+    assert len(replayed) == 6
+    for product in served:
+        product['url'] = product['url'].replace(server.base_url,
+                                                'https://www.etsy.com')
+    assert served == replayed
@@ -0,0 +1,363 @@
+import csv
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+from bs4 import BeautifulSoup
+
+import scrape_etsy.constants as CT
+import scrape_etsy.extractors as EXTRACT
+from scrape_etsy import scrape_etsy
+from scrape_etsy.scrape_etsy import scrape, scrape_batch, iter_products
+from scrape_etsy.replay import ReplayFetcher
+from tests.conftest import (SlowFetcher, repeat_first_listing,
+                            drop_description)
+
+
+def test_details_concurrent_in_rank_order(tmp_path, make_archive):
+    fetcher = SlowFetcher(make_archive(listings=12))
+    output = str(tmp_path / 'out.csv')
+
+    scrape(fetcher.archive.url, output, get_details=True, concurrency=4,
+           fetcher=fetcher)
+
+    with open(output) as f:
+        rows = list(csv.DictReader(f))
+    # Finished in reverse but written in search_rank order
+    assert [row['search_rank'] for row in rows] == \
+        [str(rank) for rank in range(1, 13)]
+    assert [row['title'] for row in rows] == \
+        [f'Synthetic item 1-{i}' for i in range(12)]
+    assert rows[0]['description'] == 'Description of synthetic item 1000'
+    assert fetcher.most_in_flight == 4
+
+
+def _page_url(fetcher, page):
+    return fetcher.archive.url + (f'&page={page}' if page > 1 else '')
+
+
+def _search_pages(fetcher):
+    return [url for url in fetcher.fetched if '/search' in url]
+
+
+def _prefetching():
+    return [thread for thread in threading.enumerate()
+            if thread.name == 'prefetch_search_pages']
+
+
+def test_prefetched_pages_in_order(make_archive):
+    fetcher = SlowFetcher(make_archive(pages=5, listings=2))
+
+    products = list(iter_products(fetcher.archive.url, fetcher=fetcher,
+                                  prefetch=2))
+
+    assert [product['search_rank'] for product in products] == \
+        list(range(1, 11))
+    assert _search_pages(fetcher) == [_page_url(fetcher, page)
+                                      for page in range(1, 6)]
+
+
+def test_prefetch_bounded_and_stops_when_closed(make_archive):
+    fetcher = SlowFetcher(make_archive(pages=6, listings=2))
+
+    products = iter_products(fetcher.archive.url, fetcher=fetcher,
+                             prefetch=1)
+    next(products)
+    time.sleep(0.2)
+    # The page being processed, one waiting and one waiting to be put
+    assert len(_search_pages(fetcher)) == 3
+
+    products.close()
+    time.sleep(0.2)
+    assert not _prefetching()
+    assert len(_search_pages(fetcher)) == 3
+
+
+def test_prefetch_stops_at_limit(make_archive):
+    fetcher = SlowFetcher(make_archive(pages=6, listings=2))
+
+    products = list(iter_products(fetcher.archive.url, fetcher=fetcher,
+                                  prefetch=2, limit=3))
+    time.sleep(0.2)
+
+    assert len(products) == 3
+    assert not _prefetching()
+    assert len(_search_pages(fetcher)) <= 5
+
+
+def test_prefetch_reports_failed_page(make_archive):
+    archive = make_archive(pages=3, listings=2, missing=[
+        'https://www.etsy.com/search?q=synthetic&page=2'])
+    fetcher = SlowFetcher(archive)
+    failures = []
+    messages = []
+
+    products = list(iter_products(fetcher.archive.url, fetcher=fetcher,
+                                  prefetch=2,
+                                  message_callback=messages.append,
+                                  fail_log_callback=lambda url, error:
+                                  failures.append(url)))
+
+    assert len(products) == 2
+    assert failures == [_page_url(fetcher, 2)]
+    assert 'Scraped 2 products, failed to scrape 1.' in messages
+    assert not _prefetching()
+
+
+def test_interleaved_runs_keep_their_settings(make_archive):
+    first = SlowFetcher(make_archive(pages=2, listings=2, missing=[
+        'https://www.etsy.com/listing/2001/item-1']))
+    second = SlowFetcher(make_archive(pages=2, listings=2, missing=[
+        'https://www.etsy.com/listing/2000/item-0']))
+    failures = {}
+
+    runs = [iter_products(fetcher.archive.url, get_details=True,
+                          fetcher=fetcher, partial_parse=partial_parse,
+                          fail_log_callback=lambda url, error, name=name:
+                          failures.setdefault(name, []).append(url))
+            for name, fetcher, partial_parse in (('first', first, False),
+                                                 ('second', second, True))]
+    # Stepped in turn in one thread, the second pages are scraped after
+    # both runs have started
+    products = [[], []]
+    for _ in range(3):
+        for run, scraped in zip(runs, products):
+            scraped.append(next(run))
+
+    assert failures == {
+        'first': ['https://www.etsy.com/listing/2001/item-1'],
+        'second': ['https://www.etsy.com/listing/2000/item-0']}
+    assert [[product['search_rank'] for product in scraped]
+            for scraped in products] == [[1, 2, 3], [1, 2, 4]]
+
+
+def test_missing_required_detail_counted_as_failure(make_archive):
+    archive = make_archive(listings=4)
+    drop_description(archive, 'https://www.etsy.com/listing/1001/item-1')
+    failures = []
+    messages = []
+
+    products = list(iter_products(archive.url, get_details=True,
+                                  fetcher=SlowFetcher(archive),
+                                  message_callback=messages.append,
+                                  fail_log_callback=lambda url, error:
+                                  failures.append(url)))
+
+    assert [product['search_rank'] for product in products] == [1, 3, 4]
+    assert failures == ['https://www.etsy.com/listing/1001/item-1']
+    assert 'Scraped 3 products, failed to scrape 1.' in messages
+
+
+def test_iter_products_lazy(make_archive):
+    fetcher = SlowFetcher(make_archive(pages=3, listings=2))
+
+    products = iter_products(fetcher.archive.url, get_details=True,
+                             fetcher=fetcher)
+    assert next(products)['search_rank'] == 1
+
+    # Nothing past the first page is downloaded until it is needed
+    assert _search_pages(fetcher) == [fetcher.archive.url]
+    assert sorted(fetcher.listings()) == [
+        'https://www.etsy.com/listing/1000/item-0',
+        'https://www.etsy.com/listing/1001/item-1']
+    products.close()
+
+
+def test_iter_products_limit_makes_up_failures(make_archive):
+    fetcher = SlowFetcher(make_archive(pages=2, listings=4, missing=[
+        'https://www.etsy.com/listing/1001/item-1']))
+
+    products = list(iter_products(fetcher.archive.url, get_details=True,
+                                  fetcher=fetcher, limit=5))
+
+    assert [product['search_rank'] for product in products] == \
+        [1, 3, 4, 5, 6]
+    # Only as many listings as are still needed are started
+    assert len(fetcher.listings()) == 6
+
+
+def test_scrape_without_collect(tmp_path, make_archive):
+    archive = make_archive(pages=2)
+    output = str(tmp_path / 'out.csv')
+
+    assert scrape(archive.url, output, replay=archive.path,
+                  collect=False) is None
+
+    with open(output) as f:
+        assert len(list(csv.DictReader(f))) == 6
+
+
+class InterruptingFetcher(SlowFetcher):
+    """Stops the scrape when a page is got, as if interrupted"""
+
+    def __init__(self, archive, interrupt):
+        super().__init__(archive)
+        self.interrupt = interrupt
+
+    def get(self, url):
+        if url == self.interrupt:
+            raise KeyboardInterrupt()
+        return super().get(url)
+
+
+def test_resume_keeps_repeated_listings(tmp_path, make_archive):
+    archive = make_archive(pages=2)
+    # The first listing is found again at the top of the second page
+    repeat_first_listing(archive, archive.url + '&page=2', '<li')
+    output = str(tmp_path / 'out.csv')
+    checkpoint = str(tmp_path / 'checkpoint.json')
+
+    expected = str(tmp_path / 'expected.csv')
+    scrape(archive.url, expected, get_details=True,
+           fetcher=SlowFetcher(archive))
+
+    with pytest.raises(KeyboardInterrupt):
+        scrape(archive.url, output, get_details=True, checkpoint=checkpoint,
+               fetcher=InterruptingFetcher(
+                   archive, 'https://www.etsy.com/listing/2001/item-1'))
+    scrape(archive.url, output, get_details=True, checkpoint=checkpoint,
+           fetcher=SlowFetcher(archive))
+
+    with open(expected) as f:
+        expected_rows = list(csv.reader(f))
+    with open(output) as f:
+        assert list(csv.reader(f)) == expected_rows
+    assert [row[0] for row in expected_rows[1:]].count(
+        'Synthetic item 1-0') == 2
+
+
+def test_refresh_downloads_only_changed_listings(tmp_path, make_archive):
+    archive = make_archive()
+    output = str(tmp_path / 'out.csv')
+    scrape(archive.url, output, get_details=True, replay=archive.path)
+
+    # The second listing's price changed, every description changed
+    archive.put(archive.url, archive.get(archive.url).replace(
+        '2.99', '3.49'))
+    for i in range(3):
+        listing = f'https://www.etsy.com/listing/100{i}/item-{i}'
+        archive.put(listing, archive.get(listing).replace(
+            'Description', 'New description'))
+    fetcher = SlowFetcher(archive)
+
+    scrape(archive.url, output, get_details=True, previous=output,
+           fetcher=fetcher)
+
+    assert fetcher.listings() == ['https://www.etsy.com/listing/1001/item-1']
+    with open(output) as f:
+        rows = list(csv.DictReader(f))
+    assert [row['price_value'] for row in rows] == ['1.99', '3.49', '3.99']
+    assert [row['description'] for row in rows] == [
+        'Description of synthetic item 1000',
+        'New description of synthetic item 1001',
+        'Description of synthetic item 1002']
+
+
+def test_batch_downloads_each_listing_once(tmp_path, make_archive,
+                                           monkeypatch):
+    archive = make_archive(pages=2)
+    fetched = []
+    get = ReplayFetcher.get
+    monkeypatch.setattr(ReplayFetcher, 'get', lambda self, url:
+                        fetched.append(url) or get(self, url))
+    second_url = archive.url + '&page=2'
+    messages = []
+
+    scrape_batch([archive.url, second_url, archive.url],
+                 output_dir=str(tmp_path), get_details=True,
+                 replay=archive.path, concurrency=4,
+                 message_callback=messages.append)
+
+    listings = [url for url in fetched if '/listing/' in url]
+    assert len(listings) == len(set(listings)) == 6
+    assert 'Scraped 3 queries, downloaded 6 listings.' in messages
+
+    expected = str(tmp_path / 'expected.csv')
+    scrape(archive.url, expected, get_details=True, replay=archive.path)
+    with open(expected) as f:
+        expected_rows = list(csv.reader(f))
+    for name in ('1_synthetic.csv', '3_synthetic.csv'):
+        with open(tmp_path / name) as f:
+            assert list(csv.reader(f)) == expected_rows
+    with open(tmp_path / '2_synthetic.csv') as f:
+        rows = list(csv.DictReader(f))
+    assert [(row['search_rank'], row['title']) for row in rows] == [
+        ('1', 'Synthetic item 2-0'), ('2', 'Synthetic item 2-1'),
+        ('3', 'Synthetic item 2-2')]
+
+
+def test_repeated_listings_downloaded_once(make_archive, monkeypatch):
+    archive = make_archive(pages=2, listings=2)
+    # Repeated in the first batch and again on the second page
+    repeat_first_listing(archive, archive.url, '</ul>')
+    repeat_first_listing(archive, archive.url + '&page=2', '</ul>')
+    repeated = 'https://www.etsy.com/listing/1000/item-0'
+
+    fetcher = SlowFetcher(archive)
+    products = list(iter_products(archive.url, get_details=True,
+                                  fetcher=fetcher))
+    assert [product['url'] for product in products].count(repeated) == 3
+    assert fetcher.listings().count(repeated) == 1
+
+    fetcher = SlowFetcher(archive)
+    shared_details = {}
+    assert list(iter_products(archive.url, get_details=True,
+                              fetcher=fetcher,
+                              shared_details=shared_details)) == products
+    assert fetcher.listings().count(repeated) == 1
+    assert len(shared_details) == 4
+
+    # Only the most recently found listings are kept
+    monkeypatch.setattr(CT, 'DETAILS_MEMO_SIZE', 2)
+    fetcher = SlowFetcher(archive)
+    assert list(iter_products(archive.url, get_details=True,
+                              fetcher=fetcher, concurrency=1)) == products
+    assert fetcher.listings().count(repeated) == 2
+
+
+@pytest.mark.parametrize('duplicates, kept', [('rank', 0), ('skip', 3)])
+def test_found_listings_only_kept_for_skipping(make_archive, duplicates,
+                                               kept):
+    archive = make_archive()
+    results = EXTRACT.SEARCH_RESULT.select(
+        BeautifulSoup(archive.get(archive.url), 'html.parser'))
+    seen = set()
+
+    start, search_rank, written = scrape_etsy.__start_batch(
+        results, 0, seen, duplicates)
+
+    assert [rank for rank, result in start] == [1, 2, 3]
+    assert len(seen) == kept
+
+
+class CountingProcessPool(ProcessPoolExecutor):
+    """Spawned process pool counting the calls submitted to it"""
+
+    def __init__(self):
+        super().__init__(max_workers=2,
+                         mp_context=multiprocessing.get_context('spawn'))
+        self.lock = threading.Lock()
+        self.submitted = []
+
+    def submit(self, fn, *args, **kwargs):
+        with self.lock:
+            self.submitted.append(fn.__name__)
+        return super().submit(fn, *args, **kwargs)
+
+
+def test_listings_parsed_in_process_pool(make_archive):
+    archive = make_archive(pages=2)
+    expected = list(iter_products(archive.url, get_details=True,
+                                  replay=archive.path))
+
+    assert scrape(archive.url, get_details=True, replay=archive.path,
+                  parse_processes=2) == expected
+
+    with CountingProcessPool() as parse_executor:
+        assert list(iter_products(archive.url, get_details=True,
+                                  replay=archive.path,
+                                  parse_executor=parse_executor)) == \
+            expected
+    assert parse_executor.submitted == ['__parse_details'] * 6
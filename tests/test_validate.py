@@ -0,0 +1,88 @@
+import pytest
+
+from scrape_etsy import paths
+from scrape_etsy.scrape_etsy import iter_products
+from scrape_etsy.validate import Validator
+from scrape_etsy.writers import open_writer, read_rows
+
+ROWS = [
+    {'title': 'a', 'price_value': '12.50', 'review_count': '1024',
+     'url': 'https://www.etsy.com/listing/1'},
+    {'title': '', 'price_value': 'free', 'review_count': '',
+     'url': 'https://www.etsy.com/listing/2'},
+    {'title': 'c', 'price_value': '3', 'review_count': '4.5',
+     'url': 'https://www.etsy.com/listing/3'},
+]
+FIELDS = dict((field_name, paths.SEARCH_FIELDS[field_name])
+              for field_name in ROWS[0])
+
+
+def test_invalid_rows_found():
+    problems = Validator(FIELDS).validate(ROWS)
+
+    assert problems == [
+        [],
+        ['title is empty', 'price_value is not float "free"'],
+        ['review_count is not int "4.5"'],
+    ]
+
+
+def test_valid_rows_coerced():
+    rows = Validator(FIELDS).coerce([dict(ROWS[0]), {'title': 'b'}])
+
+    assert rows == [{'title': 'a', 'price_value': 12.5,
+                     'review_count': 1024,
+                     'url': 'https://www.etsy.com/listing/1'},
+                    {'title': 'b'}]
+
+
+@pytest.mark.parametrize('type_name,value', [
+    ('float', '12.50'), ('float', 'nan'), ('float', '1_000'),
+    ('float', '٣'), ('float', 'free'), ('int', '1024'), ('int', '1_000'),
+    ('int', '٣'), ('int', ' 7 '), ('int', '4.5'), ('int', 'n/a'),
+])
+def test_numbers_validated_as_written(tmp_path, type_name, value):
+    field = {'type': type_name, 'required': False}
+    problems = Validator({'value': field}).validate([{'value': value}])
+
+    output = str(tmp_path / 'out.jsonl')
+    with open_writer(output, ['value'], [type_name]) as writer:
+        writer.write([value])
+    written = next(read_rows(output))['value']
+
+    # Valid exactly when the writers can write the value as a number
+    assert (problems == [[]]) == (written is not None)
+
+
+def test_invalid_products_logged(make_archive):
+    archive = make_archive()
+    listing = 'https://www.etsy.com/listing/1001/item-1'
+    archive.put(listing, archive.get(listing).replace(
+        'Description of synthetic item 1001', ''))
+    archive.save()
+    failures = []
+
+    products = list(iter_products(archive.url,
+                                  get_details=True, replay=archive.path,
+                                  validate=True,
+                                  fail_log_callback=lambda url, error:
+                                  failures.append((url, error))))
+
+    assert [product['search_rank'] for product in products] == [1, 3]
+    assert failures == [(listing, 'description is empty')]
+
+
+def test_valid_products_have_numbers(make_archive):
+    archive = make_archive()
+
+    products = list(iter_products(archive.url, get_details=True,
+                                  replay=archive.path, validate=True))
+
+    assert [(product['price_value'], product['sale_value'],
+             product['review_rating'], product['review_count'],
+             product['shipping_value'], product['shop_sales'])
+            for product in products] == [
+        (1.99, None, 4.8, 1000, 4.5, 12345),
+        (2.99, None, 4.8, 1001, 4.5, 12345),
+        (3.99, None, 4.8, 1002, 4.5, 12345)]
+    assert products[0]['title'] == 'Synthetic item 1-0'
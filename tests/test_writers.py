@@ -0,0 +1,67 @@
+import csv
+
+import pytest
+
+from scrape_etsy.writers import CsvWriter, open_writer, read_rows
+
+
+def test_rows_buffered_until_flush(tmp_path):
+    output = str(tmp_path / 'out.csv')
+    writer = CsvWriter(output, ['title', 'url'], buffer_rows=3,
+                       flush_interval=60)
+
+    writer.write(['a', 'b'])
+    writer.write(['c, d', 'e'])
+    assert len(open(output).readlines()) == 1
+
+    writer.write(['f', 'g'])
+    assert len(open(output).readlines()) == 4
+
+    writer.write(['h', 'i'])
+    writer.close()
+
+    with open(output, 'r') as fp:
+        rows = list(csv.reader(fp))
+
+    assert rows[0] == ['title', 'url']
+    assert rows[2] == ['c, d', 'e']
+    assert len(rows) == 5
+
+
+def test_rows_written_when_scrape_raises(tmp_path):
+    output = str(tmp_path / 'out.csv')
+
+    try:
+        with CsvWriter(output, ['title'], buffer_rows=100) as writer:
+            writer.write(['a'])
+            raise RuntimeError()
+    except RuntimeError:
+        pass
+
+    assert len(open(output).readlines()) == 2
+    assert writer.file.closed
+
+
+def test_jsonl_values_typed(tmp_path):
+    output = str(tmp_path / 'out.jsonl')
+
+    with open_writer(output, ['title', 'price', 'reviews'],
+                     ['str', 'float', 'int']) as writer:
+        writer.write(['a', '12.50', '1024'])
+        writer.write(['b', '', 'n/a'])
+
+    rows = list(read_rows(output))
+    assert rows == [{'title': 'a', 'price': 12.5, 'reviews': 1024},
+                    {'title': 'b', 'price': None, 'reviews': None}]
+
+
+def test_parquet_columns_typed(tmp_path):
+    pytest.importorskip('pyarrow')
+    output = str(tmp_path / 'out.parquet')
+
+    with open_writer(output, ['title', 'price'], ['str', 'float']) as writer:
+        writer.write(['a', '12.50'])
+
+    assert list(read_rows(output)) == [{'title': 'a', 'price': 12.5}]
+    with pytest.raises(ValueError):
+        open_writer(output, ['title'], append=True)